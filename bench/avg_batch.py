@@ -0,0 +1,57 @@
+# 均等分割识别：逐段识别和批量识别耗时对比
+# 在项目根目录执行：python bench/avg_batch.py 音频文件 [模型名] [语言代码] [batch_size] [cuda]
+# 例如 python bench/avg_batch.py test.wav small en 8 cuda
+# 两种方式识别同一音频的同一组分段，输出各自耗时和识别结果不同的段数
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from faster_whisper.audio import decode_audio
+from pydub import AudioSegment
+
+from videotrans.configure import config
+from videotrans.recognition import avg
+from videotrans.recognition.pool import get_faster_model
+
+
+def run(results):
+    start = time.time()
+    texts = dict(results)
+    return time.time() - start, texts
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print('python bench/avg_batch.py 音频文件 [模型名] [语言代码] [batch_size] [cuda]')
+        sys.exit()
+    audio_file = sys.argv[1]
+    model_name = sys.argv[2] if len(sys.argv) > 2 else 'tiny'
+    language = sys.argv[3] if len(sys.argv) > 3 else 'en'
+    batch_size = int(sys.argv[4]) if len(sys.argv) > 4 else 8
+    cuda = len(sys.argv) > 5 and sys.argv[5] == 'cuda'
+
+    config.current_status = 'ing'
+    config.params['cuda'] = cuda
+    nonsilent_data = avg.shorten_voice_old(AudioSegment.from_file(audio_file))
+    audio_data = decode_audio(audio_file, sampling_rate=16000)
+    model = get_faster_model(model_name,
+                             device="cuda" if cuda else "cpu",
+                             compute_type=config.settings['cuda_com_type'] if cuda else 'default',
+                             download_root=config.rootdir + "/models",
+                             local_files_only=model_name.find('/') == -1)
+    print(f'{audio_file} 共 {len(nonsilent_data)} 段，模型 {model_name}，{"cuda" if cuda else "cpu"}')
+
+    # 先识别一段预热，避免首次加载计入耗时
+    next(avg._serial_transcribe(model, audio_data, nonsilent_data[:1], language), None)
+
+    serial_sec, serial = run(avg._serial_transcribe(model, audio_data, nonsilent_data, language))
+    print(f'逐段识别: {serial_sec:.2f}s')
+    batch_sec, batch = run(avg._batch_transcribe(model, audio_data, nonsilent_data, language, batch_size))
+    print(f'批量识别 batch_size={batch_size}: {batch_sec:.2f}s，加速 {serial_sec / max(batch_sec, 1e-6):.2f}x')
+
+    diff = [i for i in serial if serial[i].strip() != batch.get(i, '').strip()]
+    print(f'识别结果不同的段数: {len(diff)}/{len(serial)}')
+    for i in diff[:10]:
+        print(f'[{i}] 逐段: {serial[i].strip()}\n[{i}] 批量: {batch.get(i, "").strip()}')
@@ -0,0 +1,56 @@
+# 配音合成：pcm.render 在合成时间轴上的耗时
+# 在项目根目录执行：python bench/render.py [分钟数] [片段数] [old]，默认 120 分钟、2000 个片段
+# 加 old 时同时计时旧方式：每个片段前补静音后逐段拼接，每次拼接都复制已合成的全部音频，耗时很长
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from videotrans.util import pcm
+
+
+# 在时间轴上均匀分布 num 个 1-4s 的片段，片段之间留有随机间隔，偶尔前后重叠
+def synth(minutes, num, seed=0):
+    rng = np.random.default_rng(seed)
+    total_ms = int(minutes * 60000)
+    step = total_ms // num
+    clips = []
+    for i in range(num):
+        start = i * step + int(rng.integers(0, max(1, step // 4)))
+        ms = int(rng.uniform(1000, 4000))
+        clips.append((start, rng.integers(-8000, 8000, pcm.ms_to_samples(ms), dtype=np.int16)))
+    return clips, total_ms
+
+
+# 旧方式：按顺序补静音后拼接，重叠部分顺延
+def concat(clips, duration_ms):
+    out = np.zeros(0, dtype=np.int16)
+    for start, samples in clips:
+        pos = pcm.duration_ms(out)
+        if start > pos:
+            out = np.concatenate([out, pcm.silence(start - pos)])
+        out = np.concatenate([out, samples])
+    if pcm.duration_ms(out) < duration_ms:
+        out = np.concatenate([out, pcm.silence(duration_ms - pcm.duration_ms(out))])
+    return out
+
+
+if __name__ == '__main__':
+    minutes = float(sys.argv[1]) if len(sys.argv) > 1 else 120
+    num = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    clips, total_ms = synth(minutes, num)
+    print(f'{minutes:g} 分钟时间轴，{num} 个片段，共 {sum(len(s) for _, s in clips) / pcm.RATE:.0f}s 配音')
+
+    start = time.time()
+    out = pcm.render(clips, total_ms)
+    render_sec = time.time() - start
+    print(f'pcm.render: {render_sec:.3f}s，输出 {pcm.duration_ms(out) / 1000:.0f}s，{out.nbytes / 1024 / 1024:.0f}MB')
+
+    if len(sys.argv) > 3 and sys.argv[3] == 'old':
+        start = time.time()
+        concat(clips, total_ms)
+        concat_sec = time.time() - start
+        print(f'逐段拼接: {concat_sec:.3f}s，加速 {concat_sec / max(render_sec, 1e-6):.1f}x')
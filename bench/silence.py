@@ -0,0 +1,88 @@
+# 静音检测：tools.detect_silence/detect_nonsilent 和 pydub.silence 的结果核对及耗时对比
+# 在项目根目录执行：python bench/silence.py [分钟数]，默认 60 分钟
+# 先在多组合成短音频上核对两者结果完全一致，不一致时退出码为 1，然后在长音频上对比耗时
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from pydub import AudioSegment, silence
+
+from videotrans.util import tools
+
+
+# 合成音频：有声段为正弦波加噪声，静音段为微弱噪声，各段时长随机
+def synth(seconds, *, rate=44100, channels=1, sample_width=2, seed=0):
+    rng = np.random.default_rng(seed)
+    peak = 2 ** (8 * sample_width - 1) - 1
+    total = int(seconds * rate)
+    data = np.zeros(total, dtype=np.float64)
+    pos = 0
+    voiced = False
+    while pos < total:
+        n = min(total - pos, int(rng.uniform(0.05, 3) * rate))
+        if voiced:
+            t = np.arange(n) / rate
+            data[pos:pos + n] = 0.3 * np.sin(2 * np.pi * rng.uniform(100, 400) * t) + rng.normal(0, 0.05, n)
+        else:
+            data[pos:pos + n] = rng.normal(0, 0.001, n)
+        pos += n
+        voiced = not voiced
+    data = np.clip(data, -1, 1) * peak
+    if channels > 1:
+        data = np.repeat(data, channels)
+    # pydub 内部按有符号整数处理原始采样
+    raw = data.astype({1: np.int8, 2: np.int16, 4: np.int32}[sample_width]).tobytes()
+    return AudioSegment(data=raw, sample_width=sample_width, frame_rate=rate, channels=channels)
+
+
+def check():
+    cases = [
+        dict(rate=44100, channels=1, sample_width=2),
+        dict(rate=16000, channels=1, sample_width=2),
+        dict(rate=22050, channels=2, sample_width=2),
+        dict(rate=44100, channels=1, sample_width=4),
+        dict(rate=8000, channels=1, sample_width=1),
+    ]
+    params = [
+        dict(min_silence_len=200, silence_thresh=-45, seek_step=1),
+        dict(min_silence_len=500, silence_thresh=-30, seek_step=1),
+        dict(min_silence_len=300, silence_thresh=-45, seek_step=7),
+        dict(min_silence_len=1000, silence_thresh=-16, seek_step=10),
+    ]
+    failed = 0
+    for seed, case in enumerate(cases):
+        audio = synth(20, seed=seed, **case)
+        for p in params:
+            for name, ours, theirs in [('detect_silence', tools.detect_silence, silence.detect_silence),
+                                       ('detect_nonsilent', tools.detect_nonsilent, silence.detect_nonsilent)]:
+                a = ours(audio, **p)
+                b = [list(x) for x in theirs(audio, **p)]
+                if a != b:
+                    failed += 1
+                    print(f'不一致 {name} {case} {p}\n  numpy: {a[:5]}\n  pydub: {b[:5]}')
+    print(f'结果核对: {len(cases) * len(params) * 2 - failed} 组一致，{failed} 组不一致')
+    return failed == 0
+
+
+if __name__ == '__main__':
+    minutes = float(sys.argv[1]) if len(sys.argv) > 1 else 60
+    if not check():
+        sys.exit(1)
+
+    audio = synth(minutes * 60)
+    # 和 avg.shorten_voice_old 中的参数一致
+    p = dict(min_silence_len=200, silence_thresh=-45)
+    start = time.time()
+    ours = tools.detect_nonsilent(audio, **p)
+    ours_sec = time.time() - start
+    print(f'{minutes:g} 分钟音频 numpy: {ours_sec:.2f}s，{len(ours)} 段')
+    start = time.time()
+    theirs = silence.detect_nonsilent(audio, **p)
+    theirs_sec = time.time() - start
+    print(f'{minutes:g} 分钟音频 pydub: {theirs_sec:.2f}s，{len(theirs)} 段，加速 {theirs_sec / max(ours_sec, 1e-6):.1f}x')
+    if ours != [list(x) for x in theirs]:
+        print('长音频结果不一致')
+        sys.exit(1)
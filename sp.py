@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 import sys, os
+import multiprocessing
 from pathlib import Path
 import time
 
@@ -66,6 +67,8 @@ class StartWindow(QtWidgets.QWidget):
 
 
 if __name__ == "__main__":
+    # 打包后多进程识别需要
+    multiprocessing.freeze_support()
     app = QtWidgets.QApplication(sys.argv)
     try:
         startwin = StartWindow()
@@ -0,0 +1,45 @@
+# 边翻译边配音提前生成的配音文件名，需和正式配音时 _before_tts 读取目标字幕后的文件名一致，否则提前配音的文件不会被使用
+from queue import Queue
+
+from videotrans.configure import config
+from videotrans.task import step
+
+CUES = [
+    {"line": 1, "time": "00:00:01,000 --> 00:00:02,000", "text": "I met John in Paris"},
+    {"line": 2, "time": "00:00:03,000 --> 00:00:04,000", "text": ""},
+    {"line": 3, "time": "00:00:05,000 --> 00:00:06,000", "text": "See you in London"},
+    {"line": 4, "time": "00:00:07,000 --> 00:00:08,000", "text": "Hello\nWORLD again"},
+]
+
+
+def _runstep(tmp_path):
+    return step.Runstep(
+        init={"cache_folder": tmp_path.as_posix(), "target_sub": (tmp_path / "target.srt").as_posix(),
+              "target_language_code": "en", "btnkey": ""},
+        config_params={"voice_role": "en-US-AriaNeural", "voice_rate": "+0%", "voice_autorate": False,
+                       "volume": "+0%", "pitch": "+0Hz", "tts_type": "edgeTTS"})
+
+
+def test_stream_dubb_filenames_match_before_tts(tmp_path, monkeypatch):
+    prefetch = []
+    monkeypatch.setattr(step, 'run_tts', lambda *, queue_tts, **kw: prefetch.extend(queue_tts))
+    monkeypatch.setattr(step.time, 'sleep', lambda sec: None)
+    monkeypatch.setattr(config, 'current_status', 'ing')
+    monkeypatch.setattr(config, 'exit_soft', False)
+    monkeypatch.setitem(config.settings, 'dubbing_thread', 10)
+    run = _runstep(tmp_path)
+
+    # 提前配音：译文逐条送入通道
+    run.dubb_channel = Queue()
+    for it in CUES:
+        run.dubb_channel.put(dict(it))
+    run.dubb_channel.put(None)
+    run._stream_dubb_run()
+
+    # 正式配音：保存目标字幕后重新读取
+    run._save_srt_target([dict(it) for it in CUES], run.init['target_sub'])
+    queue_tts = run._before_tts()
+
+    assert [it['text'] for it in prefetch] == ["I met john in paris", "See you in london", "Hello\nWorld again"]
+    assert [it['text'] for it in prefetch] == [it['text'] for it in queue_tts]
+    assert [it['filename'] for it in prefetch] == [it['filename'] for it in queue_tts]
@@ -1,6 +1,5 @@
 # -*- coding: utf-8 -*-
 # primary ui
-import copy
 import datetime
 
 import os
@@ -8,14 +7,13 @@ import re
 import time
 
 from PySide6.QtCore import QThread
-from pydub import AudioSegment
 
 from videotrans.configure import config
 from videotrans.configure.config import logger, homedir
 from videotrans.translator import run as run_trans
-from videotrans.recognition import run as run_recogn
-from videotrans.tts import run as run_tts, text_to_speech
-from videotrans.util import tools
+from videotrans.recognition import pool, run as run_recogn
+from videotrans.tts import clip_suffix, run as run_tts, text_to_speech
+from videotrans.util import pcm, tools
 from videotrans.util.tools import runffmpeg, get_subtitle_from_srt, ms_to_time_string, set_process_box, speed_up_mp3
 
 
@@ -111,9 +109,12 @@ class WorkerWhisper(QThread):
                     msg = f'cuDNN错误，请尝试升级显卡驱动，重新安装CUDA12.x和cuDNN9 {msg}' if config.defaulelang == 'zh' else f'cuDNN error, please try upgrading the graphics card driver and reinstalling CUDA12.x and cuDNN9 {msg}'
                 self.post_message(type='error', text=msg)
                 config.box_recogn = 'stop'
+                pool.clear('cuda')
                 return
         self.post_message(type='end', text="" if len(errs) < 1 else "\n".join(errs))
         config.box_recogn = 'stop'
+        # 识别结束，释放显存
+        pool.clear('cuda')
 
     def post_message(self, type=None, text=None):
         set_process_box(text, type=type, func_name=self.func_name)
@@ -186,7 +187,7 @@ class WorkerTTS(QThread):
                 self.post_message(type='error', text=f'srt create dubbing error:{str(e)}')
             return
 
-        mp3 = self.wavname + ".mp3"
+        mp3 = self.wavname + "-tts" + clip_suffix(self.tts_type)
         try:
             text_to_speech(
                 text=self.files,
@@ -234,11 +235,14 @@ class WorkerTTS(QThread):
             # 记录原字母区间时长
             it['raw_duration'] = it['end_time'] - it['start_time']
 
-            if tools.vail_file(it['filename']):
-                the_ext = it['filename'].split('.')[-1]
-                it['dubb_time'] = len(
-                    AudioSegment.from_file(it['filename'], format="mp4" if the_ext == 'm4a' else the_ext))
+            # 时长取自配音时记录的采样数，没有时只读取文件头，配音在加速或最终合成时才解码为 it['pcm']
+            if not it.get('clip') and tools.vail_file(it['filename']):
+                it['clip'] = pcm.probe(it['filename'])
+            it['pcm'] = None
+            if it.get('clip') and it['clip']['samples'] > 0:
+                it['dubb_time'] = pcm.clip_ms(it['clip'])
             else:
+                it['clip'] = None
                 # 不存在配音
                 it['dubb_time'] = 0
             queue_tts[i] = it
@@ -301,6 +305,8 @@ class WorkerTTS(QThread):
 
         # 再次遍历，调整字幕开始结束时间对齐实际音频时长
         # 每次 start_time 和 end_time 需要添加的长度 offset 为当前所有 add_time 之和
+        # 需要加速的 (索引, 加速后时长)，全部计算完毕后一次批量加速
+        jobs = []
         for i, it in enumerate(queue_tts):
             # 需要音频加速，否则跳过
             if not it['speed'] or config.settings['audio_rate'] <= 1:
@@ -309,29 +315,26 @@ class WorkerTTS(QThread):
                 queue_tts[i] = it
                 continue
 
-            if tools.vail_file(it['filename']):
-                # 调整音频
-                tmp_mp3 = os.path.join(self.tmpdir, f'{it["filename"]}-speed.mp3')
+            # 只解码需要加速的配音
+            it['pcm'] = pcm.load_clip(it['clip'])
+            if it['pcm'] is not None:
                 # 需要加速的倍数如果大于2，并且大于1s才需要判断是否视频慢速，否则不慢速，以避免过差效果
                 speed = it['dubb_time'] / it['raw_duration']
                 # 确定变化后的配音时长，如果倍数低于 audio_rate 限制，则设为原字幕时长，否则设定 配音时长/最大倍数
                 audio_extend = it['raw_duration'] if speed <= float(config.settings['audio_rate']) else int(
                     it['dubb_time'] / float(config.settings['audio_rate']))
-                tools.precise_speed_up_audio(file_path=it['filename'], out=tmp_mp3,
-                                             target_duration_ms=audio_extend,
-                                             max_rate=100)
-
-                # 获取实际加速完毕后的真实配音时长，因为精确度原因，未必和上述计算出的一致
-                # 如果视频需要变化，更新视频时长需要变化的长度
-                if tools.vail_file(tmp_mp3):
-                    mp3_len = len(AudioSegment.from_file(tmp_mp3, format="mp3"))
-                    it['dubb_time'] = mp3_len
-                    it['filename'] = tmp_mp3
+                jobs.append((i, audio_extend))
 
             # 更改时间戳
             it['startraw'] = ms_to_time_string(ms=it['start_time'])
             it['endraw'] = ms_to_time_string(ms=it['end_time'])
             queue_tts[i] = it
+        if jobs:
+            # 在内存中变速不变调，结果恰好为 audio_extend 毫秒
+            results = pcm.speed_up_batch([(queue_tts[i]['pcm'], audio_extend) for i, audio_extend in jobs])
+            for (i, _), samples in zip(jobs, results):
+                queue_tts[i]['pcm'] = samples
+                queue_tts[i]['dubb_time'] = pcm.duration_ms(samples)
         return queue_tts
 
     # 配音预处理，去掉无效字符，整理开始时间
@@ -364,9 +367,9 @@ class WorkerTTS(QThread):
                     "language": self.langcode,
                     "pitch": self.pitch,
                     "volume": self.volume,
-                    "filename": f"{self.tmpdir}/tts-{time.time()}-{it['start_time']}.mp3"})
+                    "filename": f"{self.tmpdir}/tts-{time.time()}-{it['start_time']}{clip_suffix(self.tts_type)}"})
             try:
-                run_tts(queue_tts=copy.deepcopy(queue_tts), language=self.langcode, set_p=False)
+                run_tts(queue_tts=queue_tts, language=self.langcode, set_p=False)
 
                 # 1.首先添加配音时间
                 queue_tts = self._add_dubb_time(queue_tts)
@@ -387,13 +390,7 @@ class WorkerTTS(QThread):
                 if config.settings['remove_white_ms'] > 0:
                     queue_tts = self._remove_white_ms(queue_tts)
                 # 开始合并音频
-                segments = []
-                for i, it in enumerate(queue_tts):
-                    if os.path.exists(it['filename']) and os.path.getsize(it['filename']) > 0:
-                        segments.append(AudioSegment.from_file(it['filename'], format="mp3"))
-                    else:
-                        segments.append(AudioSegment.silent(duration=it['end_time'] - it['start_time']))
-                self.merge_audio_segments(segments=segments, video_time=0, queue_tts=copy.deepcopy(queue_tts),
+                self.merge_audio_segments(video_time=0, queue_tts=[dict(it) for it in queue_tts],
                                           out=f'{self.wavname}-{item["file"]}.wav')
 
             except Exception as e:
@@ -405,18 +402,19 @@ class WorkerTTS(QThread):
                 set_process_box(text=f'{percent}%', type='logs', func_name=self.func_name)
         return errs, length - errs
 
-    def merge_audio_segments(self, *, segments=None, queue_tts=None, video_time=0, out=None):
-        merged_audio = AudioSegment.empty()
+    def merge_audio_segments(self, *, queue_tts=None, video_time=0, out=None):
+        # 先计算每条配音在时间轴上的位置，最后一次写入
+        clips = []
         # start is not 0
-        if queue_tts[0]['start_time'] > 0:
-            silence_duration = queue_tts[0]['start_time']
-            silence = AudioSegment.silent(duration=silence_duration)
-            merged_audio += silence
+        pos = queue_tts[0]['start_time']
         # join
         offset = 0
         for i, it in enumerate(queue_tts):
-            segment = segments[i]
-            the_dur = len(segment)
+            # 未加速的配音在此处解码，每条配音只解码一次
+            if it.get('pcm') is None and it.get('clip'):
+                it['pcm'] = pcm.load_clip(it['clip'])
+            # 没有配音时按字幕时长留空
+            the_dur = pcm.duration_ms(it['pcm']) if it.get('pcm') is not None else it['end_time'] - it['start_time']
             # 字幕可用时间
             raw_dur = it['raw_duration']
             it['start_time'] += offset
@@ -427,31 +425,25 @@ class WorkerTTS(QThread):
             if diff >= 0:
                 it['end_time'] += diff
                 offset += diff
-            # else:
-            # 配音小于原时长，添加静音
-            #    merged_audio += AudioSegment.silent(duration=abs(diff))
 
             if i > 0:
                 silence_duration = it['start_time'] - queue_tts[i - 1]['end_time']
                 # 前面一个和当前之间存在静音区间
                 if silence_duration > 0:
-                    silence = AudioSegment.silent(duration=silence_duration)
-                    merged_audio += silence
+                    pos += silence_duration
             it['startraw'] = ms_to_time_string(ms=it['start_time'])
             it['endraw'] = ms_to_time_string(ms=it['end_time'])
             queue_tts[i] = it
-            merged_audio += segment
+            clips.append((pos, it.get('pcm')))
+            pos += the_dur
 
-        # if video_time > 0 and (len(merged_audio) < video_time):
-        # 末尾补静音
-        #    silence = AudioSegment.silent(duration=video_time - len(merged_audio))
-        #    merged_audio += silence
         # 创建配音后的文件
         try:
-            merged_audio.export(out, format="wav")
+            merged_audio = pcm.render(clips, pos)
+            pcm.save(out, merged_audio)
         except Exception as e:
             raise Exception(f'merge_audio:{str(e)}')
-        return len(merged_audio), queue_tts
+        return pcm.duration_ms(merged_audio), queue_tts
 
     def post_message(self, type, text=""):
         set_process_box(text=text, type=type, func_name=self.func_name)
@@ -130,13 +130,13 @@ separate_status = 'stop'
 exit_soft = False
 
 # 翻译队列
-trans_queue = []
+trans_queue = Queue()
 # 配音队列
-dubb_queue = []
+dubb_queue = Queue()
 # 识别队列
-regcon_queue = []
+regcon_queue = Queue()
 # 合成队列
-compose_queue = []
+compose_queue = Queue()
 # 全局任务id列表
 unidlist = []
 # 全局错误
@@ -191,9 +191,13 @@ def parse_init():
         "voice_silence": 250,
         "interval_split": 10,
         "trans_thread": 15,
+        "trans_cache_mb": 100,
+        "trans_concurrency": 3,
+        "trans_max_tokens": 1000,
         "retries": 2,
         "translation_wait": 0.1,
         "dubbing_thread": 5,
+        "tts_cache_mb": 500,
         "countdown_sec": 15,
         "backaudio_volume": 0.8,
         "separate_sec": 600,
@@ -202,6 +206,9 @@ def parse_init():
         "initial_prompt_zh": "add punctuation after end of each line. 就比如说，我要先去吃饭。segment at end of each  sentence.",
         "whisper_threads": 4,
         "whisper_worker": 1,
+        "whisper_cache_mb": 4000,
+        "whisper_batch_size": 1,
+        "whisper_process_num": 1,
         "beam_size": 5,
         "best_of": 5,
         "temperature": 0,
@@ -216,6 +223,12 @@ def parse_init():
         "gemini_model": "gemini-1.5-pro,gemini-pro,gemini-1.5-flash",
         "zh_hant_s": True,
         "azure_lines": 150,
+        "recogn_worker": 1,
+        "trans_worker": 2,
+        "dubbing_worker": 2,
+        "compose_worker": 1,
+        "stream_trans": False,
+        "stream_dubbing": False,
         "chattts_voice": "11,12,16,2222,4444,6653,7869,9999,5,13,14,1111,3333,4099,5099,5555,8888,6666,7777"
     }
     if not os.path.exists(rootdir + "/videotrans/cfg.json"):
@@ -1,5 +1,6 @@
 import os
 import shutil
+import sys
 import threading
 import time
 
@@ -465,6 +466,12 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
         if configure.TOOLBOX is not None:
             configure.TOOLBOX.close()
+        # 移除已缓存的识别模型，未使用过识别时无需导入
+        if 'videotrans.recognition.pool' in sys.modules:
+            try:
+                sys.modules['videotrans.recognition.pool'].clear()
+            except Exception:
+                pass
         try:
             shutil.rmtree(config.rootdir + "/tmp", ignore_errors=True)
             shutil.rmtree(config.homedir + "/tmp", ignore_errors=True)
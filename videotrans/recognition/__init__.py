@@ -4,6 +4,7 @@ import logging
 
 from .all import recogn as all_recogn
 from .avg import recogn as avg_recogn
+from .multi import recogn as multi_recogn
 from .zh import recogn as zh_recogn
 from .openai import recogn as openai_recogn
 from .google import recogn as google_recogn
@@ -14,6 +15,7 @@ logging.getLogger("faster_whisper").setLevel(logging.DEBUG)
 
 
 # 统一入口
+# callback 不为空时，每条字幕确定后立即回调 callback(srt)，用于识别的同时开始翻译，仅 faster 模式支持
 def run(*,
         type="all",
         detect_language=None,
@@ -23,7 +25,8 @@ def run(*,
         set_p=True,
         inst=None,
         model_type='faster',
-        is_cuda=None
+        is_cuda=None,
+        callback=None
         ):
     if config.exit_soft or (config.current_status != 'ing' and config.box_recogn != 'ing'):
         return False
@@ -66,7 +69,18 @@ def run(*,
             model_name=model_name,
             set_p=set_p,
             inst=inst,
-            is_cuda=is_cuda)
+            is_cuda=is_cuda,
+            callback=callback)
+    elif not is_cuda and int(config.settings['whisper_process_num']) > 1:
+        # CPU 下长音频切分后多进程同时识别
+        rs = multi_recogn(
+            detect_language=detect_language,
+            audio_file=audio_file,
+            cache_folder=cache_folder,
+            model_name=model_name,
+            set_p=set_p,
+            inst=inst,
+            callback=callback)
     else:
         rs = all_recogn(
             detect_language=detect_language,
@@ -75,7 +89,8 @@ def run(*,
             model_name=model_name,
             set_p=set_p,
             inst=inst,
-            is_cuda=is_cuda)
+            is_cuda=is_cuda,
+            callback=callback)
     try:
         if torch.cuda.is_available():
             torch.cuda.empty_cache()
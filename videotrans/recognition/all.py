@@ -4,7 +4,7 @@ import re
 
 from videotrans.configure import config
 from videotrans.util import tools
-from faster_whisper import WhisperModel
+from videotrans.recognition.pool import get_faster_model
 import zhconv
 
 
@@ -15,7 +15,8 @@ def recogn(*,
            model_name="tiny",
            set_p=True,
            inst=None,
-           is_cuda=None):
+           is_cuda=None,
+           callback=None):
     config.logger.info('faster模式 整体识别')
     if config.exit_soft or (config.current_status != 'ing' and config.box_recogn != 'ing'):
         return False
@@ -39,14 +40,14 @@ def recogn(*,
             com_type = 'default'
         local_res = True if model_name.find('/') == -1 else False
 
-        model = WhisperModel(model_name,
-                             device="cuda" if is_cuda else "cpu",
-                             compute_type=com_type,
-                             download_root=down_root,
-                             num_workers=config.settings['whisper_worker'],
-                             cpu_threads=os.cpu_count() if int(config.settings['whisper_threads']) < 1 else int(
-                                 config.settings['whisper_threads']),
-                             local_files_only=local_res)
+        model = get_faster_model(model_name,
+                                 device="cuda" if is_cuda else "cpu",
+                                 compute_type=com_type,
+                                 download_root=down_root,
+                                 num_workers=config.settings['whisper_worker'],
+                                 cpu_threads=os.cpu_count() if int(config.settings['whisper_threads']) < 1 else int(
+                                     config.settings['whisper_threads']),
+                                 local_files_only=local_res)
         if config.current_status != 'ing' and config.box_recogn != 'ing':
             return False
         if not tools.vail_file(audio_file):
@@ -68,130 +69,155 @@ def recogn(*,
                                           word_timestamps=True,
                                           language=detect_language,
                                           initial_prompt=config.settings['initial_prompt_zh'])
-        flag = [
-            ",",
-            ":",
-            "'",
-            "\"",
-            ".",
-            "?",
-            "!",
-            ";",
-            ")",
-            "]",
-            "}",
-            ">",
-            "，",
-            "。",
-            "？",
-            "；",
-            "’",
-            "”",
-            "》",
-            "】",
-            "｝",
-            "！"
-        ]
-        if detect_language[:2].lower() in ['zh', 'ja', 'ko']:
-            flag.append(" ")
-            maxlen = config.settings['cjk_len']
+        raws = segments_to_raws(segments,
+                                duration=info.duration,
+                                detect_language=detect_language,
+                                set_p=set_p,
+                                inst=inst,
+                                callback=callback)
+    except Exception as e:
+        raise
+    else:
+        if detect_language[:2] == 'zh' and config.settings['zh_hant_s']:
+            for i, it in enumerate(raws):
+                raws[i]['text'] = zhconv.convert(it['text'], 'zh-hans')
+        return raws
+
+
+# 按词时间戳和标点将识别结果切分为字幕，segments 中每项需有 text、end、words(start、end、word)
+def segments_to_raws(segments, *, duration=1, detect_language=None, set_p=True, inst=None, callback=None):
+    raws = []
+    flag = [
+        ",",
+        ":",
+        "'",
+        "\"",
+        ".",
+        "?",
+        "!",
+        ";",
+        ")",
+        "]",
+        "}",
+        ">",
+        "，",
+        "。",
+        "？",
+        "；",
+        "’",
+        "”",
+        "》",
+        "】",
+        "｝",
+        "！"
+    ]
+    if detect_language[:2].lower() in ['zh', 'ja', 'ko']:
+        flag.append(" ")
+        maxlen = config.settings['cjk_len']
+    else:
+        maxlen = config.settings['other_len']
+
+    def output(srt):
+        if set_p:
+            tools.set_process(f'{srt["line"]}\n{srt["time"]}\n{srt["text"]}\n\n', 'subtitle')
+            if inst and inst.precent < 55:
+                inst.precent += round(segment.end * 0.5 / duration, 2)
+            tools.set_process(f'{config.transobj["zimuhangshu"]} {srt["line"]}',
+                              btnkey=inst.init['btnkey'] if inst else "")
         else:
-            maxlen = config.settings['other_len']
+            tools.set_process_box(text=f'{srt["line"]}\n{srt["time"]}\n{srt["text"]}\n\n', type="set",
+                                  func_name="shibie")
 
-        def output(srt):
-            if set_p:
-                tools.set_process(f'{srt["line"]}\n{srt["time"]}\n{srt["text"]}\n\n', 'subtitle')
-                if inst and inst.precent < 55:
-                    inst.precent += round(segment.end * 0.5 / info.duration, 2)
-                tools.set_process(f'{config.transobj["zimuhangshu"]} {srt["line"]}',
-                                  btnkey=inst.init['btnkey'] if inst else "")
-            else:
-                tools.set_process_box(text=f'{srt["line"]}\n{srt["time"]}\n{srt["text"]}\n\n', type="set",
-                                      func_name="shibie")
+    # 最后一条字幕可能还会被合并，只有在新字幕加入后，前一条才确定，此时回调
+    def send_callback(srt):
+        if not callback:
+            return
+        srt = dict(srt)
+        if detect_language[:2] == 'zh' and config.settings['zh_hant_s']:
+            srt['text'] = zhconv.convert(srt['text'], 'zh-hans')
+        callback(srt)
 
-        def append_raws(cur):
-            if len(cur['text']) < int(maxlen / 5) and len(raws) > 0:
-                raws[-1]['text'] += cur['text'] if detect_language[:2] in ['ja', 'zh', 'ko'] else f' {cur["text"]}'
-                raws[-1]['end_time'] = cur['end_time']
-                raws[-1][
-                    'time'] = f'{tools.ms_to_time_string(ms=cur["start_time"])} --> {tools.ms_to_time_string(ms=cur["end_time"])}'
-            else:
-                output(cur)
-                raws.append(cur)
+    def append_raws(cur):
+        if len(cur['text']) < int(maxlen / 5) and len(raws) > 0:
+            raws[-1]['text'] += cur['text'] if detect_language[:2] in ['ja', 'zh', 'ko'] else f' {cur["text"]}'
+            raws[-1]['end_time'] = cur['end_time']
+            raws[-1][
+                'time'] = f'{tools.ms_to_time_string(ms=cur["start_time"])} --> {tools.ms_to_time_string(ms=cur["end_time"])}'
+        else:
+            output(cur)
+            if len(raws) > 0:
+                send_callback(raws[-1])
+            raws.append(cur)
 
-        for segment in segments:
-            if len(segment.words) < 1:
-                continue
-            if len(segment.text.strip()) <= maxlen:
+    for segment in segments:
+        if len(segment.words) < 1:
+            continue
+        if len(segment.text.strip()) <= maxlen:
 
-                tmp = {
-                    "line": len(raws) + 1,
-                    "start_time": int(segment.words[0].start * 1000),
-                    "end_time": int(segment.words[-1].end * 1000),
-                    "text": segment.text.strip()
-                }
-                if tmp['end_time'] - tmp['start_time'] >= 1500:
-                    tmp[
-                        "time"] = f'{tools.ms_to_time_string(ms=tmp["start_time"])} --> {tools.ms_to_time_string(ms=tmp["end_time"])}'
-                    append_raws(tmp)
-                    continue
+            tmp = {
+                "line": len(raws) + 1,
+                "start_time": int(segment.words[0].start * 1000),
+                "end_time": int(segment.words[-1].end * 1000),
+                "text": segment.text.strip()
+            }
+            if tmp['end_time'] - tmp['start_time'] >= 1500:
+                tmp[
+                    "time"] = f'{tools.ms_to_time_string(ms=tmp["start_time"])} --> {tools.ms_to_time_string(ms=tmp["end_time"])}'
+                append_raws(tmp)
+                continue
 
-            cur = None
-            for word in segment.words:
-                if not cur:
-                    cur = {"line": len(raws) + 1,
-                           "start_time": int(word.start * 1000),
-                           "end_time": int(word.end * 1000),
-                           "text": word.word}
-                    continue
-                # 第一个字符 是标点并且大于最小字符数
-                if word.word[0] in flag:
-                    cur['end_time'] = int(word.start * 1000)
-                    if cur['end_time'] - cur['start_time'] < 1500:
-                        cur['text'] += word.word
-                        continue
-                    cur[
-                        'time'] = f'{tools.ms_to_time_string(ms=cur["start_time"])} --> {tools.ms_to_time_string(ms=cur["end_time"])}'
-                    cur['text'] = cur['text'].strip()
-                    append_raws(cur)
-                    if len(word.word) < 2:
-                        cur = None
-                        continue
-                    cur = {
-                        "line": len(raws) + 1,
-                        "start_time": int(word.start * 1000),
-                        "end_time": int(word.end * 1000),
-                        "text": word.word[1:]}
+        cur = None
+        for word in segment.words:
+            if not cur:
+                cur = {"line": len(raws) + 1,
+                       "start_time": int(word.start * 1000),
+                       "end_time": int(word.end * 1000),
+                       "text": word.word}
+                continue
+            # 第一个字符 是标点并且大于最小字符数
+            if word.word[0] in flag:
+                cur['end_time'] = int(word.start * 1000)
+                if cur['end_time'] - cur['start_time'] < 1500:
+                    cur['text'] += word.word
                     continue
-                cur['text'] += word.word
-
-                if word.word[-1] in flag or len(cur['text']) >= maxlen * 1.5:
-                    cur['end_time'] = int(word.end * 1000)
-                    if cur['end_time'] - cur['start_time'] < 1500:
-                        continue
-                    cur[
-                        'time'] = f'{tools.ms_to_time_string(ms=cur["start_time"])} --> {tools.ms_to_time_string(ms=cur["end_time"])}'
-                    cur['text'] = cur['text'].strip()
-                    append_raws(cur)
+                cur[
+                    'time'] = f'{tools.ms_to_time_string(ms=cur["start_time"])} --> {tools.ms_to_time_string(ms=cur["end_time"])}'
+                cur['text'] = cur['text'].strip()
+                append_raws(cur)
+                if len(word.word) < 2:
                     cur = None
+                    continue
+                cur = {
+                    "line": len(raws) + 1,
+                    "start_time": int(word.start * 1000),
+                    "end_time": int(word.end * 1000),
+                    "text": word.word[1:]}
+                continue
+            cur['text'] += word.word
 
-            if cur is not None:
-                cur['end_time'] = int(segment.words[-1].end * 1000)
+            if word.word[-1] in flag or len(cur['text']) >= maxlen * 1.5:
+                cur['end_time'] = int(word.end * 1000)
                 if cur['end_time'] - cur['start_time'] < 1500:
                     continue
                 cur[
                     'time'] = f'{tools.ms_to_time_string(ms=cur["start_time"])} --> {tools.ms_to_time_string(ms=cur["end_time"])}'
-                if len(cur['text'].strip()) <= 3:
-                    raws[-1]['text'] += cur['text'].strip()
-                    raws[-1]['end_time'] = cur['end_time']
-                    raws[-1]['time'] = cur['time']
-                else:
-                    cur['text'] = cur['text'].strip()
-                    append_raws(cur)
-    except Exception as e:
-        raise
-    else:
-        if detect_language[:2] == 'zh' and config.settings['zh_hant_s']:
-            for i, it in enumerate(raws):
-                raws[i]['text'] = zhconv.convert(it['text'], 'zh-hans')
-        return raws
+                cur['text'] = cur['text'].strip()
+                append_raws(cur)
+                cur = None
+
+        if cur is not None:
+            cur['end_time'] = int(segment.words[-1].end * 1000)
+            if cur['end_time'] - cur['start_time'] < 1500:
+                continue
+            cur[
+                'time'] = f'{tools.ms_to_time_string(ms=cur["start_time"])} --> {tools.ms_to_time_string(ms=cur["end_time"])}'
+            if len(cur['text'].strip()) <= 3:
+                raws[-1]['text'] += cur['text'].strip()
+                raws[-1]['end_time'] = cur['end_time']
+                raws[-1]['time'] = cur['time']
+            else:
+                cur['text'] = cur['text'].strip()
+                append_raws(cur)
+    if len(raws) > 0:
+        send_callback(raws[-1])
+    return raws
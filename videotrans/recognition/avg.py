@@ -3,14 +3,15 @@ import json
 import os
 import re
 import time
+import zlib
 from datetime import timedelta
 
-from faster_whisper import WhisperModel
+from faster_whisper.audio import decode_audio
 from pydub import AudioSegment
-from pydub.silence import detect_nonsilent
 
 from videotrans.configure import config
 from videotrans.util import tools
+from videotrans.recognition.pool import get_faster_model
 import zhconv
 
 
@@ -20,7 +21,7 @@ def shorten_voice_old(normalized_sound):
     max_interval = int(config.settings['interval_split']) * 1000
     buffer = int(config.settings['voice_silence'])
     nonsilent_data = []
-    audio_chunks = detect_nonsilent(normalized_sound, min_silence_len=int(config.settings['voice_silence']),
+    audio_chunks = tools.detect_nonsilent(normalized_sound, min_silence_len=int(config.settings['voice_silence']),
                                     silence_thresh=-20 - 25)
     # print(audio_chunks)
     for i, chunk in enumerate(audio_chunks):
@@ -38,6 +39,85 @@ def shorten_voice_old(normalized_sound):
     return nonsilent_data
 
 
+# 识别一段，温度不为0时按 faster-whisper 规则依次提高温度重试
+def _transcribe_one(model, audio, detect_language):
+    segments, _ = model.transcribe(audio,
+                                   beam_size=config.settings['beam_size'],
+                                   best_of=config.settings['best_of'],
+                                   condition_on_previous_text=config.settings['condition_on_previous_text'],
+                                   temperature=0 if config.settings['temperature'] == 0 else [0.0, 0.2, 0.4,
+                                                                                              0.6, 0.8, 1.0],
+                                   vad_filter=False,
+                                   language=detect_language,
+                                   initial_prompt=config.settings['initial_prompt_zh'])
+    text = ""
+    for t in segments:
+        text += t.text + " "
+    return text
+
+
+# 逐段识别
+def _serial_transcribe(model, audio_data, nonsilent_data, detect_language):
+    for i, duration in enumerate(nonsilent_data):
+        start_time, end_time, buffered = duration
+        yield i, _transcribe_one(model, audio_data[start_time * 16:end_time * 16], detect_language)
+
+
+# 和 faster-whisper 温度回退的判断条件一致：重复过多或平均对数概率过低
+def _need_fallback(text, score, length):
+    data = text.encode('utf-8')
+    if data and len(data) / len(zlib.compress(data)) > 2.4:
+        return True
+    return score * length / (length + 1) < -1.0
+
+
+# 批量识别，每 batch_size 段一起送入 encoder/decoder，以温度0解码
+# 温度不为0时，按 faster-whisper 规则判断为解码失败的段再单独走逐段识别的温度回退，结果和逐段识别一致
+# 每 batch_size*4 段为一个窗口，窗口内按时长排序分批，时长相近的在同一批，结果仍按原顺序返回
+def _batch_transcribe(model, audio_data, nonsilent_data, detect_language, batch_size):
+    import numpy as np
+    from faster_whisper.audio import pad_or_trim
+    from faster_whisper.tokenizer import Tokenizer
+
+    tokenizer = Tokenizer(model.hf_tokenizer, model.model.is_multilingual, task="transcribe",
+                          language=detect_language)
+    previous_tokens = []
+    if config.settings['initial_prompt_zh']:
+        previous_tokens = tokenizer.encode(" " + config.settings['initial_prompt_zh'].strip())
+    prompt = model.get_prompt(tokenizer, previous_tokens, without_timestamps=True)
+    fallback = config.settings['temperature'] != 0
+    window = batch_size * 4
+    total = len(nonsilent_data)
+    for w in range(0, total, window):
+        idx = sorted(range(w, min(w + window, total)),
+                     key=lambda i: nonsilent_data[i][1] - nonsilent_data[i][0])
+        texts = {}
+        for b in range(0, len(idx), batch_size):
+            if config.exit_soft or (config.current_status != 'ing' and config.box_recogn != 'ing'):
+                return
+            batch = idx[b:b + batch_size]
+            features = np.stack([
+                pad_or_trim(model.feature_extractor(
+                    audio_data[nonsilent_data[i][0] * 16:nonsilent_data[i][1] * 16]))
+                for i in batch
+            ])
+            results = model.model.generate(model.encode(features),
+                                           [prompt] * len(batch),
+                                           beam_size=int(config.settings['beam_size']),
+                                           max_length=448,
+                                           return_scores=True,
+                                           suppress_blank=True,
+                                           suppress_tokens=[-1])
+            for i, res in zip(batch, results):
+                tokens = [t for t in res.sequences_ids[0] if t < tokenizer.eot]
+                texts[i] = tokenizer.decode(tokens)
+                if fallback and _need_fallback(texts[i], res.scores[0], len(tokens)):
+                    start_time, end_time, _ = nonsilent_data[i]
+                    texts[i] = _transcribe_one(model, audio_data[start_time * 16:end_time * 16], detect_language)
+        for i in sorted(texts):
+            yield i, texts[i]
+
+
 def recogn(*,
            detect_language=None,
            audio_file=None,
@@ -45,7 +125,8 @@ def recogn(*,
            model_name="tiny",
            set_p=True,
            inst=None,
-           is_cuda=None):
+           is_cuda=None,
+           callback=None):
     config.logger.info('faster模式均等分割')
     if set_p:
         tools.set_process(config.transobj['fengeyinpinshuju'], btnkey=inst.init['btnkey'] if inst else "")
@@ -60,13 +141,12 @@ def recogn(*,
             raise Exception(config.transobj["createdirerror"])
     if not tools.vail_file(audio_file):
         raise Exception(f'[error]not exists {audio_file}')
-    normalized_sound = AudioSegment.from_wav(audio_file)  # -20.0
     nonslient_file = f'{tmp_path}/detected_voice.json'
     if tools.vail_file(nonslient_file):
         with open(nonslient_file, 'r') as infile:
             nonsilent_data = json.load(infile)
     else:
-        nonsilent_data = shorten_voice_old(normalized_sound)
+        nonsilent_data = shorten_voice_old(AudioSegment.from_wav(audio_file))
         with open(nonslient_file, 'w') as outfile:
             json.dump(nonsilent_data, outfile)
 
@@ -86,34 +166,32 @@ def recogn(*,
             inst.parent.status_text = '下载模型中，用时可能较久' if config.defaulelang == 'zh' else 'Download model from huggingface'
         else:
             inst.parent.status_text = '加载或下载模型中，用时可能较久' if config.defaulelang == 'zh' else 'Load model from local or download model from huggingface'
-    model = WhisperModel(
+    # 参数和整体识别一致，两种模式共用模型池中的同一个模型
+    model = get_faster_model(
         model_name,
-        device="cuda" if config.params['cuda'] else "cpu",
+        device="cuda" if is_cuda else "cpu",
         compute_type=com_type,
         download_root=down_root,
+        num_workers=config.settings['whisper_worker'],
+        cpu_threads=os.cpu_count() if int(config.settings['whisper_threads']) < 1 else int(
+            config.settings['whisper_threads']),
         local_files_only=local_res)
-    for i, duration in enumerate(nonsilent_data):
+    # 一次性解码为 16k float32 数组，每段直接切片传给模型，不再逐段写出 wav，每毫秒16个采样点
+    audio_data = decode_audio(audio_file, sampling_rate=16000)
+    # 批量识别需已知语言，并且每段不超过30s
+    batch_size = int(config.settings['whisper_batch_size'])
+    if batch_size > 1 and detect_language and int(config.settings['interval_split']) <= 30:
+        results = _batch_transcribe(model, audio_data, nonsilent_data, detect_language, batch_size)
+    else:
+        results = _serial_transcribe(model, audio_data, nonsilent_data, detect_language)
+    while 1:
         if config.exit_soft or (config.current_status != 'ing' and config.box_recogn != 'ing'):
             return False
-        start_time, end_time, buffered = duration
-        chunk_filename = tmp_path + f"/c{i}_{start_time // 1000}_{end_time // 1000}.wav"
-        audio_chunk = normalized_sound[start_time:end_time]
-        audio_chunk.export(chunk_filename, format="wav")
-        text = ""
         try:
-            segments, _ = model.transcribe(chunk_filename,
-                                           beam_size=config.settings['beam_size'],
-                                           best_of=config.settings['best_of'],
-                                           condition_on_previous_text=config.settings['condition_on_previous_text'],
-                                           temperature=0 if config.settings['temperature'] == 0 else [0.0, 0.2, 0.4,
-                                                                                                      0.6, 0.8, 1.0],
-                                           vad_filter=False,
-                                           language=detect_language,
-                                           initial_prompt=config.settings['initial_prompt_zh'])
-
-            for t in segments:
-                text += t.text + " "
-
+            i, text = next(results, (None, None))
+            if i is None:
+                break
+            start_time, end_time, buffered = nonsilent_data[i]
             text = f"{text.capitalize()}. ".replace('&#39;', "'")
             text = re.sub(r'&#\d+;', '', text).strip()
             if not text or re.match(r'^[，。、？‘’“”；：（｛｝【】）:;"\'\s \d`!@#$%^&*()_+=.,?/\\-]*$', text):
@@ -124,6 +202,8 @@ def recogn(*,
             end = tools.ms_to_time_string(ms=end_time)
             srt_line = {"line": len(raw_subtitles) + 1, "time": f"{start} --> {end}", "text": text}
             raw_subtitles.append(srt_line)
+            if callback:
+                callback(dict(srt_line))
             if set_p:
                 if inst and inst.precent < 55:
                     inst.precent += 0.1
@@ -137,7 +217,8 @@ def recogn(*,
         except Exception as e:
             # del model
             raise Exception(str(e.args) + str(e))
-
+    if config.exit_soft or (config.current_status != 'ing' and config.box_recogn != 'ing'):
+        return False
     if set_p:
         tools.set_process(f"{config.transobj['yuyinshibiewancheng']} / {len(raw_subtitles)}", 'logs',
                           btnkey=inst.init['btnkey'] if inst else "")
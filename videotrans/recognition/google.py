@@ -5,7 +5,6 @@ import time
 from datetime import timedelta
 
 from pydub import AudioSegment
-from pydub.silence import detect_nonsilent
 
 from videotrans.configure import config
 from videotrans.util import tools
@@ -17,7 +16,7 @@ def shorten_voice_old(normalized_sound):
     max_interval = int(config.settings['interval_split']) * 1000
     buffer = int(config.settings['voice_silence'])
     nonsilent_data = []
-    audio_chunks = detect_nonsilent(normalized_sound, min_silence_len=int(config.settings['voice_silence']),
+    audio_chunks = tools.detect_nonsilent(normalized_sound, min_silence_len=int(config.settings['voice_silence']),
                                     silence_thresh=-20 - 25)
     # print(audio_chunks)
     for i, chunk in enumerate(audio_chunks):
@@ -0,0 +1,156 @@
+# 多进程整体识别，仅 CPU
+# 在静音处将长音频切为 N 段，每段在单独进程中识别，再按偏移时间合并后用整体识别相同的规则切分字幕
+import multiprocessing
+import os
+import wave
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from types import SimpleNamespace
+
+from videotrans.util import region
+
+
+# 在最接近等分点的静音中间切开，返回每段的 (开始采样, 结束采样)
+def _split_regions(audio, speech, num):
+    total = len(audio)
+    gaps = [(speech[i]['end'] + speech[i + 1]['start']) // 2 for i in range(len(speech) - 1)]
+    cuts = []
+    for k in range(1, num):
+        target = total * k // num
+        candidates = [g for g in gaps if g > (cuts[-1] if cuts else 0)]
+        if not candidates:
+            break
+        cuts.append(min(candidates, key=lambda g: abs(g - target)))
+    bounds = [0] + cuts + [total]
+    return [(bounds[i], bounds[i + 1]) for i in range(len(bounds) - 1) if bounds[i + 1] > bounds[i]]
+
+
+def _write_wav(file, data):
+    import numpy as np
+    with wave.open(file, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(16000)
+        f.writeframes((np.clip(data, -1, 1) * 32767).astype(np.int16).tobytes())
+
+
+def recogn(*,
+           detect_language=None,
+           audio_file=None,
+           cache_folder=None,
+           model_name="tiny",
+           set_p=True,
+           inst=None,
+           callback=None):
+    from faster_whisper.audio import decode_audio
+    from faster_whisper.vad import VadOptions, get_speech_timestamps
+
+    from videotrans.configure import config
+    from videotrans.util import tools
+    from videotrans.recognition.all import recogn as all_recogn, segments_to_raws
+    import zhconv
+
+    config.logger.info('faster模式 多进程整体识别')
+    if config.exit_soft or (config.current_status != 'ing' and config.box_recogn != 'ing'):
+        return False
+    if not tools.vail_file(audio_file):
+        raise Exception(f'no exists {audio_file}')
+    audio = decode_audio(audio_file, sampling_rate=16000)
+    # 每段至少5分钟，否则多进程加载模型的开销大于收益
+    num = min(int(config.settings['whisper_process_num']), int(len(audio) / 16000 // 300))
+    regions = []
+    if num > 1:
+        speech = get_speech_timestamps(audio, VadOptions(
+            min_silence_duration_ms=int(config.settings['overall_silence']),
+            threshold=float(config.settings['overall_threshold'])))
+        regions = _split_regions(audio, speech, num)
+    if len(regions) < 2:
+        return all_recogn(detect_language=detect_language,
+                          audio_file=audio_file,
+                          cache_folder=cache_folder,
+                          model_name=model_name,
+                          set_p=set_p,
+                          inst=inst,
+                          is_cuda=False,
+                          callback=callback)
+
+    if set_p:
+        tools.set_process(f"{config.transobj['kaishishibie']} x{len(regions)}",
+                          btnkey=inst.init['btnkey'] if inst else "")
+    threads = os.cpu_count() if int(config.settings['whisper_threads']) < 1 else int(
+        config.settings['whisper_threads'])
+    options = dict(
+        beam_size=config.settings['beam_size'],
+        best_of=config.settings['best_of'],
+        condition_on_previous_text=config.settings['condition_on_previous_text'],
+        temperature=0 if config.settings['temperature'] == 0 else [0.0, 0.2, 0.4, 0.6, 0.8, 1.0],
+        vad_filter=bool(config.settings['vad']),
+        vad_parameters=dict(
+            min_silence_duration_ms=config.settings['overall_silence'],
+            max_speech_duration_s=float('inf'),
+            threshold=config.settings['overall_threshold'],
+            speech_pad_ms=config.settings['overall_speech_pad_ms']
+        ),
+        word_timestamps=True,
+        language=detect_language,
+        initial_prompt=config.settings['initial_prompt_zh'])
+    tasks = []
+    for i, (start, end) in enumerate(regions):
+        region_file = f'{cache_folder}/multi_region_{i}.wav'
+        _write_wav(region_file, audio[start:end])
+        tasks.append({
+            "model_name": model_name,
+            "compute_type": "default",
+            "download_root": config.rootdir + "/models",
+            "cpu_threads": max(1, threads // len(regions)),
+            "local_files_only": model_name.find('/') == -1,
+            "audio_file": region_file,
+            "offset": start / 16000,
+            "options": options
+        })
+    del audio
+
+    # spawn 方式启动，避免子进程继承 Qt 和 CUDA 状态
+    executor = ProcessPoolExecutor(max_workers=len(tasks), mp_context=multiprocessing.get_context('spawn'))
+    futures = [executor.submit(region.transcribe_region, task) for task in tasks]
+
+    # 按顺序取出各段结果，前面的段完成后即可开始切分字幕
+    def segments():
+        for future in futures:
+            while 1:
+                if config.exit_soft or (config.current_status != 'ing' and config.box_recogn != 'ing'):
+                    return
+                try:
+                    result = future.result(timeout=1)
+                    break
+                except TimeoutError:
+                    continue
+            for seg in result:
+                yield SimpleNamespace(text=seg['text'], end=seg['end'],
+                                      words=[SimpleNamespace(**w) for w in seg['words']])
+
+    try:
+        raws = segments_to_raws(segments(),
+                                duration=regions[-1][1] / 16000,
+                                detect_language=detect_language,
+                                set_p=set_p,
+                                inst=inst,
+                                callback=callback)
+    finally:
+        # 停止或出错时正在识别的段不会自行结束，取消未开始的段并结束所有子进程
+        for future in futures:
+            future.cancel()
+        for p in list((getattr(executor, '_processes', None) or {}).values()):
+            if p.is_alive():
+                p.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+        for task in tasks:
+            try:
+                os.unlink(task['audio_file'])
+            except Exception:
+                pass
+    if config.exit_soft or (config.current_status != 'ing' and config.box_recogn != 'ing'):
+        return False
+    if detect_language[:2] == 'zh' and config.settings['zh_hant_s']:
+        for i, it in enumerate(raws):
+            raws[i]['text'] = zhconv.convert(it['text'], 'zh-hans')
+    return raws
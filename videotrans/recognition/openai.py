@@ -6,11 +6,10 @@ from datetime import timedelta
 
 import zhconv
 from pydub import AudioSegment
-from pydub.silence import detect_nonsilent
 
 from videotrans.configure import config
 from videotrans.util import tools
-import whisper
+from videotrans.recognition.pool import get_openai_model
 from whisper.utils import get_writer
 
 
@@ -71,7 +70,7 @@ def recogn(*,
         maxlen = int(config.settings['cjk_len'])
     else:
         maxlen = int(config.settings['other_len'])
-    model = whisper.load_model(
+    model = get_openai_model(
         model_name,
         device="cuda" if is_cuda else "cpu",
         download_root=config.rootdir + "/models"
@@ -0,0 +1,163 @@
+# 进程内共享的 whisper 模型，批量任务和工具箱识别时不再重复加载模型
+# 按最近使用排序，超过 whisper_cache_mb 设定的内存时移除最久未使用的模型
+# 批量任务、工具箱识别结束或停止时移除 cuda 上的模型释放显存，退出软件时全部移除
+import gc
+import os
+import threading
+from collections import OrderedDict
+
+from videotrans.configure import config
+
+_lock = threading.Lock()
+# (模型类型, 模型名, 设备, compute_type, cpu_threads, num_workers) => (模型, 估计占用MB)
+_models = OrderedDict()
+# 同一模型同时只加载一次
+_loading = {}
+# 加载、命中、移除次数
+stats = {"load": 0, "hit": 0, "evict": 0}
+
+# 找不到模型文件时，按模型名粗略估计占用内存 MB
+_SIZE_MB = [
+    ('large', 3100),
+    ('medium', 1550),
+    ('small', 500),
+    ('base', 150),
+    ('tiny', 80)
+]
+
+
+def _estimate_mb(model_name, compute_type):
+    size = 1550
+    name = model_name.lower()
+    for k, v in _SIZE_MB:
+        if name.find(k) > -1:
+            size = v
+            break
+    if str(compute_type).find('int8') > -1:
+        size = size // 2
+    return size
+
+
+# faster-whisper 按模型文件 model.bin 的实际大小估计，文件通常为 float16，int8 时减半，float32 时加倍
+def _faster_mb(model_name, compute_type, download_root):
+    try:
+        from faster_whisper.utils import download_model
+        path = model_name if os.path.isdir(model_name) else download_model(model_name,
+                                                                             local_files_only=True,
+                                                                             cache_dir=download_root)
+        size = os.path.getsize(os.path.join(path, 'model.bin')) // 1024 // 1024
+    except Exception:
+        return _estimate_mb(model_name, compute_type)
+    if str(compute_type).find('int8') > -1:
+        size = size // 2
+    elif compute_type == 'float32':
+        size = size * 2
+    return max(1, size)
+
+
+# openai-whisper 按参数实际占用计算
+def _openai_mb(model, model_name):
+    try:
+        return max(1, sum(p.numel() * p.element_size() for p in model.parameters()) // 1024 // 1024)
+    except Exception:
+        return _estimate_mb(model_name, 'default')
+
+
+def _budget_mb():
+    try:
+        return int(float(config.settings['whisper_cache_mb']))
+    except Exception:
+        return 0
+
+
+def _log(action, key):
+    config.logger.info(
+        f'[whisper pool] {action} {key[1]} {key[2]} {key[3]}, models={len(_models)} load={stats["load"]} hit={stats["hit"]} evict={stats["evict"]}')
+
+
+# 超出预算时移除最久未使用的模型，至少保留刚使用的一个
+def _evict():
+    budget = _budget_mb()
+    total = sum(size for _, size in _models.values())
+    while total > budget and len(_models) > 1:
+        key, (_, size) = _models.popitem(last=False)
+        total -= size
+        stats['evict'] += 1
+        _log('evict', key)
+
+
+# size_mb(model) 在加载后计算占用内存
+def _get(key, size_mb, loader):
+    with _lock:
+        if key in _models:
+            _models.move_to_end(key)
+            stats['hit'] += 1
+            _log('hit', key)
+            return _models[key][0]
+        load_lock = _loading.setdefault(key, threading.Lock())
+    # 加载较慢，不阻塞其他模型的获取
+    with load_lock:
+        with _lock:
+            if key in _models:
+                _models.move_to_end(key)
+                stats['hit'] += 1
+                _log('hit', key)
+                return _models[key][0]
+        model = loader()
+        with _lock:
+            stats['load'] += 1
+            # 预算为0时不缓存，每次重新加载
+            if _budget_mb() > 0:
+                _models[key] = (model, size_mb(model))
+                _evict()
+            _log('load', key)
+            _loading.pop(key, None)
+    return model
+
+
+# faster-whisper 模型
+def get_faster_model(model_name, *, device="cpu", compute_type="default", download_root=None, num_workers=1,
+                     cpu_threads=0, local_files_only=False):
+    key = ('faster', model_name, device, compute_type, int(cpu_threads), int(num_workers))
+
+    def loader():
+        from faster_whisper import WhisperModel
+        return WhisperModel(model_name,
+                            device=device,
+                            compute_type=compute_type,
+                            download_root=download_root,
+                            num_workers=int(num_workers),
+                            cpu_threads=int(cpu_threads),
+                            local_files_only=local_files_only)
+
+    return _get(key, lambda model: _faster_mb(model_name, compute_type, download_root), loader)
+
+
+# openai-whisper 模型
+def get_openai_model(model_name, *, device="cpu", download_root=None):
+    key = ('openai', model_name, device, 'default', 0, 0)
+
+    def loader():
+        import whisper
+        return whisper.load_model(model_name, device=device, download_root=download_root)
+
+    return _get(key, lambda model: _openai_mb(model, model_name), loader)
+
+
+# 移除已缓存的模型，device 不为空时只移除该设备上的，移除 cuda 模型后释放显存
+def clear(device=None):
+    with _lock:
+        keys = [key for key in _models if device is None or key[2] == device]
+        for key in keys:
+            _models.pop(key)
+            _log('clear', key)
+    if not keys:
+        return
+    gc.collect()
+    if device is None or device == 'cuda':
+        try:
+            import torch
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except Exception:
+            pass
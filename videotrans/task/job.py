@@ -1,4 +1,4 @@
-import time
+from queue import Empty
 
 from PySide6.QtCore import QThread
 
@@ -6,22 +6,30 @@ from videotrans.configure import config
 from videotrans.util.tools import set_process
 
 
+# 阻塞取出任务，超时仅用于检查软件是否退出
+def _get_task(queue):
+    while 1:
+        if config.exit_soft:
+            return None
+        try:
+            return queue.get(timeout=1)
+        except Empty:
+            continue
+
+
 class WorkerRegcon(QThread):
     def __init__(self, *, parent=None):
         super().__init__(parent=parent)
 
     def run(self) -> None:
         while 1:
-            if config.exit_soft:
+            trk = _get_task(config.regcon_queue)
+            if trk is None:
                 return
-            if len(config.regcon_queue) < 1:
-                time.sleep(0.5)
-                continue
-            trk = config.regcon_queue.pop(0)
             try:
                 trk.recogn()
                 # 插入翻译队列
-                config.trans_queue.append(trk)
+                config.trans_queue.put(trk)
             except Exception as e:
                 if trk.init['btnkey'] not in config.unidlist:
                     config.unidlist.append(trk.init['btnkey'])
@@ -37,15 +45,12 @@ class WorkerTrans(QThread):
 
     def run(self) -> None:
         while 1:
-            if config.exit_soft:
+            trk = _get_task(config.trans_queue)
+            if trk is None:
                 return
-            if len(config.trans_queue) < 1:
-                time.sleep(0.5)
-                continue
-            trk = config.trans_queue.pop(0)
             try:
                 trk.trans()
-                config.dubb_queue.append(trk)
+                config.dubb_queue.put(trk)
             except Exception as e:
                 if trk.init['btnkey'] not in config.unidlist:
                     config.unidlist.append(trk.init['btnkey'])
@@ -61,15 +66,12 @@ class WorkerDubb(QThread):
 
     def run(self) -> None:
         while 1:
-            if config.exit_soft:
+            trk = _get_task(config.dubb_queue)
+            if trk is None:
                 return
-            if len(config.dubb_queue) < 1:
-                time.sleep(0.5)
-                continue
-            trk = config.dubb_queue.pop(0)
             try:
                 trk.dubbing()
-                config.compose_queue.append(trk)
+                config.compose_queue.put(trk)
             except Exception as e:
                 if trk.init['btnkey'] not in config.unidlist:
                     config.unidlist.append(trk.init['btnkey'])
@@ -85,12 +87,9 @@ class WorkerCompose(QThread):
 
     def run(self) -> None:
         while 1:
-            if config.exit_soft:
+            trk = _get_task(config.compose_queue)
+            if trk is None:
                 return
-            if len(config.compose_queue) < 1:
-                time.sleep(0.5)
-                continue
-            trk = config.compose_queue.pop(0)
             try:
                 trk.hebing()
                 trk.move_at_end()
@@ -105,12 +104,20 @@ class WorkerCompose(QThread):
                     config.unidlist.append(trk.init['btnkey'])
 
 
+# 每个阶段启动的线程数量，在高级设置中配置，最少1个
+def _worker_num(key):
+    try:
+        return max(1, int(config.settings[key]))
+    except Exception:
+        return 1
+
+
 def start_thread(parent):
-    regcon_thread = WorkerRegcon(parent=parent)
-    regcon_thread.start()
-    trans_thread = WorkerTrans(parent=parent)
-    trans_thread.start()
-    dubb_thread = WorkerDubb(parent=parent)
-    dubb_thread.start()
-    compose_thread = WorkerCompose(parent=parent)
-    compose_thread.start()
+    for worker, key in [
+        (WorkerRegcon, 'recogn_worker'),
+        (WorkerTrans, 'trans_worker'),
+        (WorkerDubb, 'dubbing_worker'),
+        (WorkerCompose, 'compose_worker')
+    ]:
+        for _ in range(_worker_num(key)):
+            worker(parent=parent).start()
@@ -7,6 +7,7 @@ from PySide6.QtCore import QThread
 
 from videotrans import translator
 from videotrans.configure import config
+from videotrans.recognition import pool
 from videotrans.task.trans_create import TransCreate
 from videotrans.util import tools
 from videotrans.util.tools import set_process, send_notification
@@ -241,7 +242,7 @@ class Worker(QThread):
                 continue
 
             # 压入识别队列开始执行
-            config.regcon_queue.append(self.tasklist[video.init['btnkey']])
+            config.regcon_queue.put(self.tasklist[video.init['btnkey']])
         # 批量进入等待
         return self.wait_end()
 
@@ -264,12 +265,15 @@ class Worker(QThread):
         # 全部完成
 
         set_process("", 'end')
+        # 批量任务结束，释放显存
+        pool.clear('cuda')
         tools._unlink_tmp()
         config.queue_mp4 = []
         config.unidlist = []
 
     def stop(self):
         set_process("", 'stop')
+        pool.clear('cuda')
         tools._unlink_tmp()
         config.queue_mp4 = []
         config.unidlist = []
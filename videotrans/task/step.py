@@ -8,16 +8,15 @@ import textwrap
 import time
 from pathlib import Path
 
-from pydub import AudioSegment
-
 from videotrans import translator
 from videotrans.configure import config
-from videotrans.util import tools
+from videotrans.util import pcm, tools
 from videotrans.recognition import run as run_recogn
 from videotrans.translator import run as run_trans
-from videotrans.tts import run as run_tts
+from videotrans.tts import clip_suffix, run as run_tts
 import subprocess
 import threading
+from queue import Queue, Empty, Full
 
 
 class Runstep():
@@ -29,6 +28,15 @@ class Runstep():
         self.precent = 1
         self.parent = parent
         self.video_codec = config.settings['video_codec']
+        # 识别同时翻译的线程、待翻译字幕队列、已翻译结果
+        self.stream_thread = None
+        self.stream_queue = None
+        self.stream_source = []
+        self.stream_target = []
+        self.stream_error = None
+        # 边翻译边配音的线程、已翻译字幕通道
+        self.dubb_thread = None
+        self.dubb_channel = None
 
     def _unlink(self, file):
         try:
@@ -58,6 +66,11 @@ class Runstep():
             tools.set_process(config.transobj["running"], btnkey=self.init['btnkey'])
             time.sleep(1)
         # 识别为字幕
+        if self._stream_trans_vail():
+            self._stream_trans_start()
+            if self._stream_dubb_vail():
+                self._stream_dubb_start()
+        ok = False
         try:
             self.precent += 5
             self.parent.status_text = '语音识别文字处理中' if config.defaulelang == 'zh' else 'Speech Recognition to Word Processing'
@@ -73,7 +86,8 @@ class Runstep():
                 detect_language=self.init['detect_language'],
                 cache_folder=self.init['cache_folder'],
                 is_cuda=self.config_params['cuda'],
-                inst=self)
+                inst=self,
+                callback=self.stream_queue.put if self.stream_queue else None)
             self._unlink(self.init['shibie_audio'])
         except Exception as e:
             msg = f'{str(e)}{str(e.args)}'
@@ -99,8 +113,209 @@ class Runstep():
             # 仅提取字幕
             if self.config_params['app_mode'] == 'tiqu':
                 shutil.copy2(self.init['source_sub'], f"{self.obj['output']}/{self.obj['raw_noextname']}.srt")
+            ok = True
+        finally:
+            # 识别结束，通知翻译线程翻译剩余字幕后退出
+            if self.stream_queue:
+                self.stream_queue.put(None)
+            # 识别出错或已停止时不会再执行 trans，通知配音线程退出
+            if not ok:
+                self._stream_dubb_stop()
         return True
 
+    # 是否在识别的同时翻译：已开启 stream_trans，需要翻译，并且翻译前不会暂停等待修改原字幕
+    def _stream_trans_vail(self):
+        if not config.settings['stream_trans'] or self.config_params['model_type'] != 'faster':
+            return False
+        if self.config_params['target_language'] == '-' or self.config_params['target_language'] == \
+                self.config_params['source_language']:
+            return False
+        if self._srt_vail(self.init['target_sub']):
+            return False
+        return self.config_params['is_batch'] or self.config_params['app_mode'] == 'biaozhun_jd'
+
+    def _stream_trans_start(self):
+        self.stream_queue = Queue()
+        self.stream_source = []
+        self.stream_target = []
+        self.stream_error = None
+        self.stream_thread = threading.Thread(target=self._stream_trans_run)
+        self.stream_thread.start()
+
+    # 每凑够 trans_thread 条识别结果即翻译一次，收到 None 时翻译剩余部分并结束
+    def _stream_trans_run(self):
+        split_size = int(config.settings['trans_thread'])
+        chunk = []
+        while 1:
+            srt = self.stream_queue.get()
+            if srt is not None:
+                chunk.append(srt)
+                if len(chunk) < split_size:
+                    continue
+            if len(chunk) > 0 and self.stream_error is None:
+                try:
+                    result = run_trans(
+                        translate_type=self.config_params['translate_type'],
+                        text_list=copy.deepcopy(chunk),
+                        target_language_name=self.config_params['target_language'],
+                        set_p=True,
+                        inst=self,
+                        source_code=self.init['source_language_code'])
+                    if not result:
+                        raise Exception('stop')
+                    self.stream_source += [it['text'].strip() for it in chunk]
+                    self.stream_target += [it['text'] for it in result]
+                    self._stream_dubb_put(result)
+                except Exception as e:
+                    config.logger.error(f'识别同时翻译出错，将在识别完成后重新翻译:{str(e)}')
+                    self.stream_error = str(e)
+            chunk = []
+            if srt is None:
+                return
+
+    # 等待识别同时翻译的结果，和原字幕逐条一致时返回翻译后的字幕，否则返回 None 重新翻译
+    def _stream_trans_end(self, rawsrt):
+        if not self.stream_thread:
+            return None
+        self.stream_thread.join()
+        self.stream_thread = None
+        self.stream_queue = None
+        if self.stream_error or len(self.stream_target) != len(rawsrt):
+            return None
+        if [it['text'].strip() for it in rawsrt] != self.stream_source:
+            return None
+        for i, it in enumerate(rawsrt):
+            it['text'] = self.stream_target[i]
+        return rawsrt
+
+    # 是否边翻译边配音：已开启 stream_dubbing，需要配音，并且配音前不会暂停等待修改目标字幕
+    def _stream_dubb_vail(self):
+        if not config.settings['stream_dubbing'] or self.config_params['app_mode'] in ['tiqu']:
+            return False
+        if self.config_params['voice_role'] in ['No', 'clone']:
+            return False
+        if tools.vail_file(self.init['target_wav']):
+            return False
+        return self.config_params['is_batch'] or self.config_params['app_mode'] == 'biaozhun_jd'
+
+    def _stream_dubb_start(self):
+        if self.dubb_thread:
+            return
+        # 有界通道，翻译最多领先配音 2 批，避免配音跟不上时堆积
+        self.dubb_channel = Queue(maxsize=int(config.settings['trans_thread']) * 2)
+        self.dubb_thread = threading.Thread(target=self._stream_dubb_run)
+        self.dubb_thread.start()
+
+    # 已翻译的字幕送入配音通道，通道满时等待
+    def _stream_dubb_put(self, srt_list):
+        if not self.dubb_channel:
+            return
+        for it in srt_list:
+            while config.current_status == 'ing' and not config.exit_soft and self.dubb_thread.is_alive():
+                try:
+                    self.dubb_channel.put(it, timeout=1)
+                    break
+                except Full:
+                    continue
+
+    # 翻译结束，通知配音线程
+    def _stream_dubb_stop(self):
+        if self.dubb_thread and self.dubb_thread.is_alive():
+            self._stream_dubb_put([None])
+
+    # 从通道中取出已翻译字幕提前配音，文件名和 _before_tts 一致，正式配音时已存在的将跳过
+    def _stream_dubb_run(self):
+        dub_nums = int(config.settings['dubbing_thread'])
+        rate = self._tts_rate()
+        # 序号和文字都取自 _tts_text，和 _before_tts 读取目标字幕文件后一致，被丢弃的字幕不计入序号
+        i = 0
+        end = False
+        while not end:
+            try:
+                it = self.dubb_channel.get(timeout=1)
+            except Empty:
+                if config.exit_soft or config.current_status != 'ing':
+                    return
+                continue
+            queue_tts = []
+            while 1:
+                if it is None:
+                    end = True
+                    break
+                text = self._tts_text(it['text'])
+                if text:
+                    queue_tts.append({
+                        "text": text,
+                        "role": self.config_params['voice_role'],
+                        "rate": rate,
+                        "volume": self.config_params['volume'],
+                        "pitch": self.config_params['pitch'],
+                        "tts_type": self.config_params['tts_type'],
+                        "filename": self._tts_filename(i, self.config_params['voice_role'], text)})
+                    i += 1
+                if len(queue_tts) >= dub_nums:
+                    break
+                try:
+                    it = self.dubb_channel.get_nowait()
+                except Empty:
+                    break
+            if len(queue_tts) < 1 or config.current_status != 'ing':
+                continue
+            try:
+                run_tts(queue_tts=queue_tts,
+                        language=self.init['target_language_code'],
+                        set_p=True,
+                        inst=self)
+            except Exception as e:
+                # 失败的在正式配音时会重新配音
+                config.logger.error(f'边翻译边配音出错:{str(e)}')
+
+    # 一条译文经 _save_srt_target 写入、get_subtitle_from_srt 读取后的文字，读取时会被丢弃的返回空字符串
+    def _tts_text(self, text):
+        content = f"1\n00:00:00,000 --> 00:00:01,000\n{text}\n\n".strip().splitlines()
+        result = tools.format_srt([c for c in content if c.strip()])
+        if len(result) < 1 or not result[0]['text'].strip():
+            return ""
+        return result[0]['text']
+
+    # 等待提前配音结束
+    def _stream_dubb_end(self):
+        if not self.dubb_thread:
+            return
+        self._stream_dubb_stop()
+        self.dubb_thread.join()
+        self.dubb_thread = None
+        self.dubb_channel = None
+
+    # 识别同时翻译的结果被舍弃，丢弃尚未配音的字幕并结束配音线程，重新翻译时从序号 0 重新开始
+    def _stream_dubb_reset(self):
+        if not self.dubb_thread:
+            return
+        while 1:
+            try:
+                self.dubb_channel.get_nowait()
+            except Empty:
+                break
+        self._stream_dubb_end()
+
+    # 分批翻译，每批翻译完成立即送入配音通道
+    def _trans_to_dubb(self, rawsrt):
+        split_size = int(config.settings['trans_thread'])
+        target_srt = []
+        for i in range(0, len(rawsrt), split_size):
+            result = run_trans(
+                translate_type=self.config_params['translate_type'],
+                text_list=rawsrt[i:i + split_size],
+                target_language_name=self.config_params['target_language'],
+                set_p=True,
+                inst=self,
+                source_code=self.init['source_language_code'])
+            if not result:
+                return None
+            target_srt += result
+            self._stream_dubb_put(result)
+        return target_srt
+
     # 字幕是否存在并且有效
     def _srt_vail(self, file):
         if not tools.vail_file(file):
@@ -165,13 +380,21 @@ class Runstep():
         # 开始翻译，禁止修改字幕
         try:
             self.parent.status_text = '字幕文字翻译中' if config.defaulelang == 'zh' else 'Subtitle text translation in progress'
-            target_srt = run_trans(
-                translate_type=self.config_params['translate_type'],
-                text_list=rawsrt,
-                target_language_name=self.config_params['target_language'],
-                set_p=True,
-                inst=self,
-                source_code=self.init['source_language_code'])
+            # 识别时已同时翻译完毕则直接使用
+            target_srt = self._stream_trans_end(rawsrt)
+            if not target_srt:
+                self._stream_dubb_reset()
+            if not target_srt and self._stream_dubb_vail():
+                self._stream_dubb_start()
+                target_srt = self._trans_to_dubb(rawsrt)
+            elif not target_srt:
+                target_srt = run_trans(
+                    translate_type=self.config_params['translate_type'],
+                    text_list=rawsrt,
+                    target_language_name=self.config_params['target_language'],
+                    set_p=True,
+                    inst=self,
+                    source_code=self.init['source_language_code'])
         except Exception as e:
             raise Exception(e)
         else:
@@ -183,6 +406,9 @@ class Runstep():
             if self.config_params['app_mode'] == 'tiqu':
                 shutil.copy2(self.init['target_sub'],
                              f"{self.obj['output']}/{self.obj['raw_noextname']}-{self.init['target_language_code']}.srt")
+        finally:
+            # 翻译结束，通知配音线程配完剩余字幕
+            self._stream_dubb_stop()
 
         return True
 
@@ -219,6 +445,8 @@ class Runstep():
             # 禁止修改字幕
             tools.set_process('dubbing_start', 'timeout_djs', btnkey=self.init['btnkey'])
         tools.set_process(config.transobj['kaishipeiyin'], btnkey=self.init['btnkey'])
+        # 等待翻译时已开始的配音完成
+        self._stream_dubb_end()
         time.sleep(3)
         try:
             self._exec_tts(self._before_tts())
@@ -245,58 +473,31 @@ class Runstep():
 
     def _merge_audio_segments(self, *, queue_tts=None, video_time=0):
         self.parent.status_text = '音频片段连接中' if config.defaulelang == 'zh' else 'Audio clip link in progress'
-        merged_audio = AudioSegment.empty()
-        # start is not 0
-        if queue_tts[0]['start_time_source'] > 0:
-            silence = AudioSegment.silent(duration=queue_tts[0]['start_time_source'])
-            merged_audio += silence
-
+        # 先计算每条配音在时间轴上的位置，最后一次写入
+        clips = []
         # 开始时间
         cur = queue_tts[0]['start_time_source']
-        length = len(queue_tts)
         for i, it in enumerate(queue_tts):
-
-            # 存在有效配音文件则加入，否则配音时长大于0则加入静音
-            segment = None
-            the_ext = it['filename'].split('.')[-1]
-
             # 原始字幕时长
             raw_source = it['end_time_source'] - it['start_time_source']
             if raw_source == 0:
                 continue
-            # 存在配音文件
-            if tools.vail_file(it['filename']):
-                segment = AudioSegment.from_file(it['filename'], format="mp4" if the_ext == 'm4a' else the_ext)
-                it['dubb_time'] = len(segment)
-
+            # 存在配音则加入，否则按原字幕时长留空
+            # 未加速的配音在此处解码，每条配音只解码一次
+            if it.get('pcm') is None and it.get('clip'):
+                it['pcm'] = pcm.load_clip(it['clip'])
+            if it.get('pcm') is not None:
+                it['dubb_time'] = pcm.duration_ms(it['pcm'])
             else:
-                # 不存在配音文件
-                segment = AudioSegment.silent(duration=raw_source)
                 it['dubb_time'] = raw_source
 
-            if i == 0:
-                it['start_time'] = it['start_time_source']
-                it['end_time'] = it['start_time_source'] + it['dubb_time']
-                cur = it['end_time']
-                merged_audio += segment
-            else:
-                if it['start_time_source'] < cur:
-                    # 如果开始时间和上一个结束片段重合
-                    it['start_time'] = cur
-                    it['end_time'] = it['start_time'] + it['dubb_time']
-                    cur = it['end_time']
-                    merged_audio += segment
-                elif it['start_time_source'] >= cur:
-                    # 如果当前开始时间和上一个结束时间之间有间隔，则添加静音
-                    if it['start_time_source'] > cur:
-                        merged_audio += AudioSegment.silent(duration=it['start_time_source'] - cur)
-                    it['start_time'] = it['start_time_source']
-                    it['end_time'] = it['start_time'] + it['dubb_time']
-                    merged_audio += segment
-                    cur = it['end_time']
+            # 如果开始时间和上一个结束片段重合则顺延，有间隔时留空
+            it['start_time'] = max(it['start_time_source'], cur)
+            it['end_time'] = it['start_time'] + it['dubb_time']
+            cur = it['end_time']
+            clips.append((it['start_time'], it.get('pcm')))
 
             if cur < it['end_time_source']:
-                merged_audio += AudioSegment.silent(duration=it['end_time_source'] - cur)
                 cur = it['end_time_source']
                 it['end_time'] = cur
 
@@ -305,19 +506,18 @@ class Runstep():
             queue_tts[i] = it
             tools.set_process(text=f"audio concat:{i}", btnkey=self.init['btnkey'])
 
-        print(f'合成音频后时长={len(merged_audio)},{video_time=}')
-        # 移除尾部静音
-
-        if not self.config_params['video_autorate'] and video_time > 0 and merged_audio and (
-                len(merged_audio) < video_time):
-            # 末尾补静音
-            silence = AudioSegment.silent(duration=video_time - len(merged_audio))
-            merged_audio += silence
+        # 末尾补静音
+        duration = cur
+        if not self.config_params['video_autorate'] and video_time > 0 and cur > 0 and cur < video_time:
+            duration = video_time
+        merged_audio = pcm.render(clips, duration)
+        audio_length = pcm.duration_ms(merged_audio)
+        print(f'合成音频后时长={audio_length},{video_time=}')
 
         # 创建配音后的文件
         try:
             wavfile = self.init['cache_folder'] + "/target.wav"
-            merged_audio.export(wavfile, format="wav")
+            pcm.save(wavfile, merged_audio)
 
             if self.config_params['app_mode'] == 'peiyin' and tools.vail_file(self.init['background_music']):
                 cmd = ['-y', '-i', wavfile, '-i', self.init['background_music'], '-filter_complex',
@@ -328,8 +528,7 @@ class Runstep():
                 tools.wav2m4a(wavfile, self.init['target_wav'])
         except Exception as e:
             raise Exception(f'[error]merged_audio:{str(e)}')
-        print(f'合成音频返回时 {len(merged_audio)=}')
-        return len(merged_audio), queue_tts
+        return audio_length, queue_tts
 
     # 保存字幕文件 到目标文件夹
     def _save_srt_target(self, srtstr, file):
@@ -368,11 +567,7 @@ class Runstep():
                 raise Exception("字幕格式不正确，请打开查看")
         except Exception as e:
             raise Exception(f'格式化字幕失败:{str(e)}')
-        rate = int(str(self.config_params['voice_rate']).replace('%', ''))
-        if rate >= 0:
-            rate = f"+{rate}%"
-        else:
-            rate = f"{rate}%"
+        rate = self._tts_rate()
         # 取出设置的每行角色
         line_roles = self.config_params["line_roles"] if "line_roles" in self.config_params else None
         # 取出每一条字幕，行号\n开始时间 --> 结束时间\n内容
@@ -381,13 +576,9 @@ class Runstep():
             voice_role = self.config_params['voice_role']
             if line_roles and f'{it["line"]}' in line_roles:
                 voice_role = line_roles[f'{it["line"]}']
-            newrole = voice_role.replace('/', '-').replace('\\', '/')
-            filename = f'{i}-{newrole}-{self.config_params["voice_rate"]}-{self.config_params["voice_autorate"]}-{it["text"]}-{self.config_params["volume"].replace("%", "")}-{self.config_params["pitch"]}'
-            md5_hash = hashlib.md5()
-            md5_hash.update(f"{filename}".encode('utf-8'))
             # 要保存到的文件
             # clone-voice同时也是音色复制源
-            filename = self.init['cache_folder'] + "/" + md5_hash.hexdigest() + ".mp3"
+            filename = self._tts_filename(i, voice_role, it['text'])
             # 如果是clone-voice类型， 需要截取对应片段
             if it['end_time'] <= it['start_time']:
                 continue
@@ -419,6 +610,20 @@ class Runstep():
                 "filename": filename})
         return queue_tts
 
+    def _tts_rate(self):
+        rate = int(str(self.config_params['voice_rate']).replace('%', ''))
+        if rate >= 0:
+            return f"+{rate}%"
+        return f"{rate}%"
+
+    # 配音文件名，第 i 条字幕的角色、语速、文字等相同时文件名相同
+    def _tts_filename(self, i, voice_role, text):
+        newrole = voice_role.replace('/', '-').replace('\\', '/')
+        filename = f'{i}-{newrole}-{self.config_params["voice_rate"]}-{self.config_params["voice_autorate"]}-{text}-{self.config_params["volume"].replace("%", "")}-{self.config_params["pitch"]}'
+        md5_hash = hashlib.md5()
+        md5_hash.update(f"{filename}".encode('utf-8'))
+        return self.init['cache_folder'] + "/" + md5_hash.hexdigest() + clip_suffix(self.config_params['tts_type'])
+
     # 1. 将每个配音的实际长度加入 dubb_time
     def _add_dubb_time(self, queue_tts):
 
@@ -447,11 +652,14 @@ class Runstep():
             it['video_extend'] = -1
 
             # 记录实际配音后，未经任何处理的真实配音时长
-            if tools.vail_file(it['filename']):
-                the_ext = it['filename'].split('.')[-1]
-                it['dubb_time'] = len(
-                    AudioSegment.from_file(it['filename'], format="mp4" if the_ext == 'm4a' else the_ext))
+            # 时长取自配音时记录的采样数，没有时只读取文件头，配音在加速或最终合成时才解码为 it['pcm']
+            if not it.get('clip') and tools.vail_file(it['filename']):
+                it['clip'] = pcm.probe(it['filename'])
+            it['pcm'] = None
+            if it.get('clip') and it['clip']['samples'] > 0:
+                it['dubb_time'] = pcm.clip_ms(it['clip'])
             else:
+                it['clip'] = None
                 # 不存在配音
                 it['dubb_time'] = 0
                 it['video_extend'] = 0
@@ -523,12 +731,14 @@ class Runstep():
         self.parent.status_text = '音频加速处理中' if config.defaulelang == 'zh' else 'Audio acceleration in progress'
         # 允许最大音频加速倍数
         max_speed = float(config.settings['audio_rate'])
+        # 需要加速的 (索引, 加速后时长)，全部计算完毕后一次批量加速
+        jobs = []
         for i, it in enumerate(queue_tts):
             jindu = (length * 10) / (i + 1)
             if self.precent + jindu < 95:
                 self.precent += jindu
-            # 不需要或不存在配音文件 跳过
-            if not it['speed'] or not tools.vail_file(it['filename']):
+            # 不需要或不存在配音 跳过
+            if not it['speed'] or it['clip'] is None:
                 continue
 
             tools.set_process(f"{config.transobj['dubbing speed up']} [{i}]", btnkey=self.init['btnkey'])
@@ -564,142 +774,68 @@ class Runstep():
                     audio_extend = int(it['dubb_time'] / max_speed)
                 print(f'仅音频加速，{shound_speed=},{audio_extend=},{it["dubb_time"]=}')
 
-            # # 调整音频
-            tmp_mp3 = f'{it["filename"]}-speed.mp3'
-            tools.precise_speed_up_audio(file_path=it['filename'],
-                                         out=tmp_mp3,
-                                         target_duration_ms=audio_extend,
-                                         max_rate=100)
-
-            # 获取实际加速完毕后的真实配音时长，因为精确度原因，未必和上述计算出的一致
-            # 如果视频需要变化，更新视频时长需要变化的长度
-            if tools.vail_file(tmp_mp3):
-                mp3_len = len(AudioSegment.from_file(tmp_mp3, format="mp3"))
-                it['filename'] = tmp_mp3
-                it['dubb_time'] = mp3_len
-            queue_tts[i] = it
+            # 只解码需要加速的配音
+            it['pcm'] = pcm.load_clip(it['clip'])
+            if it['pcm'] is not None:
+                jobs.append((i, audio_extend))
+        if not jobs:
+            return queue_tts
+        tools.set_process(f"{config.transobj['dubbing speed up']} [{len(jobs)}]", btnkey=self.init['btnkey'])
+        # 在内存中变速不变调，结果恰好为 audio_extend 毫秒
+        results = pcm.speed_up_batch([(queue_tts[i]['pcm'], audio_extend) for i, audio_extend in jobs])
+        for (i, _), samples in zip(jobs, results):
+            queue_tts[i]['pcm'] = samples
+            queue_tts[i]['dubb_time'] = pcm.duration_ms(samples)
         return queue_tts
 
-    # 视频慢速 在配音加速调整后，根据字幕实际开始结束时间，裁剪视频，慢速播放实现对齐
+    # 视频慢速 在配音加速调整后，根据字幕实际开始结束时间，将需要延长的区间慢速播放实现对齐
+    # 所有区间在一个 setpts 表达式中按分段线性映射重新计算时间戳，整个视频只解码、编码一次
     def _ajust_video(self, queue_tts):
         if not self.config_params['video_autorate'] or int(config.settings['video_rate']) <= 1:
             return queue_tts
-        concat_txt_arr = []
         if not tools.is_novoice_mp4(self.init['novoice_mp4'], self.init['noextname']):
             raise Exception("not novoice mp4")
-        self.parent.status_text = '连接视频片段中' if config.defaulelang == 'zh' else 'Connecting video clips'
+        self.parent.status_text = config.transobj['videodown..']
         # 获取视频时长
         last_time = tools.get_video_duration(self.init['novoice_mp4'])
-        self.parent.status_text = config.transobj['videodown..']
 
-        length = len(queue_tts)
         max_pts = int(config.settings['video_rate'])
-        # 按照原始字幕截取
+        # 按顺序首尾相接的区间 [开始毫秒, 结束毫秒, 慢放倍数]，结束为 None 表示到视频末尾
+        segments = []
+        # 上一条字幕结束时间
+        prev_end = 0
+        length = len(queue_tts)
         for i, it in enumerate(queue_tts):
-            jindu = (length * 10) / (i + 1)
-            if self.precent + jindu < 95:
-                self.precent += jindu
-
             # 可用的时长
             able_time = it['end_time_source'] - it['start_time_source']
             # 视频需要和配音对齐，video_extend是需要增加的时长
             it['video_extend'] = it['dubb_time'] - able_time
-            queue_tts[i] = it
-
-            # 如果i==0即第一个视频，前面若是还有片段，需要截取
-            if i == 0:
-                # 如果前面有大于 0 的片段，需截取
-                if it['start_time_source'] > 0:
-                    before_dst = self.init['cache_folder'] + f'/{i}-before.mp4'
-                    # 下一片段起始时间
-                    st_time = it['start_time_source']
-                    try:
-                        tools.cut_from_video(ss='00:00:00.000',
-                                             to=tools.ms_to_time_string(ms=it['start_time_source']),
-                                             source=self.init['novoice_mp4'],
-                                             out=before_dst)
-                        concat_txt_arr.append(before_dst)
-                    except Exception:
-                        pass
-                else:
-                    # 下一片段起始时间,从视频开始处
-                    st_time = 0
-
-                # 当前视频实际时长
-                duration = it['end_time_source'] - st_time
-                # 是否需要延长视频
-                pts = ""
-                if it['video_extend'] > 0:
-                    pts = round((it['video_extend'] + duration) / duration, 2)
-                    if pts > max_pts:
-                        pts = max_pts
-                        it['video_extend'] = duration * max_pts - duration
-                tools.set_process(f"{config.transobj['videodown..']} {pts=}", btnkey=self.init['btnkey'])
-                before_dst = self.init['cache_folder'] + f'/{i}-current.mp4'
-                try:
-                    tools.cut_from_video(
-                        ss='00:00:00.000' if st_time == 0 else tools.ms_to_time_string(ms=st_time),
-                        to=tools.ms_to_time_string(ms=it['end_time_source']),
-                        source=self.init['novoice_mp4'],
-                        pts=pts,
-                        out=before_dst
-                    )
-                    concat_txt_arr.append(before_dst)
-                    it['video_extend'] = tools.get_video_duration(before_dst) - duration
-                except Exception:
-                    pass
-            else:
-                # 距离前面一个的时长
-                diff = it['start_time_source'] - queue_tts[i - 1]['end_time_source']
-                if diff > 0:
-                    before_dst = self.init['cache_folder'] + f'/{i}-before.mp4'
-                    st_time = it['start_time_source']
-                    try:
-                        tools.cut_from_video(
-                            ss=tools.ms_to_time_string(ms=queue_tts[i - 1]['end_time_source']),
-                            to=tools.ms_to_time_string(ms=it['start_time_source']),
-                            source=self.init['novoice_mp4'],
-                            out=before_dst
-                        )
-                        concat_txt_arr.append(before_dst)
-                    except Exception:
-                        pass
-                else:
-                    st_time = queue_tts[i - 1]['end_time_source']
-
-                # 是否需要延长视频
-                pts = ""
-                duration = it['end_time_source'] - st_time
-                if it['video_extend'] > 0:
-                    pts = round((it['video_extend'] + duration) / duration, 2)
-                    if pts > max_pts:
-                        pts = max_pts
-                        it['video_extend'] = duration * max_pts - duration
-                tools.set_process(f"{config.transobj['videodown..']} {pts=}", btnkey=self.init['btnkey'])
-                before_dst = self.init['cache_folder'] + f'/{i}-current.mp4'
-
-                try:
-                    tools.cut_from_video(ss=tools.ms_to_time_string(ms=st_time),
-                                         to=tools.ms_to_time_string(ms=it['end_time_source']),
-                                         source=self.init['novoice_mp4'],
-                                         pts=pts,
-                                         out=before_dst)
-                    concat_txt_arr.append(before_dst)
-                    it['video_extend'] = tools.get_video_duration(before_dst) - duration
 
-                except Exception:
-                    pass
-                # 是最后一个，并且未到视频末尾
-                if i == length - 1 and it['end_time_source'] < last_time:
-                    # 最后一个
-                    before_dst = self.init['cache_folder'] + f'/{i}-after.mp4'
-                    try:
-                        tools.cut_from_video(ss=tools.ms_to_time_string(ms=it['end_time_source']),
-                                             source=self.init['novoice_mp4'],
-                                             out=before_dst)
-                        concat_txt_arr.append(before_dst)
-                    except Exception:
-                        pass
+            # 和前一条之间的间隔原速播放，和前一条重合时从前一条结束处开始
+            st_time = prev_end
+            if it['start_time_source'] > prev_end:
+                segments.append([prev_end, it['start_time_source'], 1])
+                st_time = it['start_time_source']
+            # 当前视频实际时长
+            duration = it['end_time_source'] - st_time
+            if duration <= 0:
+                it['video_extend'] = 0
+                queue_tts[i] = it
+                continue
+            # 是否需要延长视频
+            pts = 1
+            if it['video_extend'] > 0:
+                pts = min(round((it['video_extend'] + duration) / duration, 2), max_pts)
+            it['video_extend'] = int(duration * pts) - duration
+            segments.append([st_time, it['end_time_source'], pts])
+            prev_end = it['end_time_source']
+            queue_tts[i] = it
+            tools.set_process(f"{config.transobj['videodown..']} {pts=}", btnkey=self.init['btnkey'])
+        # 最后一条之后到视频末尾，最后一个区间不设结束时间，避免末尾的帧落在所有区间之外
+        if prev_end < last_time:
+            segments.append([prev_end, None, 1])
+        elif segments:
+            segments[-1][1] = None
 
         # 需要调整 原字幕时长，延长视频相当于延长了原字幕时长
         offset = 0
@@ -711,24 +847,61 @@ class Runstep():
                 offset += it['video_extend']
             queue_tts[i] = it
 
-        # 将所有视频片段连接起来
-        new_arr = []
-        for it in concat_txt_arr:
-            if tools.vail_file(it):
-                new_arr.append(it)
-        if len(new_arr) > 0:
-            tools.set_process(f"连接视频片段..." if config.defaulelang == 'zh' else 'concat multi mp4 ...',
-                              btnkey=self.init['btnkey'])
-            tools.concat_multi_mp4(filelist=concat_txt_arr, out=self.init['novoice_mp4'])
+        if not any(pts > 1 for _, _, pts in segments):
+            return queue_tts
+        tools.set_process(f"{config.transobj['videodown..']} {len(segments)}", btnkey=self.init['btnkey'])
+        script = self.init['cache_folder'] + "/retime.txt"
+        with open(script, 'w', encoding='utf-8') as f:
+            f.write(f"[0:v]setpts=PTS-STARTPTS,setpts=({self._retime_expr(segments)})/TB[v]")
+        out = self.init['cache_folder'] + "/novoice-retime.mp4"
+        tools.runffmpeg([
+            '-y',
+            '-i',
+            self.init['novoice_mp4'],
+            '-filter_complex_script',
+            script,
+            '-map',
+            '[v]',
+            '-c:v',
+            f'libx{self.video_codec}',
+            '-an',
+            '-crf',
+            f'{config.settings["crf"]}',
+            '-preset',
+            config.settings['preset'],
+            out
+        ])
+        if tools.vail_file(out):
+            shutil.move(out, self.init['novoice_mp4'])
         return queue_tts
 
+    # 分段线性时间映射表达式，T 为原视频中的秒数，返回新视频中的秒数
+    # 每个区间一项，按二分方式加括号求和，避免上千个区间时表达式嵌套过深
+    def _retime_expr(self, segments):
+        terms = []
+        new_start = 0
+        for start, end, pts in segments:
+            s = start / 1000
+            cond = f'gte(T,{s})' if end is None else f'gte(T,{s})*lt(T,{end / 1000})'
+            terms.append(f'{cond}*({new_start / 1000}+(T-{s})*{pts})')
+            if end is not None:
+                new_start += (end - start) * pts
+
+        def join(items):
+            if len(items) == 1:
+                return items[0]
+            mid = len(items) // 2
+            return f'({join(items[:mid])})+({join(items[mid:])})'
+
+        return join(terms)
+
     def _exec_tts(self, queue_tts):
         if not queue_tts or len(queue_tts) < 1:
             raise Exception(f'Queue tts length is 0')
         # 具体配音操作
         try:
 
-            run_tts(queue_tts=copy.deepcopy(queue_tts),
+            run_tts(queue_tts=queue_tts,
                     language=self.init['target_language_code'],
                     set_p=True,
                     inst=self)
@@ -752,16 +925,6 @@ class Runstep():
 
         # 如果仅需配音
         if self.config_params['app_mode'] == 'peiyin':
-            segments = []
-            start_times = []
-            for i, it in enumerate(queue_tts):
-                if it['dubb_time'] > 0 and tools.vail_file(it['filename']):
-                    the_ext = it['filename'].split('.')[-1]
-                    segments.append(
-                        AudioSegment.from_file(it['filename'], format="mp4" if the_ext == 'm4a' else the_ext))
-                    start_times.append(it['start_time'])
-                else:
-                    segments.append(AudioSegment.silent(duration=it['end_time'] - it['start_time']))
             self._merge_audio_segments(queue_tts=queue_tts)
             return True
 
@@ -775,9 +938,10 @@ class Runstep():
         if not tools.is_novoice_mp4(self.init['novoice_mp4'], self.init['noextname']):
             raise Exception("not novoice mp4")
         video_time = tools.get_video_duration(self.init['novoice_mp4'])
+        # 浅复制，PCM 数组不会被修改，无需深复制
         audio_length, queue_tts = self._merge_audio_segments(
             video_time=video_time,
-            queue_tts=copy.deepcopy(queue_tts))
+            queue_tts=[dict(it) for it in queue_tts])
 
         # 更新字幕
         srt = ""
@@ -852,72 +1016,57 @@ class Runstep():
         Path(f"{self.init['novoice_mp4']}.raw.mp4").unlink(missing_ok=True)
         return True
 
-    # 添加背景音乐
-    def _back_music(self):
-        if config.current_status !='ing':
-            return
-        if self.config_params['app_mode'] not in ["tiqu", "peiyin"] and self.config_params[
-            'voice_role'] != 'No' and tools.vail_file(self.init['target_wav']) and tools.vail_file(
-            self.init['background_music']):
-            try:
-                self.parent.status_text = '添加背景音频' if config.defaulelang == 'zh' else 'Adding background audio'
-                # 获取视频长度
-                vtime = tools.get_video_info(self.init['novoice_mp4'], video_time=True)
-                vtime /= 1000
-                # 获取音频长度
-                atime = tools.get_audio_time(self.init['background_music'])
-
-                # 转为m4a
-                if not self.init['background_music'].lower().endswith('.m4a'):
-                    tmpm4a = self.init['cache_folder'] + f"/background_music-wav-m4a.m4a"
-                    tools.wav2m4a(self.init['background_music'], tmpm4a)
-                    self.init['background_music'] = tmpm4a
-                beishu = math.ceil(vtime / atime)
-                if config.settings['loop_backaudio'] and beishu > 1 and vtime - 1 > atime:
-                    # 获取延长片段
-
-                    tools.concat_multi_audio(filelist=[self.init['background_music'] for n in range(beishu + 1)],
-                                             out=self.init['cache_folder'] + "/background_music-concat-extend.m4a")
-                    self.init['background_music'] = self.init['cache_folder'] + "/background_music-concat-extend.m4a"
-                # 背景音频降低音量
-                tools.runffmpeg(
-                    ['-y', '-i', self.init['background_music'], "-filter:a",
-                     f"volume={config.settings['backaudio_volume']}",
-                     '-c:a', 'aac',
-                     self.init['cache_folder'] + f"/background_music-volume.m4a"])
-                # 背景音频和配音合并
-                cmd = ['-y', '-i', self.init['target_wav'], '-i',
-                       self.init['cache_folder'] + f"/background_music-volume.m4a",
-                       '-filter_complex', "[0:a][1:a]amix=inputs=2:duration=first:dropout_transition=2", '-ac', '2',
-                       self.init['cache_folder'] + f"/lastend.m4a"]
-                tools.runffmpeg(cmd)
-                self.init['target_wav'] = self.init['cache_folder'] + f"/lastend.m4a"
-            except Exception as e:
-                config.logger.error(f'添加背景音乐失败:{str(e)}')
-
-    def _separate(self):
-        if config.current_status !='ing':
-            return
-        if self.config_params['is_separate'] and tools.vail_file(self.init['target_wav']):
-            try:
-                self.parent.status_text = '重新嵌入背景音' if config.defaulelang == 'zh' else 'Re-embedded background sounds'
-                # 原始背景音乐 wav,和配音后的文件m4a合并
-                # 获取视频长度
-                vtime = tools.get_video_info(self.init['novoice_mp4'], video_time=True)
-                vtime /= 1000
-                # 获取音频长度
-                atime = tools.get_audio_time(self.init['instrument'])
-                beishu = math.ceil(vtime / atime)
-                config.logger.info(f'合并背景音 {beishu=},{atime=},{vtime=}')
-                if config.settings['loop_backaudio'] and atime + 1 < vtime:
-                    # 背景音连接延长片段
-                    tools.concat_multi_audio(filelist=[self.init['instrument'] for n in range(beishu + 1)],
-                                             out=self.init['cache_folder'] + "/instrument-concat.m4a")
-                    self.init['instrument'] = self.init['cache_folder'] + f"/instrument-concat.m4a"
-                # 背景音合并配音
-                tools.backandvocal(self.init['instrument'], self.init['target_wav'])
-            except Exception as e:
-                config.logger.error('合并原始背景失败' + config.transobj['Error merging background and dubbing'] + str(e))
+    # 合成视频使用的配音，优先使用未编码的 wav
+    def _dubbing_file(self):
+        wavfile = self.init['cache_folder'] + "/target.wav"
+        return wavfile if tools.vail_file(wavfile) else self.init['target_wav']
+
+    # 配音、背景音乐、分离出的原背景声在一个 filter_complex 中完成循环、音量、补静音和混合
+    # 输出无损 flac，只在最终合成视频时编码一次，返回用于合成视频的音频文件
+    # duration_ms > 0 时配音末尾补静音到该时长
+    def _mixdown(self, duration_ms=0):
+        dubbing = self._dubbing_file()
+        if config.current_status != 'ing':
+            return dubbing
+        # (文件, 混合权重)，和原先先混合背景音乐、再混合原背景声时各自的音量比例一致
+        backs = []
+        if self.config_params['app_mode'] not in ["tiqu", "peiyin"] and tools.vail_file(
+                self.init['background_music']):
+            backs.append((self.init['background_music'], 1))
+        if self.config_params['is_separate'] and tools.vail_file(self.init['instrument']):
+            backs.append((self.init['instrument'], len(backs) + 1))
+        if not backs and duration_ms <= 0:
+            return dubbing
+
+        self.parent.status_text = '添加背景音频' if config.defaulelang == 'zh' else 'Adding background audio'
+        cmd = ['-y', '-i', Path(dubbing).as_posix()]
+        filters = []
+        last = '0:a'
+        if duration_ms > 0:
+            filters.append(f'[0:a]apad=whole_dur={duration_ms / 1000}[dub]')
+            last = 'dub'
+        if backs:
+            labels = [f'[{last}]']
+            weights = ['1']
+            for n, (file, weight) in enumerate(backs, start=1):
+                # 循环输入，长度由配音决定
+                if config.settings['loop_backaudio']:
+                    cmd += ['-stream_loop', '-1']
+                cmd += ['-i', Path(file).as_posix()]
+                filters.append(f'[{n}:a]volume={config.settings["backaudio_volume"]}[back{n}]')
+                labels.append(f'[back{n}]')
+                weights.append(str(weight))
+            filters.append(
+                f'{"".join(labels)}amix=inputs={len(labels)}:duration=first:dropout_transition=2:weights={" ".join(weights)}[mix]')
+            last = 'mix'
+        out = self.init['cache_folder'] + "/mixdown.flac"
+        cmd += ['-filter_complex', ";".join(filters), '-map', f'[{last}]', '-ac', '2', '-c:a', 'flac', out]
+        try:
+            tools.runffmpeg(cmd)
+        except Exception as e:
+            config.logger.error(f'添加背景音频失败:{str(e)}')
+            return dubbing
+        return out
 
     # 最终合成视频 source_mp4=原始mp4视频文件，noextname=无扩展名的视频文件名字
     def _compos_video(self):
@@ -946,6 +1095,8 @@ class Runstep():
         # 硬字幕仅名字 需要和视频在一起
         hard_srt = "tmp.srt"
         hard_srt_path = Path(mp4_dirpath / hard_srt)
+        # ffmpeg 执行目录，硬字幕时为视频目录，软字幕时为字幕目录，不再使用 os.chdir 以便多个合成线程同时执行
+        ffmpeg_cwd = None
 
         # 存放目标字幕
         target_sub_list = []
@@ -1000,7 +1151,7 @@ class Runstep():
                                                           replace_whitespace=False).strip().replace('\n', '\\N')
                         text += "\n\n"
                     hard_srt_path.write_text(text.strip(), encoding="utf-8", errors="ignore")
-                    os.chdir(mp4_dirpath)
+                    ffmpeg_cwd = mp4_dirpath.as_posix()
                     shutil.copy2(hard_srt_path.as_posix(), f"{self.obj['output']}/shuang.srt")
                     hard_srt = tools.set_ass_font(hard_srt_path.as_posix())
 
@@ -1031,7 +1182,7 @@ class Runstep():
                                                                                                                  '\\N')
                         text += f"{it['line']}\n{it['time']}\n{it['text'].strip()}\n\n"
                     hard_srt_path.write_text(text, encoding='utf-8', errors="ignore")
-                    os.chdir(mp4_dirpath)
+                    ffmpeg_cwd = mp4_dirpath.as_posix()
                     hard_srt = tools.set_ass_font(hard_srt_path.as_posix())
                 # 单软
                 elif self.config_params['subtitle_type'] in [2, 4]:
@@ -1043,17 +1194,19 @@ class Runstep():
         # 分离背景音和添加背景音乐
 
         # 有配音 延长视频或音频对齐
+        pad_ms = 0
         if self.config_params['voice_role'] != 'No' and self.config_params['append_video']:
             video_time = tools.get_video_duration(novoice_mp4)
+            dubbing = self._dubbing_file()
             try:
-                audio_length = int(tools.get_audio_time(self.init['target_wav']) * 1000)
+                audio_length = int(tools.get_audio_time(dubbing) * 1000)
             except Exception:
                 audio_length = 0
             if audio_length > 0 and audio_length > video_time:
                 try:
                     # 先对音频末尾移除静音
-                    tools.remove_silence_from_end(self.init['target_wav'], is_start=False)
-                    audio_length = int(tools.get_audio_time(self.init['target_wav']) * 1000)
+                    tools.remove_silence_from_end(dubbing, is_start=False)
+                    audio_length = int(tools.get_audio_time(dubbing) * 1000)
                 except Exception:
                     audio_length = 0
             if audio_length > 0 and audio_length > video_time:
@@ -1065,15 +1218,10 @@ class Runstep():
                 except Exception as e:
                     config.logger.error(f'视频末尾延长失败:{str(e)}')
             elif audio_length > 0 and video_time > audio_length:
-                ext = self.init['target_wav'].split('.')[-1]
-                m = AudioSegment.from_file(
-                    self.init['target_wav'],
-                    format="mp4" if ext == 'm4a' else ext) + AudioSegment.silent(
-                    duration=video_time - audio_length)
-                m.export(self.init['target_wav'], format="mp4" if ext == 'm4a' else ext)
-
-        self._back_music()
-        self._separate()
+                # 混音时末尾补静音
+                pad_ms = video_time
+
+        target_audio = self._mixdown(pad_ms) if self.config_params['voice_role'] != 'No' else None
         # process
         # 开启进度线程
         protxt = config.TEMP_DIR + f"/compose{time.time()}.txt"
@@ -1116,7 +1264,7 @@ class Runstep():
         threading.Thread(target=hebing_pro).start()
         if self.config_params['subtitle_type'] in [2, 4]:
             soft_srt_name = os.path.basename(soft_srt)
-            os.chdir(os.path.dirname(soft_srt))
+            ffmpeg_cwd = os.path.dirname(soft_srt)
         try:
             self.parent.status_text = '视频+字幕+配音合并中' if config.defaulelang == 'zh' else 'Video + Subtitles + Dubbing in merge'
             # 有配音有字幕
@@ -1131,7 +1279,7 @@ class Runstep():
                         "-i",
                         novoice_mp4,
                         "-i",
-                        Path(self.init['target_wav']).as_posix(),
+                        Path(target_audio).as_posix(),
                         "-c:v",
                         f"libx{self.video_codec}",
                         "-c:a",
@@ -1143,7 +1291,7 @@ class Runstep():
                         '-preset',
                         config.settings['preset'],
                         Path(self.init['targetdir_mp4']).as_posix()
-                    ])
+                    ], cwd=ffmpeg_cwd)
                 else:
                     tools.set_process(config.transobj['peiyin-ruanzimu'], btnkey=self.init['btnkey'])
                     # 配音+软字幕
@@ -1154,7 +1302,7 @@ class Runstep():
                         "-i",
                         novoice_mp4,
                         "-i",
-                        Path(self.init['target_wav']).as_posix(),
+                        Path(target_audio).as_posix(),
                         "-i",
                         soft_srt_name,
                         "-c:v",
@@ -1166,7 +1314,7 @@ class Runstep():
                         "-metadata:s:s:0",
                         f"language={subtitle_language}",
                         Path(self.init['targetdir_mp4']).as_posix()
-                    ])
+                    ], cwd=ffmpeg_cwd)
             elif self.config_params['voice_role'] != 'No':
                 # 有配音无字幕
                 tools.set_process(config.transobj['onlypeiyin'], btnkey=self.init['btnkey'])
@@ -1177,13 +1325,13 @@ class Runstep():
                     "-i",
                     novoice_mp4,
                     "-i",
-                    Path(self.init['target_wav']).as_posix(),
+                    Path(target_audio).as_posix(),
                     "-c:v",
                     "copy",
                     "-c:a",
                     "aac",
                     Path(self.init['targetdir_mp4']).as_posix()
-                ])
+                ], cwd=ffmpeg_cwd)
             # 硬字幕无配音  原始 wav合并
             elif self.config_params['subtitle_type'] in [1, 3]:
                 tools.set_process(config.transobj['onlyyingzimu'], btnkey=self.init['btnkey'])
@@ -1212,7 +1360,7 @@ class Runstep():
                     config.settings['preset'],
                     Path(self.init['targetdir_mp4']).as_posix(),
                 ]
-                tools.runffmpeg(cmd)
+                tools.runffmpeg(cmd, cwd=ffmpeg_cwd)
             elif self.config_params['subtitle_type'] in [2, 4]:
                 # 软字幕无配音
                 tools.set_process(config.transobj['onlyruanzimu'], btnkey=self.init['btnkey'])
@@ -1249,11 +1397,10 @@ class Runstep():
                     config.settings['preset']
                 ]
                 cmd.append(Path(self.init['targetdir_mp4']).as_posix())
-                tools.runffmpeg(cmd)
+                tools.runffmpeg(cmd, cwd=ffmpeg_cwd)
         except Exception as e:
             raise Exception(f'compose srt + video + audio:{str(e)}')
         self.precent = 99
-        os.chdir(config.rootdir)
         try:
 
             if not self.config_params['only_video']:
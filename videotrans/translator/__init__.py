@@ -1,6 +1,9 @@
 # -*- coding: utf-8 -*-
+import copy
 import re
 from videotrans.configure import config
+from videotrans.translator import cache
+from videotrans.util import tools
 
 GOOGLE_NAME = "Google"
 MICROSOFT_NAME = "Microsoft"
@@ -447,4 +450,54 @@ def run(*, translate_type=None, text_list=None, target_language_name=None, set_p
         from videotrans.translator.transapi import trans
     else:
         raise Exception(f"{translate_type=},{target_language_name=}")
-    return trans(text_list, target_language, set_p=set_p, inst=inst, source_code=source_code)
+    if not isinstance(text_list, list) or not cache.enabled():
+        return trans(text_list, target_language, set_p=set_p, inst=inst, source_code=source_code)
+    return _run_with_cache(trans, text_list, target_language, translate_type=translate_type, set_p=set_p, inst=inst,
+                           source_code=source_code)
+
+
+# AI翻译通道的模型名，作为翻译记忆的一部分
+def _get_model_name(translate_type):
+    key = {
+        CHATGPT_NAME.lower(): 'chatgpt_model',
+        AZUREGPT_NAME.lower(): 'azure_model',
+        GEMINI_NAME.lower(): 'gemini_model',
+        LOCALLLM_NAME.lower(): 'localllm_model',
+        ZIJIE_NAME.lower(): 'zijiehuoshan_model',
+        AI302_NAME.lower(): 'ai302_model'
+    }.get(translate_type.lower())
+    return config.params.get(key, '') if key else ''
+
+
+# 先查翻译记忆，仅将未命中的字幕交给翻译通道，翻译结果写入翻译记忆
+def _run_with_cache(trans, text_list, target_language, *, translate_type=None, set_p=True, inst=None,
+                    source_code=None):
+    model = _get_model_name(translate_type)
+    keys = [cache.make_key(translate_type, model, source_code or '', target_language, it['text']) for it in
+            text_list]
+    cached = cache.get_many([k for i, k in enumerate(keys) if cache.normalize(text_list[i]['text'])])
+    miss_index = [i for i, k in enumerate(keys) if k not in cached]
+    cache.log_stats(len(text_list) - len(miss_index), len(miss_index))
+    if len(miss_index) > 0:
+        result = trans([copy.deepcopy(text_list[i]) for i in miss_index], target_language, set_p=set_p,
+                       inst=inst, source_code=source_code)
+        if not result:
+            return result
+        items = {}
+        for i, it in zip(miss_index, result):
+            # 原文或译文为空的不保存
+            if cache.normalize(text_list[i]['text']) and cache.normalize(it['text']):
+                items[keys[i]] = it['text']
+            text_list[i]['text'] = it['text']
+        cache.set_many(items)
+    hits = []
+    for i, k in enumerate(keys):
+        if k in cached:
+            text_list[i]['text'] = cached[k]
+            hits.append(cached[k])
+    if len(hits) > 0:
+        if set_p:
+            tools.set_process("\n\n".join(hits), 'subtitle')
+        else:
+            tools.set_process_box("\n".join(hits), func_name="fanyi", type="set")
+    return text_list
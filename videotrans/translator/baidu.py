@@ -4,7 +4,9 @@ import os
 import time
 import requests
 from videotrans.configure import config
-from videotrans.util import tools
+from videotrans.translator import packer
+from videotrans.translator.executor import run_chunks
+from videotrans.util import httpclient, tools
 
 
 def trans(text_list, target_language="en", *, set_p=True, inst=None, stop=0, source_code=""):
@@ -16,28 +18,34 @@ def trans(text_list, target_language="en", *, set_p=True, inst=None, stop=0, sou
     set_p:
         是否实时输出日志，主界面中需要
     """
-    wait_sec = 0.5
-    try:
-        wait_sec = int(config.settings['translation_wait'])
-    except Exception:
-        pass
-    target_text = []
-    index = -1  # 当前循环需要开始的 i 数字,小于index的则跳过
-    iter_num = 0  # 当前循环次数，如果 大于 config.settings.retries 出错
-    err = ""
 
-    def get_content(data):
-        text = data['text']
+    proxy = httpclient.get_proxy()
+
+    # 原文中每个换行分隔的段落对应 trans_result 中的一项，一次请求翻译多条字幕
+    # 返回和 texts 顺序一致的译文，空行不提交
+    def get_content(texts):
+        index = [n for n, t in enumerate(texts) if t.strip()]
+        result = [""] * len(texts)
+        if not index:
+            return result
+        # 字幕内部的换行替换为空格，保证每条字幕只对应一个段落
+        text = "\n".join(texts[n].strip().replace("\n", " ") for n in index)
         salt = int(time.time())
         strtext = f"{config.params['baidu_appid']}{text}{salt}{config.params['baidu_miyue']}"
         md5 = hashlib.md5()
         md5.update(strtext.encode('utf-8'))
         sign = md5.hexdigest()
 
-        requrl = f"http://api.fanyi.baidu.com/api/trans/vip/translate?q={text}&from=auto&to={data['target_language']}&appid={config.params['baidu_appid']}&salt={salt}&sign={sign}"
-
-        config.logger.info(f'[Baidu]请求数据:{requrl=}')
-        resraw = requests.get(requrl)
+        data = {
+            "q": text,
+            "from": "auto",
+            "to": target_language,
+            "appid": config.params['baidu_appid'],
+            "salt": salt,
+            "sign": sign
+        }
+        config.logger.info(f'[Baidu]请求数据:{data=}')
+        resraw = httpclient.post("http://api.fanyi.baidu.com/api/trans/vip/translate", proxy=proxy, data=data)
         config.logger.info(f'[Baidu]返回响应:{resraw=}')
         res = resraw.json()
 
@@ -48,87 +56,43 @@ def trans(text_list, target_language="en", *, set_p=True, inst=None, stop=0, sou
             err = res['error_msg']
             raise Exception(err)
 
-        result = [tools.cleartext(tres['dst']) for tres in res['trans_result']]
-        if not result or len(result) < 1:
-            err = f'{resraw}'
-            raise Exception(err)
+        if len(res['trans_result']) != len(index):
+            raise Exception(f'{res["trans_result"]}')
+        for n, tres in zip(index, res['trans_result']):
+            result[n] = tools.cleartext(tres['dst'])
         return result
 
-    while 1:
-        if config.exit_soft or (config.current_status != 'ing' and config.box_trans != 'ing'):
-            return
-
-        if iter_num > int(config.settings['retries']):
-            err = f'{iter_num}{"次重试后依然出错" if config.defaulelang == "zh" else " retries after error persists "}:{err}'
-            break
-        if iter_num >= 1:
-            if set_p:
-                tools.set_process(
-                    f"第{iter_num}次出错重试" if config.defaulelang == 'zh' else f'{iter_num} retries after error',
-                    btnkey=inst.init['btnkey'] if inst else "")
-            time.sleep(10)
-        iter_num += 1
-        # 整理待翻译的文字为 List[str]
-        if isinstance(text_list, str):
-            source_text = text_list.strip().split("\n")
-        else:
-            source_text = [t['text'] for t in text_list]
-
-        # 切割为每次翻译多少行，值在 set.ini中设定，默认10
-        split_size = int(config.settings['trans_thread'])
-        split_source_text = [source_text[i:i + split_size] for i in range(0, len(source_text), split_size)]
-
-        for i, it in enumerate(split_source_text):
-            if config.exit_soft or (config.current_status != 'ing' and config.box_trans != 'ing'):
-                return
-            if i <= index:
-                continue
-            if stop > 0:
-                time.sleep(stop)
-            try:
-                source_length = len(it)
-                text = "\n".join(it)
-                result = get_content({"text": text, 'target_language': target_language})
-                result_length = len(result)
-                # 如果返回数量和原始语言数量不一致，则重新切割
-                if result_length < source_length:
-                    result = []
-                    for line_res in it:
-                        time.sleep(wait_sec)
-                        result.append(get_content({"text": line_res, "target_language": target_language})[0])
-
-                if inst and inst.precent < 75:
-                    inst.precent += round((i + 1) * 5 / len(split_source_text), 2)
-                if set_p:
-                    tools.set_process(f'{result[0]}\n\n' if split_size == 1 else "\n\n".join(result), 'subtitle')
-                    tools.set_process(config.transobj['starttrans'] + f' {i * split_size + 1} ',
-                                      btnkey=inst.init['btnkey'] if inst else "")
-                else:
-                    tools.set_process_box("\n".join(result), func_name="fanyi", type="set")
-
-                result_length = len(result)
-                while result_length < source_length:
-                    result.append("")
-                    result_length += 1
-                result = result[:source_length]
-                target_text.extend(result)
-
-            except Exception as e:
-                err = str(e)
-                time.sleep(wait_sec)
-                config.logger.error(f'翻译出错:暂停{wait_sec}s')
-                break
-            else:
-                # 未出错
-                err = ''
-                iter_num = 0
-                index = i
+    # 整理待翻译的文字为 List[str]
+    if isinstance(text_list, str):
+        source_text = text_list.strip().split("\n")
+    else:
+        source_text = [t['text'] for t in text_list]
+
+    # 每条字幕为一个段落，每次请求原文不超过6000字节
+    split_source_text = packer.pack_size(source_text, max_lines=1000, max_chars=6000,
+                                         size=lambda t: len(t.encode('utf-8')) + 1)
+
+    def handle(i, it):
+        result = get_content(it)
+        if inst and inst.precent < 75:
+            inst.precent += round((i + 1) * 5 / len(split_source_text), 2)
+        if set_p:
+            tools.set_process("\n\n".join(result), 'subtitle')
+            tools.set_process(config.transobj['starttrans'] + f' {sum(len(c) for c in split_source_text[:i]) + 1} ',
+                              btnkey=inst.init['btnkey'] if inst else "")
         else:
-            break
+            tools.set_process_box("\n".join(result), func_name="fanyi", type="set")
+        return result
 
-    if err:
+    try:
+        results = run_chunks(split_source_text, handle, name='Baidu', set_p=set_p, inst=inst, stop=stop)
+    except Exception as e:
+        err = str(e)
         config.logger.error(f'[Baidu]翻译请求失败:{err=}')
         raise Exception(f'百度翻译:{err}')
+    if results is None:
+        return
+    target_text = [x for result in results for x in result]
     if isinstance(text_list, str):
         return "\n".join(target_text)
 
@@ -0,0 +1,108 @@
+# 翻译记忆，保存在本地 sqlite 中，相同通道、模型、语言的相同文字不再重复请求翻译
+# 超过 trans_cache_mb 时按最后使用时间移除旧记录
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+
+from videotrans.configure import config
+
+_lock = threading.Lock()
+_db_file = config.homedir + "/translate_memory.db"
+_inited = False
+# 命中、未命中条数
+stats = {"hit": 0, "miss": 0}
+
+
+def _connect():
+    global _inited
+    conn = sqlite3.connect(_db_file, timeout=30)
+    if not _inited:
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS tm (key TEXT PRIMARY KEY, result TEXT, size INTEGER, atime REAL)')
+        conn.execute('CREATE INDEX IF NOT EXISTS tm_atime ON tm (atime)')
+        conn.commit()
+        _inited = True
+    return conn
+
+
+def _budget():
+    try:
+        return int(float(config.settings['trans_cache_mb']) * 1024 * 1024)
+    except Exception:
+        return 0
+
+
+def enabled():
+    return _budget() > 0
+
+
+# 去掉首尾空白并合并连续空白
+def normalize(text):
+    return re.sub(r'\s+', ' ', str(text)).strip()
+
+
+def make_key(engine, model, source, target, text):
+    return hashlib.md5(f'{engine}\n{model}\n{source}\n{target}\n{normalize(text)}'.encode('utf-8')).hexdigest()
+
+
+# 批量查询，返回 {key: 译文}
+def get_many(keys):
+    keys = list(set(keys))
+    result = {}
+    if not keys:
+        return result
+    try:
+        with _lock:
+            conn = _connect()
+            try:
+                for i in range(0, len(keys), 500):
+                    part = keys[i:i + 500]
+                    rows = conn.execute(f'SELECT key,result FROM tm WHERE key IN ({",".join("?" * len(part))})',
+                                        part).fetchall()
+                    result.update({k: v for k, v in rows})
+                if result:
+                    now = time.time()
+                    conn.executemany('UPDATE tm SET atime=? WHERE key=?', [(now, k) for k in result])
+                    conn.commit()
+            finally:
+                conn.close()
+    except Exception as e:
+        config.logger.error(f'读取翻译记忆出错:{str(e)}')
+    return result
+
+
+# 批量保存 {key: 译文}，并按最后使用时间移除超出大小的记录
+def set_many(items):
+    if not items:
+        return
+    budget = _budget()
+    now = time.time()
+    try:
+        with _lock:
+            conn = _connect()
+            try:
+                conn.executemany('INSERT OR REPLACE INTO tm (key,result,size,atime) VALUES (?,?,?,?)',
+                                 [(k, v, len(k) + len(v.encode('utf-8')), now) for k, v in items.items()])
+                total = conn.execute('SELECT COALESCE(SUM(size),0) FROM tm').fetchone()[0]
+                if total > budget:
+                    removed = 0
+                    for key, size in conn.execute('SELECT key,size FROM tm ORDER BY atime').fetchall():
+                        if total - removed <= budget * 0.9:
+                            break
+                        conn.execute('DELETE FROM tm WHERE key=?', (key,))
+                        removed += size
+                conn.commit()
+            finally:
+                conn.close()
+    except Exception as e:
+        config.logger.error(f'保存翻译记忆出错:{str(e)}')
+
+
+def log_stats(hit, miss):
+    stats['hit'] += hit
+    stats['miss'] += miss
+    total = stats['hit'] + stats['miss']
+    config.logger.info(
+        f'[翻译记忆] 本次命中{hit}条 未命中{miss}条，累计命中率 {round(stats["hit"] * 100 / total, 2) if total else 0}%')
@@ -1,12 +1,13 @@
 # -*- coding: utf-8 -*-
 import os
 import re
-import time
 import httpx
 import openai
 from openai import OpenAI, APIError
 from videotrans.configure import config
-from videotrans.util import tools
+from videotrans.translator import numbered, packer
+from videotrans.translator.executor import run_chunks
+from videotrans.util import httpclient, tools
 
 
 def get_url(url=""):
@@ -25,38 +26,12 @@ def get_url(url=""):
     return url
 
 
-shound_del = False
-
-
-def update_proxy(type='set'):
-    global shound_del
-    if type == 'del' and shound_del:
-        del os.environ['http_proxy']
-        del os.environ['https_proxy']
-        del os.environ['all_proxy']
-        shound_del = False
-    elif type == 'set':
-        raw_proxy = os.environ.get('http_proxy')
-        if not raw_proxy:
-            proxy = tools.set_proxy()
-            if proxy:
-                shound_del = True
-                os.environ['http_proxy'] = proxy
-                os.environ['https_proxy'] = proxy
-                os.environ['all_proxy'] = proxy
-
-
 def create_openai_client():
     api_url = get_url(config.params['chatgpt_api'])
     openai.base_url = api_url
     config.logger.info(f'当前chatGPT:{api_url=}')
-    proxies = None
-    if not re.search('localhost', api_url) and not re.match(r'^https?://(\d+\.){3}\d+(:\d+)?', api_url):
-        update_proxy(type='set')
-    else:
-        proxies = {"http://": None, "https://": None}
     try:
-        client = OpenAI(base_url=api_url, http_client=httpx.Client(proxies=proxies))
+        client = OpenAI(base_url=api_url, http_client=httpclient.get_client(httpclient.get_proxy(api_url)))
     except Exception as e:
         raise Exception(f'API={api_url},{str(e)}')
     return client, api_url
@@ -104,23 +79,13 @@ def trans(text_list, target_language="English", *, set_p=True, inst=None, stop=0
     set_p:
         是否实时输出日志，主界面中需要
     """
-    wait_sec = 0.5
-    try:
-        wait_sec = int(config.settings['translation_wait'])
-    except Exception:
-        pass
 
     # 翻译后的文本
     target_text = {"0": [], "srts": []}
-    index = -1  # 当前循环需要开始的 i 数字,小于index的则跳过
-    iter_num = 0  # 当前循环次数，如果 大于 config.settings.retries 出错
-    err = ""
     is_srt = False if isinstance(text_list, str) else True
 
-    # 切割为每次翻译多少行，值在 set.ini中设定，默认10
-    split_size = int(config.settings['trans_thread'])
-    # if is_srt and split_size>1:
     prompt = config.params['chatgpt_template'].replace('{lang}', target_language)
+    numbered_prompt = numbered.with_rule(prompt)
 
     end_point = "。" if config.defaulelang == 'zh' else '. '
     # 整理待翻译的文字为 List[str]
@@ -130,96 +95,58 @@ def trans(text_list, target_language="English", *, set_p=True, inst=None, stop=0
         source_text = []
         for i, it in enumerate(text_list):
             source_text.append(it['text'].strip().replace('\n', '.'))
-    split_source_text = [source_text[i:i + split_size] for i in range(0, len(source_text), split_size)]
-    while 1:
-        if config.exit_soft or (config.current_status != 'ing' and config.box_trans != 'ing' and not is_test):
-            return
-
-        if iter_num > int(config.settings['retries']):
-            err = f'{iter_num}{"次重试后依然出错" if config.defaulelang == "zh" else " retries after error persists "}:{err}'
-            break
-        if iter_num >= 1:
-            if set_p:
-                tools.set_process(
-                    f"第{iter_num}次出错重试" if config.defaulelang == 'zh' else f'{iter_num} retries after error',
-                    btnkey=inst.init['btnkey'] if inst else "")
-            time.sleep(10)
-        iter_num += 1
-
-        client, api_url = create_openai_client()
-        config.logger.info(f'[chatGPT],{api_url=}')
-
-        for i, it in enumerate(split_source_text):
-            if config.exit_soft or (config.current_status != 'ing' and config.box_trans != 'ing' and not is_test):
-                return
-            if i <= index:
-                continue
-            if stop > 0:
-                time.sleep(stop)
-
-            try:
-                result = get_content(it, model=client, prompt=prompt)
-
-                if inst and inst.precent < 75:
-                    inst.precent += 0.01
-                if not is_srt:
-                    target_text["0"].append(result)
-                    if not set_p:
-                        tools.set_process_box(text=result + "\n", func_name="fanyi", type="set")
-                    continue
-
-                sep_res = tools.cleartext(result).split("\n")
-                raw_len = len(it)
-                sep_len = len(sep_res)
-                # 如果返回结果相差原字幕仅少一行，对最后一行进行拆分
-                if sep_len + 1 == raw_len:
-                    config.logger.error('如果返回结果相差原字幕仅少一行，对最后一行进行拆分')
-                    sep_res = tools.split_line(sep_res)
-                    if sep_res:
-                        sep_len = len(sep_res)
-
-                # 如果返回数量和原始语言数量相差超过1，或再拆分失败
-                if sep_len < raw_len:
-                    config.logger.error(f'翻译前后数量不一致，先提交AI进行拆分')
-                    sep_res = []
-                    for it_n in it:
-                        time.sleep(wait_sec)
-                        t = get_content(it_n.strip(), model=client, prompt=prompt)
-                        sep_res.append(t)
-
-                for x, result_item in enumerate(sep_res):
-                    if x < len(it):
-                        target_text["srts"].append(result_item.strip().rstrip(end_point))
-                        if set_p:
-                            tools.set_process(result_item + "\n", 'subtitle')
-                            tools.set_process(config.transobj['starttrans'] + f' {i * split_size + x + 1} ',
-                                              btnkey=inst.init['btnkey'] if inst else "")
-                        elif not is_test:
-                            tools.set_process_box(text=result_item + "\n", func_name="fanyi", type="set")
-                if len(sep_res) < len(it):
-                    tmp = ["" for x in range(len(it) - len(sep_res))]
-                    target_text["srts"] += tmp
-
-            except Exception as e:
-                err = str(e) + f',{api_url=}'
-                time.sleep(wait_sec)
-                config.logger.error(f'翻译出错:暂停{wait_sec}s')
-                break
-            else:
-                # 未出错
-                err = ''
-                iter_num = 0
-                index = i
-        else:
-            break
-
-    update_proxy(type='del')
+    # 按 token 数分批，trans_max_tokens 为0时按 trans_thread 行数
+    split_source_text = packer.pack(source_text, model=config.params['chatgpt_model'], name='ChatGPT')
+
+    client, api_url = create_openai_client()
+    config.logger.info(f'[chatGPT],{api_url=}')
+
+    def handle(i, it):
+        if not is_srt:
+            result = get_content(it, model=client, prompt=prompt)
+            if inst and inst.precent < 75:
+                inst.precent += 0.01
+            if not set_p:
+                tools.set_process_box(text=result + "\n", func_name="fanyi", type="set")
+            return result
+
+        # 每行加编号后请求，按编号对齐译文，缺少的行合并为一次重新请求
+        sep_res = numbered.translate(it,
+                                     lambda text: get_content(text, model=client, prompt=numbered_prompt),
+                                     name='ChatGPT')
+        if inst and inst.precent < 75:
+            inst.precent += 0.01
+
+        srts = []
+        start = sum(len(c) for c in split_source_text[:i])
+        for x, result_item in enumerate(sep_res):
+            if x < len(it):
+                srts.append(result_item.strip().rstrip(end_point))
+                if set_p:
+                    tools.set_process(result_item + "\n", 'subtitle')
+                    tools.set_process(config.transobj['starttrans'] + f' {start + x + 1} ',
+                                      btnkey=inst.init['btnkey'] if inst else "")
+                elif not is_test:
+                    tools.set_process_box(text=result_item + "\n", func_name="fanyi", type="set")
+        if len(srts) < len(it):
+            srts += ["" for x in range(len(it) - len(srts))]
+        return srts
 
-    if err:
+    try:
+        results = run_chunks(split_source_text, handle, name='ChatGPT', set_p=set_p, inst=inst, stop=stop,
+                             is_test=is_test)
+    except Exception as e:
+        err = str(e) + f',{api_url=}'
         config.logger.error(f'[ChatGPT]翻译请求失败:{err=}')
-        if err.lower().find("Connection error") > -1:
+        if err.lower().find("connection error") > -1:
             err = '连接失败 ' + err
         raise Exception(f'ChatGPT:{err}')
+    if results is None:
+        return
+    if not is_srt:
+        target_text["0"] = results
+    else:
+        target_text["srts"] = [x for result in results for x in result]
 
     if not is_srt:
         return "\n".join(target_text["0"])
@@ -1,31 +1,12 @@
 # -*- coding: utf-8 -*-
 import os
 import re
-import time
 import deepl
 
 from videotrans.configure import config
-from videotrans.util import tools
-
-shound_del = False
-
-
-def update_proxy(type='set'):
-    global shound_del
-    if type == 'del' and shound_del:
-        del os.environ['http_proxy']
-        del os.environ['https_proxy']
-        del os.environ['all_proxy']
-        shound_del = False
-    elif type == 'set':
-        raw_proxy = os.environ.get('http_proxy')
-        if not raw_proxy:
-            proxy = tools.set_proxy()
-            if proxy:
-                shound_del = True
-                os.environ['http_proxy'] = proxy
-                os.environ['https_proxy'] = proxy
-                os.environ['all_proxy'] = proxy
+from videotrans.translator import packer
+from videotrans.translator.executor import run_chunks
+from videotrans.util import httpclient, tools
 
 
 def trans(text_list, target_language="en", *, set_p=True, inst=None, stop=0, source_code=""):
@@ -37,113 +18,59 @@ def trans(text_list, target_language="en", *, set_p=True, inst=None, stop=0, sou
     set_p:
         是否实时输出日志，主界面中需要
     """
-    wait_sec = 0.5
-    try:
-        wait_sec = int(config.settings['translation_wait'])
-    except Exception:
-        pass
-    update_proxy(type='set')
     target_language = 'EN-US' if target_language == 'EN' else target_language
-    # 翻译后的文本
-    target_text = []
-    index = -1  # 当前循环需要开始的 i 数字,小于index的则跳过
-    iter_num = 0  # 当前循环次数，如果 大于 config.settings.retries 出错
-    err = ""
-
-    def get_content(data):
-        config.logger.info(f'[DeepL]请求数据:{data=}')
-        result = deepltranslator.translate_text(data['text'],
-                                                target_lang=data["target_language"] if not re.match(r'^zh', data[
-                                                    "target_language"], re.I) else "ZH")
-        config.logger.info(f'[DeepL]返回:{result=}')
-        return result.text
-
-    while 1:
-        if config.exit_soft or (config.current_status != 'ing' and config.box_trans != 'ing'):
-            return
-
-        if iter_num > int(config.settings['retries']):
-            err = f'{iter_num}{"次重试后依然出错" if config.defaulelang == "zh" else " retries after error persists "}:{err}'
-            break
-        if iter_num >= 1:
-            if set_p:
-                tools.set_process(
-                    f"第{iter_num}次出错重试" if config.defaulelang == 'zh' else f'{iter_num} retries after error',
-                    btnkey=inst.init['btnkey'] if inst else "")
-            time.sleep(10)
-        iter_num += 1
-        # 整理待翻译的文字为 List[str]
-        if isinstance(text_list, str):
-            source_text = text_list.strip().split("\n")
-        else:
-            source_text = [t['text'] for t in text_list]
 
-        # 切割为每次翻译多少行，值在 set.ini中设定，默认10
-        split_size = int(config.settings['trans_thread'])
-        split_source_text = [source_text[i:i + split_size] for i in range(0, len(source_text), split_size)]
-
-        deepltranslator = deepl.Translator(config.params['deepl_authkey'],
-                                           server_url=None if not config.params['deepl_api'] else config.params[
-                                               'deepl_api'].rstrip('/'))
-
-        for i, it in enumerate(split_source_text):
-            if config.exit_soft or (config.current_status != 'ing' and config.box_trans != 'ing'):
-                return
-            if i <= index:
-                continue
-            if stop > 0:
-                time.sleep(stop)
-            try:
-                source_length = len(it)
-                data = {
-                    "text": "\n".join(it),
-                    "target_language": target_language
-                }
-                result = get_content(data)
-                result = tools.cleartext(result).split("\n")
-                result_length = len(result)
-                # 如果返回数量和原始语言数量不一致，则重新切割
-                if result_length < source_length:
-                    result = []
-                    for line_res in it:
-                        data['text'] = line_res
-                        time.sleep(wait_sec)
-                        result.append(get_content(data))
-
-                if inst and inst.precent < 75:
-                    inst.precent += round((i + 1) * 5 / len(split_source_text), 2)
-                if set_p:
-                    tools.set_process(f'{result[0]}\n\n' if split_size == 1 else "\n\n".join(result), 'subtitle')
-                    tools.set_process(config.transobj['starttrans'] + f' {i * split_size + 1} ',
-                                      btnkey=inst.init['btnkey'] if inst else "")
-                else:
-                    tools.set_process_box("\n".join(result), func_name="fanyi", type="set")
-
-                result_length = len(result)
-                while result_length < source_length:
-                    result.append("")
-                    result_length += 1
-                result = result[:source_length]
-                target_text.extend(result)
-            except Exception as e:
-                err = str(e)
-
-                time.sleep(wait_sec)
-                config.logger.error(f'翻译出错:暂停{wait_sec}s')
-                break
-            else:
-                # 未出错
-                err = ''
-                iter_num = 0
-                index = i
+    # 一次请求翻译多条字幕，返回和 texts 顺序一致的译文，空行不提交
+    def get_content(texts):
+        config.logger.info(f'[DeepL]请求数据:{texts=}')
+        index = [n for n, t in enumerate(texts) if t.strip()]
+        result = [""] * len(texts)
+        if not index:
+            return result
+        res = deepltranslator.translate_text([texts[n] for n in index],
+                                             target_lang=target_language if not re.match(r'^zh', target_language,
+                                                                                         re.I) else "ZH")
+        config.logger.info(f'[DeepL]返回:{res=}')
+        for n, item in zip(index, res):
+            result[n] = item.text
+        return result
+
+    # 整理待翻译的文字为 List[str]
+    if isinstance(text_list, str):
+        source_text = text_list.strip().split("\n")
+    else:
+        source_text = [t['text'] for t in text_list]
+
+    # 每条字幕作为一项，每次最多50项，请求不超过128KiB
+    split_source_text = packer.pack_size(source_text, max_lines=50, max_chars=100 * 1024,
+                                         size=lambda t: len(t.encode('utf-8')))
+
+    server_url = None if not config.params['deepl_api'] else config.params['deepl_api'].rstrip('/')
+    deepltranslator = deepl.Translator(config.params['deepl_authkey'],
+                                       server_url=server_url,
+                                       proxy=httpclient.get_proxy(server_url or ''))
+
+    def handle(i, it):
+        result = [tools.cleartext(t) for t in get_content(it)]
+        if inst and inst.precent < 75:
+            inst.precent += round((i + 1) * 5 / len(split_source_text), 2)
+        if set_p:
+            tools.set_process("\n\n".join(result), 'subtitle')
+            tools.set_process(config.transobj['starttrans'] + f' {sum(len(c) for c in split_source_text[:i]) + 1} ',
+                              btnkey=inst.init['btnkey'] if inst else "")
         else:
-            break
+            tools.set_process_box("\n".join(result), func_name="fanyi", type="set")
+        return result
 
-    update_proxy(type='del')
-
-    if err:
+    try:
+        results = run_chunks(split_source_text, handle, name='DeepL', set_p=set_p, inst=inst, stop=stop)
+    except Exception as e:
+        err = str(e)
         config.logger.error(f'[DeepL]翻译请求失败:{err=}')
         raise Exception(f'DeepL:{err}')
+    if results is None:
+        return
+    target_text = [x for result in results for x in result]
     if isinstance(text_list, str):
         return "\n".join(target_text)
 
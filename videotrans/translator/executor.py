@@ -0,0 +1,72 @@
+# 并发翻译各批字幕，同一翻译通道同时进行的请求数不超过 trans_concurrency，多个任务同时翻译时共享该限制
+# 实际并发数由 aimd 按是否被限流自动调整
+# 每批失败后单独重试，不影响其他批次，结果按原顺序返回
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from videotrans.configure import config
+from videotrans.util import aimd, tools
+
+
+def _concurrency():
+    try:
+        return max(1, int(config.settings['trans_concurrency']))
+    except Exception:
+        return 1
+
+
+def _is_stop(is_test=False):
+    return config.exit_soft or (config.current_status != 'ing' and config.box_trans != 'ing' and not is_test)
+
+
+# chunks: 分批后的待翻译内容
+# handler(i, chunk): 翻译第 i 批，返回该批的翻译结果，出错时抛出异常
+# 返回和 chunks 顺序一致的结果列表，已停止时返回 None，某批重试 retries 次后依然出错则抛出异常
+def run_chunks(chunks, handler, *, name="", set_p=True, inst=None, stop=0, is_test=False):
+    if len(chunks) < 1:
+        return []
+    limit = _concurrency()
+    limiter = aimd.get(f'trans:{name}', limit)
+    retries = int(config.settings['retries'])
+    wait_sec = 0.5
+    try:
+        wait_sec = float(config.settings['translation_wait'])
+    except Exception:
+        pass
+    results = [None] * len(chunks)
+    errors = []
+
+    def work(i):
+        err = ""
+        for n in range(retries + 1):
+            if errors or _is_stop(is_test):
+                return
+            if n > 0:
+                if set_p:
+                    tools.set_process(
+                        f"第{n}次出错重试" if config.defaulelang == 'zh' else f'{n} retries after error',
+                        btnkey=inst.init['btnkey'] if inst else "")
+                # 出错后逐次增加等待时间
+                time.sleep(wait_sec * n + 1)
+            if not limiter.acquire(stop=lambda: bool(errors) or _is_stop(is_test)):
+                return
+            try:
+                if stop > 0:
+                    time.sleep(stop)
+                results[i] = handler(i, chunks[i])
+                limiter.release()
+                return
+            except Exception as e:
+                err = str(e)
+                limiter.release(err)
+                config.logger.error(f'[{name}]第{i + 1}批翻译出错:{err}')
+        errors.append(
+            f'{retries}{"次重试后依然出错" if config.defaulelang == "zh" else " retries after error persists "}:{err}')
+
+    with ThreadPoolExecutor(max_workers=min(limit, len(chunks))) as pool:
+        list(pool.map(work, range(len(chunks))))
+    if _is_stop(is_test):
+        return None
+    if errors:
+        raise Exception(errors[0])
+    return results
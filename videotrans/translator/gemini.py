@@ -1,8 +1,9 @@
 # -*- coding: utf-8 -*-
 
 import re, os
-import time
 from videotrans.configure import config
+from videotrans.translator import numbered, packer
+from videotrans.translator.executor import run_chunks
 from videotrans.util import tools
 import google.generativeai as genai
 from google.generativeai.types import HarmCategory, HarmBlockThreshold
@@ -119,11 +120,6 @@ def trans(text_list, target_language="English", *, set_p=True, inst=None, stop=0
     set_p:
         是否实时输出日志，主界面中需要
     """
-    wait_sec = 0.5
-    try:
-        wait_sec = int(config.settings['translation_wait'])
-    except Exception:
-        pass
     try:
         genai.configure(api_key=config.params['gemini_key'])
         model = genai.GenerativeModel(config.params['gemini_model'], safety_settings=safetySettings)
@@ -133,13 +129,10 @@ def trans(text_list, target_language="English", *, set_p=True, inst=None, stop=0
 
     # 翻译后的文本
     target_text = {"0": [], "srts": []}
-    index = -1  # 当前循环需要开始的 i 数字,小于index的则跳过
-    iter_num = 0  # 当前循环次数，如果 大于 config.settings.retries 出错
-    err = ""
     is_srt = False if isinstance(text_list, str) else True
-    split_size = int(config.settings['trans_thread'])
 
     prompt = config.params['gemini_template'].replace('{lang}', target_language)
+    numbered_prompt = numbered.with_rule(prompt)
 
     # 切割为每次翻译多少行，值在 set.ini中设定，默认10
     end_point = "。" if config.defaulelang == 'zh' else ' . '
@@ -150,93 +143,60 @@ def trans(text_list, target_language="English", *, set_p=True, inst=None, stop=0
         source_text = []
         for i, it in enumerate(text_list):
             source_text.append(it['text'].strip().replace('\n', '.') + end_point)
-    split_source_text = [source_text[i:i + split_size] for i in range(0, len(source_text), split_size)]
-
-    while 1:
-        if config.exit_soft or (config.current_status != 'ing' and config.box_trans != 'ing' and not is_test):
-            return
-
-        if iter_num > int(config.settings['retries']):
-            err = f'{iter_num}{"次重试后依然出错" if config.defaulelang == "zh" else " retries after error persists "}:{err}'
-            break
-
-        if iter_num >= 1:
-            if set_p:
-                tools.set_process(
-                    f"第{iter_num}次出错重试" if config.defaulelang == 'zh' else f'{iter_num} retries after error',
-                    btnkey=inst.init['btnkey'] if inst else "")
-            time.sleep(10)
-        iter_num += 1
-
-        for i, it in enumerate(split_source_text):
-            if config.exit_soft or (config.current_status != 'ing' and config.box_trans != 'ing' and not is_test):
-                return
-            if i <= index:
-                continue
-            if stop > 0:
-                time.sleep(stop)
-            try:
-                result = get_content(it, model=model, prompt=prompt)
-                if inst and inst.precent < 75:
-                    inst.precent += 0.01
-                if not is_srt:
-                    target_text["0"].append(result)
-                    if not set_p:
-                        tools.set_process_box(text=result + "\n", func_name="fanyi", type="set")
-                    continue
-
-                sep_res = tools.cleartext(result).split("\n")
-                raw_len = len(it)
-                sep_len = len(sep_res)
-                # 如果返回结果相差原字幕仅少一行，对最后一行进行拆分
-                if sep_len + 1 == raw_len:
-                    config.logger.error('如果返回结果相差原字幕仅少一行，对最后一行进行拆分')
-                    sep_res = tools.split_line(sep_res)
-                    if sep_res:
-                        sep_len = len(sep_res)
-
-                # 如果返回数量和原始语言数量不一致，则重新切割
-                if sep_len < raw_len:
-                    config.logger.error(f'翻译前后数量不一致，需要重新按行翻译')
-                    sep_res = []
-                    for line_res in it:
-                        time.sleep(wait_sec)
-                        sep_res.append(get_content(line_res.strip(), model=model, prompt=prompt))
-            except Exception as e:
-                err = str(e)
-                time.sleep(wait_sec)
-                config.logger.error(f'翻译出错:暂停{wait_sec}s')
-                # if err.find('Resource has been exhausted')>-1:
-                #     time.sleep(30)
-                break
-            else:
-                # 未出错
-                config.logger.info(f'{sep_res=}\n{it=}')
-                for x, result_item in enumerate(sep_res):
-                    if x < len(it):
-                        target_text["srts"].append(result_item.strip().rstrip(end_point))
-                        if set_p:
-                            tools.set_process(result_item + "\n", 'subtitle')
-                            tools.set_process(config.transobj['starttrans'] + f' {i * split_size + x + 1} ',
-                                              btnkey=inst.init['btnkey'] if inst else "")
-                        elif not is_test:
-                            tools.set_process_box(text=result_item + "\n", func_name="fanyi", type="set")
-
-                if len(sep_res) < len(it):
-                    tmp = ["" for x in range(len(it) - len(sep_res))]
-                    target_text["srts"] += tmp
-                err = ''
-                iter_num = 0
-                index = i  # 0 if i <= 1 else i
-        else:
-            break
-    update_proxy(type='del')
+    # 按 token 数分批，trans_max_tokens 为0时按 trans_thread 行数
+    split_source_text = packer.pack(source_text, model=config.params['gemini_model'], name='Gemini')
+
+    def handle(i, it):
+        if not is_srt:
+            result = get_content(it, model=model, prompt=prompt)
+            if inst and inst.precent < 75:
+                inst.precent += 0.01
+            if not set_p:
+                tools.set_process_box(text=result + "\n", func_name="fanyi", type="set")
+            return result
+
+        # 每行加编号后请求，按编号对齐译文，缺少的行合并为一次重新请求
+        sep_res = numbered.translate(it,
+                                     lambda text: get_content(text, model=model, prompt=numbered_prompt),
+                                     name='Gemini')
+        if inst and inst.precent < 75:
+            inst.precent += 0.01
+        config.logger.info(f'{sep_res=}\n{it=}')
+
+        srts = []
+        start = sum(len(c) for c in split_source_text[:i])
+        for x, result_item in enumerate(sep_res):
+            if x < len(it):
+                srts.append(result_item.strip().rstrip(end_point))
+                if set_p:
+                    tools.set_process(result_item + "\n", 'subtitle')
+                    tools.set_process(config.transobj['starttrans'] + f' {start + x + 1} ',
+                                      btnkey=inst.init['btnkey'] if inst else "")
+                elif not is_test:
+                    tools.set_process_box(text=result_item + "\n", func_name="fanyi", type="set")
+
+        if len(sep_res) < len(it):
+            tmp = ["" for x in range(len(it) - len(sep_res))]
+            srts += tmp
+        return srts
 
-    if err:
+    try:
+        results = run_chunks(split_source_text, handle, name='Gemini', set_p=set_p, inst=inst, stop=stop,
+                             is_test=is_test)
+    except Exception as e:
+        err = str(e)
         config.logger.error(f'[Gemini]翻译请求失败:{err=}')
-        if err.lower().find("Connection error") > -1:
+        if err.lower().find("connection error") > -1:
             err = '连接失败 ' + err
         raise Exception(f'Gemini:{err}')
+    finally:
+        update_proxy(type='del')
+    if results is None:
+        return
+    if not is_srt:
+        target_text["0"] = results
+    else:
+        target_text["srts"] = [x for result in results for x in result]
 
     if not is_srt:
         return "\n".join(target_text["0"])
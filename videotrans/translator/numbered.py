@@ -0,0 +1,97 @@
+# AI翻译字幕时给每行原文加编号，按返回的编号对齐译文
+# 返回行数和原文不一致时，只将缺少编号的行合并为一次请求重新翻译，不再逐行请求
+import json
+import re
+
+from videotrans.configure import config
+from videotrans.util import tools
+
+# 1. xx  1: xx  1、xx  [1] xx  (1) xx  【1】xx
+_LINE = re.compile(r'^\s*[\[【(（]?\s*(\d+)\s*[\]】)）.．:：、]\s*(.*)$')
+
+
+# 在提示词中加入编号要求
+def with_rule(prompt):
+    if config.defaulelang == 'zh':
+        rule = '<source>中每行原文都以“编号. ”开头，每行译文必须以相同的编号开头，一行原文对应一行译文，不得合并或拆分行。\n\n'
+    else:
+        rule = 'Each line in <source> starts with a number like "1. ", each translated line must start with the same number, one translated line per source line, never merge or split lines.\n\n'
+    pos = prompt.find('<source>[TEXT]')
+    if pos == -1:
+        return rule + prompt
+    return prompt[:pos] + rule + prompt[pos:]
+
+
+def _format(lines, ids):
+    return "\n".join(f'{n + 1}. {lines[n].strip()}' for n in ids)
+
+
+def _parse_json(text, ids):
+    try:
+        data = json.loads(text)
+    except Exception:
+        return None
+    result = {}
+    if isinstance(data, dict):
+        data = [{"id": k, "text": v} for k, v in data.items()]
+    if not isinstance(data, list):
+        return None
+    for x, item in enumerate(data):
+        if isinstance(item, str):
+            if x < len(ids):
+                result[ids[x]] = item
+        elif isinstance(item, dict):
+            try:
+                result[int(item.get('id')) - 1] = str(item.get('text', ''))
+            except (TypeError, ValueError):
+                continue
+    return result
+
+
+# 解析返回内容，返回 {行索引: 译文}，只保留 ids 中的行
+def parse(text, ids):
+    text = re.sub(r'^```\w*\s*|\s*```$', '', text.strip())
+    if text[:1] in ['[', '{']:
+        result = _parse_json(text, ids)
+        if result is not None:
+            return {n: t for n, t in result.items() if n in ids}
+    result = {}
+    ordered = []
+    last = None
+    for line in text.split("\n"):
+        match = _LINE.match(line)
+        if match:
+            ordered.append(match.group(2).strip())
+            n = int(match.group(1)) - 1
+            if n in ids and n not in result:
+                result[n] = match.group(2).strip()
+                last = n
+                continue
+            last = None
+        elif last is not None and line.strip():
+            # 没有编号的行视为上一行被折行
+            result[last] += ' ' + line.strip()
+    # 编号全部不对应但数量一致时，认为是重新从1开始编号
+    if not result and len(ordered) == len(ids):
+        return dict(zip(ids, ordered))
+    # 只有一行时允许不带编号
+    if not result and len(ids) == 1 and text:
+        result[ids[0]] = text
+    return result
+
+
+# lines: 待翻译的行
+# request(text): 发送一次翻译请求，返回译文
+# 返回和 lines 数量一致的译文，最多发送2次请求
+def translate(lines, request, *, name=''):
+    ids = list(range(len(lines)))
+    result = parse(request(_format(lines, ids)), ids)
+    missing = [n for n in ids if n not in result]
+    if missing:
+        config.logger.error(f'[{name}]返回结果缺少第{",".join(str(n + 1) for n in missing)}行，重新请求缺少的行')
+        again = parse(request(_format(lines, missing)), missing)
+        result.update(again)
+        missing = [n for n in missing if n not in result]
+        if missing:
+            config.logger.error(f'[{name}]第{",".join(str(n + 1) for n in missing)}行依然没有译文，置为空行')
+    return [tools.cleartext(result.get(n, '')) for n in ids]
@@ -4,7 +4,8 @@ import re
 import time
 import requests
 from videotrans.configure import config
-from videotrans.util import tools
+from videotrans.translator.executor import run_chunks
+from videotrans.util import httpclient, tools
 
 
 def trans(text_list, target_language="en", *, set_p=True, inst=None, stop=0, source_code=""):
@@ -26,15 +27,10 @@ def trans(text_list, target_language="en", *, set_p=True, inst=None, stop=0, sou
     if not url.startswith('http'):
         url = f"http://{url}"
 
-    # 翻译后的文本
-    target_text = []
-    index = -1  # 当前循环需要开始的 i 数字,小于index的则跳过
-    iter_num = 0  # 当前循环次数，如果 大于 config.settings.retries 出错
-    err = ""
 
     def get_content(data):
         try:
-            response = requests.post(url=url, json=data, proxies={"https": "", "http": ""})
+            response = httpclient.post(url, json=data)
         except Exception as e:
             raise
 
@@ -46,85 +42,59 @@ def trans(text_list, target_language="en", *, set_p=True, inst=None, stop=0, sou
             raise Exception(result['error'])
         return result['translatedText']
 
-    while 1:
-        if config.exit_soft or (config.current_status != 'ing' and config.box_trans != 'ing'):
-            return
-
-        if iter_num > int(config.settings['retries']):
-            err = f'{iter_num}{"次重试后依然出错" if config.defaulelang == "zh" else " retries after error persists "}:{err}'
-            break
-        if iter_num >= 1:
-            if set_p:
-                tools.set_process(
-                    f"第{iter_num}次出错重试" if config.defaulelang == 'zh' else f'{iter_num} retries after error',
-                    btnkey=inst.init['btnkey'] if inst else "")
-            time.sleep(10)
-        iter_num += 1
-        # 整理待翻译的文字为 List[str]
-        if isinstance(text_list, str):
-            source_text = text_list.strip().split("\n")
-        else:
-            source_text = [t['text'] for t in text_list]
-
-        # 切割为每次翻译多少行，值在 set.ini中设定，默认10
-        split_size = int(config.settings['trans_thread'])
-        split_source_text = [source_text[i:i + split_size] for i in range(0, len(source_text), split_size)]
+    # 整理待翻译的文字为 List[str]
+    if isinstance(text_list, str):
+        source_text = text_list.strip().split("\n")
+    else:
+        source_text = [t['text'] for t in text_list]
 
-        for i, it in enumerate(split_source_text):
-            if config.exit_soft or (config.current_status != 'ing' and config.box_trans != 'ing'):
-                return
-            if i <= index:
-                continue
-            if stop > 0:
-                time.sleep(stop)
-            try:
-                source_length = len(it)
-                data = {
-                    "q": "\n".join(it),
-                    "source": "auto",
-                    "target": target_language
-                }
+    # 切割为每次翻译多少行，值在 set.ini中设定，默认10
+    split_size = int(config.settings['trans_thread'])
+    split_source_text = [source_text[i:i + split_size] for i in range(0, len(source_text), split_size)]
 
-                res_trans = get_content(data)
-                result = tools.cleartext(res_trans).split("\n")
-                result_length = len(result)
-                # 如果返回数量和原始语言数量不一致，则重新切割
-                if result_length < source_length:
-                    result = []
-                    for line_res in it:
-                        data['q'] = line_res
-                        time.sleep(wait_sec)
-                        result.append(get_content(data))
+    def handle(i, it):
+        source_length = len(it)
+        data = {
+            "q": "\n".join(it),
+            "source": "auto",
+            "target": target_language
+        }
 
-                if inst and inst.precent < 75:
-                    inst.precent += round((i + 1) * 5 / len(split_source_text), 2)
-                if set_p:
-                    tools.set_process(f'{result[0]}\n\n' if split_size == 1 else "\n\n".join(result), 'subtitle')
-                    tools.set_process(config.transobj['starttrans'] + f' {i * split_size + 1} ',
-                                      btnkey=inst.init['btnkey'] if inst else "")
-                else:
-                    tools.set_process_box("\n".join(result), func_name="fanyi", type="set")
-                result_length = len(result)
-                while result_length < source_length:
-                    result.append("")
-                    result_length += 1
-                result = result[:source_length]
-                target_text.extend(result)
-            except Exception as e:
-                err = f'请检查部署和地址:{str(e)}'
+        res_trans = get_content(data)
+        result = tools.cleartext(res_trans).split("\n")
+        result_length = len(result)
+        # 如果返回数量和原始语言数量不一致，则重新切割
+        if result_length < source_length:
+            result = []
+            for line_res in it:
+                data['q'] = line_res
                 time.sleep(wait_sec)
-                config.logger.error(f'翻译出错:暂停{wait_sec}s')
-                break
-            else:
-                err = ''
-                index = i
-                iter_num = 0
+                result.append(get_content(data))
+
+        if inst and inst.precent < 75:
+            inst.precent += round((i + 1) * 5 / len(split_source_text), 2)
+        if set_p:
+            tools.set_process(f'{result[0]}\n\n' if split_size == 1 else "\n\n".join(result), 'subtitle')
+            tools.set_process(config.transobj['starttrans'] + f' {i * split_size + 1} ',
+                              btnkey=inst.init['btnkey'] if inst else "")
         else:
-            break
+            tools.set_process_box("\n".join(result), func_name="fanyi", type="set")
+        result_length = len(result)
+        while result_length < source_length:
+            result.append("")
+            result_length += 1
+        result = result[:source_length]
+        return result
 
-    if err:
+    try:
+        results = run_chunks(split_source_text, handle, name='OTT', set_p=set_p, inst=inst, stop=stop)
+    except Exception as e:
+        err = f'请检查部署和地址:{str(e)}'
         config.logger.error(f'[OTT]翻译请求失败:{err=}')
         raise Exception(f'OTT:{err}')
+    if results is None:
+        return
+    target_text = [x for result in results for x in result]
 
     if isinstance(text_list, str):
         return "\n".join(target_text)
@@ -0,0 +1,97 @@
+# AI翻译按 token 数分批，每次请求尽量填满 trans_max_tokens
+# 短字幕不再每 trans_thread 行就请求一次，长字幕也不会因一批过长被截断
+# trans_max_tokens 为 0 时仍按 trans_thread 行数分批
+import re
+
+from videotrans.configure import config
+
+# 模型名 => tiktoken 编码器，None 表示无法使用 tiktoken，改为估算
+_encoders = {}
+# 累计行数、请求数、tokens
+stats = {"lines": 0, "requests": 0, "tokens": 0}
+
+
+def _encoder(model):
+    if model in _encoders:
+        return _encoders[model]
+    enc = None
+    try:
+        import tiktoken
+        try:
+            enc = tiktoken.encoding_for_model(model)
+        except KeyError:
+            # 非 OpenAI 模型按 cl100k_base 近似计算
+            enc = tiktoken.get_encoding('cl100k_base')
+    except Exception as e:
+        # 未安装或无法下载编码文件
+        config.logger.error(f'tiktoken 不可用，改为估算 tokens:{str(e)}')
+    _encoders[model] = enc
+    return enc
+
+
+def count_tokens(text, model=''):
+    enc = _encoder(model)
+    if enc is not None:
+        return len(enc.encode(text, disallowed_special=()))
+    # 中日韩等文字约每字1个token，其他约每4个字符1个token
+    cjk = len(re.findall(r'[\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af]', text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def _budget():
+    try:
+        return int(config.settings['trans_max_tokens'])
+    except Exception:
+        return 0
+
+
+# 将待翻译的行分批，返回 List[List[str]]
+def pack(lines, *, model='', name=''):
+    budget = _budget()
+    if budget <= 0:
+        split_size = int(config.settings['trans_thread'])
+        return [lines[i:i + split_size] for i in range(0, len(lines), split_size)]
+    chunks = []
+    chunk_tokens = []
+    current = []
+    tokens = 0
+    for line in lines:
+        # 每行另加1个换行符
+        n = count_tokens(line, model) + 1
+        if current and tokens + n > budget:
+            chunks.append(current)
+            chunk_tokens.append(tokens)
+            current = []
+            tokens = 0
+        current.append(line)
+        tokens += n
+    if current:
+        chunks.append(current)
+        chunk_tokens.append(tokens)
+    if chunks:
+        stats['lines'] += len(lines)
+        stats['requests'] += len(chunks)
+        stats['tokens'] += sum(chunk_tokens)
+        config.logger.info(
+            f'[{name}]{len(lines)}行分为{len(chunks)}次请求，平均每次{sum(chunk_tokens) // len(chunks)} tokens，最多{max(chunk_tokens)} tokens，'
+            f'累计平均每次请求{stats["lines"] // stats["requests"]}行')
+    return chunks
+
+
+# 按条数和长度分批，用于有批量接口的翻译通道，每批不超过 max_lines 条、总长度不超过 max_chars
+# size(line) 计算单行长度，默认按字符数
+def pack_size(lines, *, max_lines, max_chars, size=len):
+    chunks = []
+    current = []
+    total = 0
+    for line in lines:
+        n = size(line)
+        if current and (len(current) >= max_lines or total + n > max_chars):
+            chunks.append(current)
+            current = []
+            total = 0
+        current.append(line)
+        total += n
+    if current:
+        chunks.append(current)
+    return chunks
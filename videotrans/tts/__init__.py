@@ -1,11 +1,29 @@
 import copy
 import os
 import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
 from videotrans.configure import config
-from videotrans.util import tools
+from . import cache
+from videotrans.util import aimd, pcm, tools
 
 lasterror = ""
 
+# 接口返回 wav 的配音渠道，配音文件直接保存为 wav，不再转码为 mp3
+WAV_TTS = ['clone-voice', 'ChatTTS', 'GPT-SoVITS', 'CosyVoice', 'FishTTS', '302.ai', 'AzureTTS']
+
+
+# 配音文件扩展名
+def clip_suffix(tts_type):
+    return '.wav' if tts_type in WAV_TTS else '.mp3'
+
+
+# 进程内共享的配音线程池，最多 dubbing_thread 个请求同时进行，任一请求结束后立即开始下一条
+_pool_lock = threading.Lock()
+_pool = None
+_pool_size = 0
+
 
 # 文字合成
 def text_to_speech(
@@ -47,6 +65,7 @@ def text_to_speech(
     elif tts_type == '302.ai':
         from .ai302tts import get_voice
 
+    err = ""
     if get_voice:
         try:
             get_voice(
@@ -60,12 +79,15 @@ def text_to_speech(
                 set_p=set_p,
                 inst=inst)
         except Exception as e:
-            lasterror = str(e)
+            err = str(e)
+            lasterror = err
     if tools.vail_file(filename):
         if play:
             threading.Thread(target=tools.pygameaudio, args=(filename,)).start()
     else:
         config.logger.error(f'no filename={filename} {tts_type=} {text=},{role=}')
+    # 返回出错信息，成功时为空
+    return err
 
 
 # 单独处理 AzureTTS 批量
@@ -87,54 +109,115 @@ def _azuretts(queue_tts, language=None, set_p=False, inst=None):
         tools.set_process(f"AzureTTS...", btnkey=inst.init['btnkey'] if inst else "")
 
 
+def _get_pool(size):
+    global _pool, _pool_size
+    with _pool_lock:
+        if _pool is None or _pool_size != size:
+            if _pool is not None:
+                # 已提交的任务继续执行完毕
+                _pool.shutdown(wait=False)
+            _pool = ThreadPoolExecutor(max_workers=size, thread_name_prefix='tts')
+            _pool_size = size
+        return _pool
+
+
+def _percentile(data, p):
+    data = sorted(data)
+    return data[min(len(data) - 1, int(len(data) * p))]
+
+
+# 记录每条配音耗时的 p50/p95，以及实际并发数=各条耗时之和/总耗时
+def _log_stats(tts_type, latencies, elapsed):
+    if not latencies or elapsed <= 0:
+        return
+    config.logger.info(
+        f'[{tts_type}]配音{len(latencies)}条，总耗时{elapsed:.2f}s，p50={_percentile(latencies, 0.5):.2f}s，'
+        f'p95={_percentile(latencies, 0.95):.2f}s，实际并发数={sum(latencies) / elapsed:.2f}')
+
+
+def _is_stop():
+    return config.exit_soft or (config.current_status != 'ing' and config.box_tts != 'ing')
+
+
 def run(*, queue_tts=None, language=None, set_p=True, inst=None):
+    global lasterror
     queue_tts_copy = copy.deepcopy(queue_tts)
-    # 需要并行的数量3
     n_total = len(queue_tts)
     if n_total < 1:
         return False
 
-    n = 0
-    dub_nums = int(config.settings['dubbing_thread'])
-    if config.exit_soft or (config.current_status != 'ing' and config.box_tts != 'ing'):
+    if _is_stop():
         return True
-    if len(queue_tts) > 0 and queue_tts[0]['tts_type'] == 'AzureTTS':
-        _azuretts(queue_tts, language=language, set_p=set_p, inst=inst)
-    else:
-        while len(queue_tts) > 0:
-            if config.exit_soft or (config.current_status != 'ing' and config.box_tts != 'ing'):
+    # 已存在的配音文件跳过，clone 角色每次重新生成
+    items = [p for p in queue_tts if p['role'] == 'clone' or not tools.vail_file(p['filename'])]
+    # 全局配音缓存中已有的直接复制
+    if items and cache.enabled():
+        total = len(items)
+        items = [p for p in items if not cache.get(p, language)]
+        cache.log_stats(total - len(items), total)
+    n = n_total - len(items)
+    if items and items[0]['tts_type'] == 'AzureTTS':
+        _azuretts(items, language=language, set_p=set_p, inst=inst)
+    elif items and items[0]['tts_type'] == 'edgeTTS':
+        from .edgetts import run_batch
+
+        def callback(done):
+            if set_p and inst:
+                tools.set_process(f'{config.transobj["kaishipeiyin"]} [{n + done}/{n_total}]',
+                                  btnkey=inst.init['btnkey'])
+
+        start_time = time.time()
+        latencies, err = run_batch(items, set_p=set_p, inst=inst, callback=callback)
+        if err:
+            lasterror = err
+        _log_stats('edgeTTS', latencies, time.time() - start_time)
+    elif items:
+        latencies = []
+
+        # 实际同时请求数由 aimd 按是否被限流自动调整
+        limiter = aimd.get(f'tts:{items[0]["tts_type"]}', int(config.settings['dubbing_thread']))
+
+        def work(p):
+            if not limiter.acquire(stop=_is_stop):
+                return
+            start = time.time()
+            err = text_to_speech(
+                text=p['text'],
+                role=p['role'],
+                rate=p['rate'],
+                pitch=p['pitch'],
+                volume=p['volume'],
+                filename=p['filename'],
+                tts_type=p['tts_type'],
+                set_p=set_p,
+                inst=inst,
+                language=language)
+            limiter.release(err)
+            latencies.append(time.time() - start)
+
+        start_time = time.time()
+        pool = _get_pool(max(1, int(config.settings['dubbing_thread'])))
+        pending = {pool.submit(work, p) for p in items}
+        while pending:
+            done, pending = wait(pending, timeout=1, return_when=FIRST_COMPLETED)
+            if _is_stop():
+                for fu in pending:
+                    fu.cancel()
                 return True
-            try:
-                tolist = []
-                for i in range(dub_nums):
-                    if len(queue_tts) > 0:
-                        p = queue_tts.pop(0)
-                        if p['role'] != 'clone' and tools.vail_file(p['filename']):
-                            continue
-                        tolist.append(threading.Thread(target=text_to_speech, kwargs={
-                            "text": p['text'],
-                            "role": p['role'],
-                            "rate": p['rate'],
-                            "pitch": p['pitch'],
-                            "volume": p['volume'],
-                            "filename": p['filename'],
-                            "tts_type": p['tts_type'],
-                            "set_p": set_p,
-                            "inst": inst,
-                            "language": language
-                        }))
-                if len(tolist) < 1:
-                    continue
-                for t in tolist:
-                    t.start()
-                for t in tolist:
-                    n += 1
-                    if set_p and inst:
-                        tools.set_process(f'{config.transobj["kaishipeiyin"]} [{n}/{n_total}]',
-                                          btnkey=inst.init['btnkey'])
-                    t.join()
-            except Exception as e:
-                print(f'runtts:{str(e)}')
+            for fu in done:
+                n += 1
+                if fu.exception():
+                    config.logger.error(f'runtts:{str(fu.exception())}')
+            if done and set_p and inst:
+                tools.set_process(f'{config.transobj["kaishipeiyin"]} [{n}/{n_total}]',
+                                  btnkey=inst.init['btnkey'])
+        _log_stats(items[0]['tts_type'], latencies, time.time() - start_time)
+    if not _is_stop():
+        for p in items:
+            cache.put(p, language)
+    # 记录每条配音的采样率和采样数 p['clip']，后续计算时长时只读取文件头，无需解码
+    for p in queue_tts:
+        p['clip'] = pcm.probe(p['filename']) if tools.vail_file(p['filename']) else None
 
     err = 0
     for it in queue_tts_copy:
@@ -5,7 +5,7 @@ import httpx
 import requests
 from openai import OpenAI, APIError
 from videotrans.configure import config
-from videotrans.util import tools
+from videotrans.util import httpclient, tools
 
 
 def get_voice(*, text=None, role=None, volume="+0%", pitch="+0Hz", rate=None, language=None, filename=None, set_p=True,
@@ -25,7 +25,7 @@ def get_voice_openai(*, text=None, role=None, volume="+0%", pitch="+0Hz", rate=N
             rate = float(rate.replace('%', '')) / 100
             speed += rate
         try:
-            response = requests.post('https://api.302.ai/v1/audio/speech', headers={
+            response = httpclient.post('https://api.302.ai/v1/audio/speech', proxy=httpclient.get_proxy(), headers={
                 'Authorization': f'Bearer {config.params["ai302tts_key"]}',
                 'User-Agent': 'pyvideotrans',
                 'Content-Type': 'application/json'
@@ -82,10 +82,11 @@ def get_voice_azure(*, text=None, role=None, volume="+0%", pitch="+0Hz", rate='+
                 'Host': 'api.302.ai',
                 'Connection': 'keep-alive'
             }
-            response = requests.post('https://api.302.ai/cognitiveservices/v1',
-                                     headers=headers,
-                                     data=ssml.encode('utf-8'),
-                                     verify=False)
+            response = httpclient.post('https://api.302.ai/cognitiveservices/v1',
+                                       proxy=httpclient.get_proxy(),
+                                       headers=headers,
+                                       data=ssml.encode('utf-8'),
+                                       verify=False)
             if response.status_code != 200:
                 raise Exception(response.text)
             with open(filename + ".wav", 'wb') as f:
@@ -96,7 +97,7 @@ def get_voice_azure(*, text=None, role=None, volume="+0%", pitch="+0Hz", rate='+
             raise
         if tools.vail_file(filename + ".wav") and config.settings['remove_silence']:
             tools.remove_silence_from_end(filename + ".wav")
-        tools.wav2mp3(filename + ".wav", filename)
+        tools.wav2clip(filename + ".wav", filename)
         if set_p and inst and inst.precent < 80:
             inst.precent += 0.1
             tools.set_process(f'{config.transobj["kaishipeiyin"]} ', btnkey=inst.init['btnkey'] if inst else "")
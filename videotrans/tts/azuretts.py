@@ -82,7 +82,7 @@ def get_voice(*, text=None, role=None, volume="+0%", pitch="+0Hz", rate=None, la
 
         if speech_synthesis_result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
             if not is_list:
-                tools.wav2mp3(filename + ".wav", filename)
+                tools.wav2clip(filename + ".wav", filename)
                 if tools.vail_file(filename) and config.settings['remove_silence']:
                     tools.remove_silence_from_end(filename)
                 if set_p and inst and inst.precent < 80:
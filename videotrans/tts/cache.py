@@ -0,0 +1,123 @@
+# 跨任务共享的配音缓存，相同渠道、角色、语速、音量、音调、语言和文字的配音只合成一次
+# 文件名为参数的 md5，超过 tts_cache_mb 时按最后使用时间移除旧文件
+import hashlib
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+
+from videotrans.configure import config
+from videotrans.util import tools
+
+_lock = threading.Lock()
+_cache_dir = config.homedir + "/tts_cache"
+# 缓存目录当前占用字节，None 表示尚未统计
+_total = None
+# 命中、保存次数
+stats = {"hit": 0, "put": 0}
+
+
+def _budget():
+    try:
+        return int(float(config.settings['tts_cache_mb']) * 1024 * 1024)
+    except Exception:
+        return 0
+
+
+def enabled():
+    return _budget() > 0
+
+
+# clone 角色依赖原视频声音，不缓存
+def _key(item, language):
+    if item['role'] == 'clone':
+        return None
+    raw = f"{item['tts_type']}\n{item['role']}\n{item['rate']}\n{item['volume']}\n{item['pitch']}\n{language}\n{config.settings['remove_silence']}\n{item['text']}"
+    return hashlib.md5(raw.encode('utf-8')).hexdigest()
+
+
+def _path(key, filename):
+    return f'{_cache_dir}/{key[:2]}/{key}{Path(filename).suffix}'
+
+
+def _scan():
+    global _total
+    if _total is None:
+        _total = 0
+        Path(_cache_dir).mkdir(parents=True, exist_ok=True)
+        for f in Path(_cache_dir).rglob('*'):
+            if f.is_file():
+                _total += f.stat().st_size
+
+
+# 超出配额时按修改时间（命中时会更新）移除最久未使用的文件
+def _evict(budget):
+    global _total
+    files = []
+    for f in Path(_cache_dir).rglob('*'):
+        if f.is_file():
+            st = f.stat()
+            files.append((st.st_mtime, st.st_size, f))
+    files.sort()
+    _total = sum(size for _, size, _ in files)
+    for _, size, f in files:
+        if _total <= budget * 0.9:
+            break
+        try:
+            f.unlink()
+            _total -= size
+        except OSError:
+            pass
+
+
+# 命中时复制到 item['filename']，返回是否命中
+def get(item, language):
+    if not enabled():
+        return False
+    key = _key(item, language)
+    if not key:
+        return False
+    src = _path(key, item['filename'])
+    if not tools.vail_file(src):
+        return False
+    try:
+        # 后续变速、去静音等处理会原地改写配音文件，因此复制而不是硬链接
+        shutil.copyfile(src, item['filename'])
+        os.utime(src, None)
+    except OSError as e:
+        config.logger.error(f'读取配音缓存出错:{str(e)}')
+        return False
+    stats['hit'] += 1
+    return True
+
+
+# 保存刚合成的配音
+def put(item, language):
+    global _total
+    budget = _budget()
+    if budget <= 0 or not tools.vail_file(item['filename']):
+        return
+    key = _key(item, language)
+    if not key:
+        return
+    dst = _path(key, item['filename'])
+    try:
+        with _lock:
+            _scan()
+            if Path(dst).exists():
+                return
+            Path(dst).parent.mkdir(parents=True, exist_ok=True)
+            tmp = f'{dst}.{threading.get_ident()}.tmp'
+            shutil.copyfile(item['filename'], tmp)
+            os.replace(tmp, dst)
+            _total += Path(dst).stat().st_size
+            stats['put'] += 1
+            if _total > budget:
+                _evict(budget)
+    except OSError as e:
+        config.logger.error(f'保存配音缓存出错:{str(e)}')
+
+
+def log_stats(hit, total):
+    config.logger.info(f'[配音缓存]本次命中{hit}/{total}条，累计命中{stats["hit"]}条，保存{stats["put"]}条')
@@ -7,7 +7,7 @@ from pathlib import Path
 import requests
 from requests import Timeout
 from videotrans.configure import config
-from videotrans.util import tools
+from videotrans.util import httpclient, tools
 
 
 def get_voice(*, text=None, role="2222", rate=None, volume="+0%", pitch="+0Hz", language=None, filename=None,
@@ -21,7 +21,7 @@ def get_voice(*, text=None, role="2222", rate=None, volume="+0%", pitch="+0Hz",
         config.logger.info(f'ChatTTS:api={api_url}')
 
         data = {"text": text.strip(), "voice": role, 'prompt': '', 'is_split': 1}
-        res = requests.post(f"{api_url}/tts", data=data, proxies={"http": "", "https": ""}, timeout=3600)
+        res = httpclient.post(f"{api_url}/tts", data=data, timeout=3600)
         config.logger.info(f'chatTTS:{data=}')
 
         res = res.json()
@@ -33,16 +33,16 @@ def get_voice(*, text=None, role="2222", rate=None, volume="+0%", pitch="+0Hz",
                 return True
             raise Exception(f'{res}')
         if api_url.find('127.0.0.1') > -1 or api_url.find('localhost') > -1:
-            tools.wav2mp3(re.sub(r'\\{1,}', '/', res['filename']), filename)
+            tools.wav2clip(re.sub(r'\\{1,}', '/', res['filename']), filename, move=False)
         else:
-            resb = requests.get(res['url'])
+            resb = httpclient.get(res['url'])
             if resb.status_code != 200:
                 raise Exception(f'chatTTS:{res["url"]=}')
             config.logger.info(f'ChatTTS:resb={resb.status_code=}')
             with open(filename + ".wav", 'wb') as f:
                 f.write(resb.content)
             time.sleep(1)
-            tools.wav2mp3(filename + ".wav", filename)
+            tools.wav2clip(filename + ".wav", filename)
             if os.path.exists(filename + ".wav"):
                 os.unlink(filename + ".wav")
             if tools.vail_file(filename) and config.settings['remove_silence']:
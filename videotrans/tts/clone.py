@@ -6,7 +6,7 @@ from pathlib import Path
 
 import requests
 from videotrans.configure import config
-from videotrans.util import tools
+from videotrans.util import httpclient, tools
 
 
 def get_voice(*, text=None, role=None, rate=None, volume="+0%", pitch="+0Hz", language=None, filename=None, set_p=True,
@@ -32,8 +32,7 @@ def get_voice(*, text=None, role=None, rate=None, volume="+0%", pitch="+0Hz", la
         else:
             # 克隆声音
             files = {"audio": open(filename, 'rb')}
-        res = requests.post(f"{api_url}/apitts", data=data, files=files, proxies={"http": "", "https": ""},
-                            timeout=3600)
+        res = httpclient.post(f"{api_url}/apitts", data=data, files=files, timeout=3600)
         config.logger.info(f'clone-voice:{data=},{res.text=}')
 
         res = res.json()
@@ -43,16 +42,16 @@ def get_voice(*, text=None, role=None, rate=None, volume="+0%", pitch="+0Hz", la
                 return True
             raise Exception(f'{res}')
         if api_url.find('127.0.0.1') > -1 or api_url.find('localhost') > -1:
-            tools.wav2mp3(re.sub(r'\\{1,}', '/', res['filename']), filename)
+            tools.wav2clip(re.sub(r'\\{1,}', '/', res['filename']), filename, move=False)
         else:
-            resb = requests.get(res['url'])
+            resb = httpclient.get(res['url'])
             if resb.status_code != 200:
                 raise Exception(f'clonevoice:{res["url"]=}')
             config.logger.info(f'clone-voice:resb={resb.status_code=}')
             with open(filename + ".wav", 'wb') as f:
                 f.write(resb.content)
             time.sleep(1)
-            tools.wav2mp3(filename + ".wav", filename)
+            tools.wav2clip(filename + ".wav", filename)
             if os.path.exists(filename + ".wav"):
                 os.unlink(filename + ".wav")
             if tools.vail_file(filename) and config.settings['remove_silence']:
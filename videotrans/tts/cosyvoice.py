@@ -7,7 +7,7 @@ from pathlib import Path
 
 import requests
 from videotrans.configure import config
-from videotrans.util import tools
+from videotrans.util import httpclient, tools
 
 
 def wav_to_base64(file_path):
@@ -47,7 +47,7 @@ def get_voice(*, text=None, role=None, rate=None, volume="+0%", pitch="+0Hz", la
             else:
                 data['speaker'] = '中文女'
             # 克隆声音
-            response = requests.post(f"{api_url}", json=data, proxies={"http": "", "https": ""}, timeout=3600)
+            response = httpclient.post(f"{api_url}", json=data, timeout=3600)
         else:
             data = {"text": text,
                     "lang": "zh" if language.startswith('zh') else language
@@ -71,7 +71,7 @@ def get_voice(*, text=None, role=None, rate=None, volume="+0%", pitch="+0Hz", la
             else:
                 data['role'] = '中文女'
             # 克隆声音
-            response = requests.post(f"{api_url}", data=data, proxies={"http": "", "https": ""}, timeout=3600)
+            response = httpclient.post(f"{api_url}", data=data, timeout=3600)
 
         if response.status_code != 200:
             # 如果是JSON数据，使用json()方法解析
@@ -84,7 +84,7 @@ def get_voice(*, text=None, role=None, rate=None, volume="+0%", pitch="+0Hz", la
         time.sleep(1)
         if not os.path.exists(filename + ".wav"):
             raise Exception(f'CosyVoice 合成声音失败-2:{text=}')
-        tools.wav2mp3(filename + ".wav", filename)
+        tools.wav2clip(filename + ".wav", filename)
         if os.path.exists(filename + ".wav"):
             os.unlink(filename + ".wav")
         if tools.vail_file(filename) and config.settings['remove_silence']:
@@ -1,11 +1,12 @@
 import asyncio
+import random
 import re
 import sys
 import time
 import os
 import edge_tts
 from videotrans.configure import config
-from videotrans.util import tools
+from videotrans.util import aimd, tools
 
 if sys.platform == 'win32':
     asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
@@ -13,6 +14,92 @@ else:
     asyncio.set_event_loop_policy(asyncio.DefaultEventLoopPolicy())
 
 
+def _is_stop():
+    return config.exit_soft or (config.current_status != 'ing' and config.box_tts != 'ing')
+
+
+def _fix_params(rate, volume, pitch):
+    if not volume or not re.match(r'^[+-]\d+%$', volume):
+        volume = '+0%'
+    if not rate or not re.match(r'^[+-]\d+%$', rate):
+        rate = '+0%'
+    if not pitch or not re.match(r'^[+-]\d+Hz$', pitch, re.I):
+        pitch = '+0Hz'
+    return rate, volume, pitch
+
+
+# 合成一条，出错后仅该条等待后重试，不影响其他正在进行的请求
+async def _save(item, limiter, *, set_p=True, inst=None, check_stop=True):
+    rate, volume, pitch = _fix_params(item.get('rate'), item.get('volume'), item.get('pitch'))
+    retries = int(config.settings['retries'])
+    err = ""
+    for n in range(retries + 1):
+        if check_stop and _is_stop():
+            return
+        # 同时请求数由 aimd 控制，被限流时自动减小
+        while not limiter.try_acquire():
+            if check_stop and _is_stop():
+                return
+            await asyncio.sleep(0.05)
+        try:
+            communicate = edge_tts.Communicate(item['text'], item['role'], rate=rate, volume=volume, pitch=pitch)
+            await communicate.save(item['filename'])
+        except Exception as e:
+            err = str(e)
+            limiter.release(err)
+            config.logger.error(f'[edgeTTS]{item["text"]=}{err=},')
+            if not aimd.is_throttle(err):
+                break
+        else:
+            # 请求已结束，只释放一次，之后去除静音出错不计入限流
+            limiter.release()
+            if tools.vail_file(item['filename']):
+                if config.settings['remove_silence']:
+                    await asyncio.get_running_loop().run_in_executor(None, tools.remove_silence_from_end,
+                                                                     item['filename'])
+                return
+            err = f'edgeTTS配音失败:{item["text"]=},{item["filename"]=}'
+            config.logger.error(err)
+            return
+        if n < retries:
+            if set_p:
+                tools.set_process("edgeTTS过于频繁暂停后重试", btnkey=inst.init['btnkey'] if inst else "")
+            # 指数退避并加入随机值，避免同时重试
+            await asyncio.sleep(min(30, 2 ** (n + 1)) + random.random())
+    if set_p:
+        tools.set_process("有一个配音出错", btnkey=inst.init['btnkey'] if inst else "")
+    config.logger.error(f'edgeTTS配音有一个失败:{item["text"]=},{item["filename"]=}')
+    if inst and inst.init['btnkey']:
+        config.errorlist[inst.init['btnkey']] = err
+    raise Exception(err)
+
+
+# 一个任务的所有配音在同一个事件循环中进行，最多 dubbing_thread 个同时请求，被限流时由 aimd 自动减小
+# callback(n) 每完成一条调用，返回 (每条的耗时, 最后一个错误)
+def run_batch(items, *, set_p=True, inst=None, callback=None):
+    latencies = []
+    errors = []
+
+    async def one(item, limiter):
+        start = time.time()
+        try:
+            await _save(item, limiter, set_p=set_p, inst=inst)
+        except Exception as e:
+            errors.append(str(e))
+        latencies.append(time.time() - start)
+        if set_p and inst and inst.precent < 80:
+            inst.precent += 0.1
+        if callback:
+            callback(len(latencies))
+
+    async def main():
+        limiter = aimd.get('tts:edgeTTS', int(config.settings['dubbing_thread']))
+        await asyncio.gather(*[one(item, limiter) for item in items])
+
+    asyncio.run(main())
+    return latencies, errors[-1] if errors else ""
+
+
 def get_voice(*,
               text=None,
               role=None,
@@ -24,48 +111,14 @@ def get_voice(*,
               pitch="+0Hz",
               volume="+0%"
               ):
-    if not re.match(r'^[+-]\d+%$', volume):
-        volume = '+0%'
-    if not re.match(r'^[+-]\d+%$', rate):
-        rate = '+0%'
-    if not re.match(r'^[+-]\d+Hz$', pitch, re.I):
-        pitch = '+0Hz'
-    communicate = edge_tts.Communicate(text, role, rate=rate, volume=volume, pitch=pitch)
-    try:
-        asyncio.run(communicate.save(filename))
-        if not tools.vail_file(filename):
-            config.logger.error(f'edgeTTS配音失败:{text=},{filename=}')
-            return True
-        if tools.vail_file(filename) and config.settings['remove_silence']:
-            tools.remove_silence_from_end(filename)
-        if set_p and inst and inst.precent < 80:
-            inst.precent += 0.1
-            tools.set_process(f'{config.transobj["kaishipeiyin"]} ', btnkey=inst.init['btnkey'] if inst else "")
+    item = {"text": text, "role": role, "rate": rate, "volume": volume, "pitch": pitch, "filename": filename}
 
-    except Exception as e:
-        err = str(e)
-        config.logger.error(f'[edgeTTS]{text=}{err=},')
-        if err.find("Invalid response status") > 0 or err.find('WinError 10054') > -1:
-            if set_p:
-                tools.set_process("edgeTTS过于频繁暂停5s后重试", btnkey=inst.init['btnkey'] if inst else "")
-            config.settings['dubbing_thread'] = 1
-            time.sleep(10)
-            return get_voice(
-                text=text,
-                role=role,
-                rate=rate,
-                language=language,
-                filename=filename,
-                set_p=set_p,
-                inst=inst,
-                pitch=pitch,
-                volume=volume
-            )
-        elif set_p:
-            tools.set_process("有一个配音出错", btnkey=inst.init['btnkey'] if inst else "")
-            config.logger.error(f'edgeTTS配音有一个失败:{text=},{filename=}')
-        if inst and inst.init['btnkey']:
-            config.errorlist[inst.init['btnkey']] = err
-        raise
-    else:
-        return True
+    async def main():
+        await _save(item, aimd.get('tts:edgeTTS', int(config.settings['dubbing_thread'])), set_p=set_p, inst=inst,
+                    check_stop=False)
+
+    asyncio.run(main())
+    if set_p and inst and inst.precent < 80:
+        inst.precent += 0.1
+        tools.set_process(f'{config.transobj["kaishipeiyin"]} ', btnkey=inst.init['btnkey'] if inst else "")
+    return True
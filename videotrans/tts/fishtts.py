@@ -5,7 +5,7 @@ import time
 
 import requests
 from videotrans.configure import config
-from videotrans.util import tools
+from videotrans.util import httpclient, tools
 
 import base64
 from pathlib import Path
@@ -43,7 +43,7 @@ def get_voice(*, text=None, role=None, rate=None, volume="+0%", pitch="+0Hz", la
         elif os.path.exists(f'{config.rootdir}/fishwavs/{data["reference_audio"]}'):
             data['reference_audio'] = wav_to_base64(f'{config.rootdir}/fishwavs/{data["reference_audio"]}')
 
-        response = requests.post(f"{api_url}", json=data, proxies={"http": "", "https": ""}, timeout=3600)
+        response = httpclient.post(f"{api_url}", json=data, timeout=3600)
         if response.status_code != 200:
             raise response.json()
         # 如果是WAV音频流，获取原始音频数据
@@ -52,7 +52,7 @@ def get_voice(*, text=None, role=None, rate=None, volume="+0%", pitch="+0Hz", la
         time.sleep(1)
         if not os.path.exists(filename + ".wav"):
             raise Exception(f'FishTTS合成声音失败-2:{text=}')
-        tools.wav2mp3(filename + ".wav", filename)
+        tools.wav2clip(filename + ".wav", filename)
         if os.path.exists(filename + ".wav"):
             os.unlink(filename + ".wav")
         if tools.vail_file(filename) and config.settings['remove_silence']:
@@ -5,7 +5,7 @@ import time
 
 import requests
 from videotrans.configure import config
-from videotrans.util import tools
+from videotrans.util import httpclient, tools
 
 
 def get_voice(*, text=None, role=None, rate=None, volume="+0%", pitch="+0Hz", language=None, filename=None, set_p=True,
@@ -36,7 +36,7 @@ def get_voice(*, text=None, role=None, rate=None, volume="+0%", pitch="+0Hz", la
         print(f'{data=}')
         # role=clone是直接复制
         # 克隆声音
-        response = requests.post(f"{api_url}", json=data, proxies={"http": "", "https": ""}, timeout=3600)
+        response = httpclient.post(f"{api_url}", json=data, timeout=3600)
         # 获取响应头中的Content-Type
         content_type = response.headers.get('Content-Type')
 
@@ -51,7 +51,7 @@ def get_voice(*, text=None, role=None, rate=None, volume="+0%", pitch="+0Hz", la
             time.sleep(1)
             if not os.path.exists(filename + ".wav"):
                 raise Exception(f'GPT-SoVITS合成声音失败-2:{text=}')
-            tools.wav2mp3(filename + ".wav", filename)
+            tools.wav2clip(filename + ".wav", filename)
             if os.path.exists(filename + ".wav"):
                 os.unlink(filename + ".wav")
             if tools.vail_file(filename) and config.settings['remove_silence']:
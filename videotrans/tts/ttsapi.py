@@ -4,27 +4,7 @@ import re
 
 import requests
 from videotrans.configure import config
-from videotrans.util import tools
-
-shound_del = False
-
-
-def update_proxy(type='set'):
-    global shound_del
-    if type == 'del' and shound_del:
-        del os.environ['http_proxy']
-        del os.environ['https_proxy']
-        del os.environ['all_proxy']
-        shound_del = False
-    elif type == 'set':
-        raw_proxy = os.environ.get('http_proxy')
-        if not raw_proxy:
-            proxy = tools.set_proxy()
-            if proxy:
-                shound_del = True
-                os.environ['http_proxy'] = proxy
-                os.environ['https_proxy'] = proxy
-                os.environ['all_proxy'] = proxy
+from videotrans.util import httpclient, tools
 
 
 def get_voice(*, text=None, role=None, volume="+0%", pitch="+0Hz", rate=None, language=None, filename=None, set_p=True,
@@ -34,13 +14,12 @@ def get_voice(*, text=None, role=None, volume="+0%", pitch="+0Hz", rate=None, la
         if not api_url:
             raise Exception("get_voice:" + config.transobj['ttsapi_nourl'])
         config.logger.info(f'TTS-API:api={api_url}')
-        if not re.search(r'localhost', api_url) and not re.match(r'https?://(\d+\.){3}\d+', api_url):
-            update_proxy(type='set')
+        proxy = httpclient.get_proxy(api_url)
 
         data = {"text": text.strip(), "language": language, "extra": config.params['ttsapi_extra'], "voice": role,
                 "ostype": sys.platform, rate: rate}
 
-        resraw = requests.post(f"{api_url}", data=data, verify=False)
+        resraw = httpclient.post(f"{api_url}", proxy=proxy, data=data, verify=False)
         res = resraw.json()
         if "code" not in res or "msg" not in res:
             raise Exception(f'TTS-API:{res}')
@@ -48,7 +27,7 @@ def get_voice(*, text=None, role=None, volume="+0%", pitch="+0Hz", rate=None, la
             raise Exception(f'TTS-API:{res["msg"]}')
 
         url = res['data']
-        res = requests.get(url)
+        res = httpclient.get(url, proxy=proxy)
         if res.status_code != 200:
             raise Exception(f'TTS-API:{url}')
         with open(filename, 'wb') as f:
@@ -68,5 +47,3 @@ def get_voice(*, text=None, role=None, volume="+0%", pitch="+0Hz", rate=None, la
         raise
     else:
         return True
-    finally:
-        update_proxy(type='del')
@@ -81,6 +81,9 @@ class Ui_setini(object):
             "initial_prompt_zh": "发送给whisper模型的提示词",
             "whisper_threads": "faster模式下，字幕识别时，cpu进程数",
             "whisper_worker": "faster模式下，字幕识别时，同时工作进程数",
+            "whisper_cache_mb": "识别完成后保留已加载模型以便下次直接使用，最多占用内存MB，超出时移除最久未使用的模型，0=不保留。显卡上的模型在全部任务结束或停止后移除以释放显存",
+            "whisper_batch_size": "faster模式均等分割识别时，每批同时识别的片段数，大于1时批量识别速度更快，解码失败的片段会单独使用温度回退重新识别，需指定原始语言，1=逐段识别",
+            "whisper_process_num": "faster模式整体识别且未使用CUDA时，长音频在静音处切分后同时识别的进程数，每段至少5分钟，cpu进程数平均分配，1=不切分",
             "beam_size": "字幕识别时精度调整，1-5，1=消耗显存最低，5=消耗显存最多",
             "best_of": "字幕识别时精度调整，1-5，1=消耗显存最低，5=消耗显存最多",
             "temperature": "0=占用更少GPU资源但效果略差，1=占用更多GPU资源同时效果更好",
@@ -96,10 +99,20 @@ class Ui_setini(object):
             "zh_hant_s": "强制将识别出的繁体字幕转为简体",
 
             "trans_thread": "同时翻译的字幕条数",
+            "trans_cache_mb": "翻译记忆最大占用MB，相同通道、模型和语言的相同字幕直接使用已保存的译文，超出时移除最久未使用的记录，0=不使用",
+            "trans_concurrency": "同一翻译通道同时发送的请求数，每个请求翻译一批字幕，多个任务共享该限制，遇到频率限制时请调小",
+            "trans_max_tokens": "AI翻译时每次请求最多发送的原文tokens数，按字幕长度自动决定每批行数，0=按同时翻译的字幕条数分批",
             "retries": "翻译出错时的重试次数",
             "translation_wait": "每次翻译后暂停时间/秒,用于限制请求频率",
             "dubbing_thread": "同时配音的字幕条数",
+            "tts_cache_mb": "配音缓存最大占用MB，所有任务共享，相同渠道、角色、语速、音量、音调、语言和文字的配音不再重复合成，超出时移除最久未使用的文件，0=不使用",
             "azure_lines": "azureTTS一次配音行数",
+            "recogn_worker": "批量翻译视频时，同时进行语音识别的视频数，使用GPU时建议为1",
+            "trans_worker": "批量翻译视频时，同时进行字幕翻译的视频数",
+            "dubbing_worker": "批量翻译视频时，同时进行配音的视频数",
+            "compose_worker": "批量翻译视频时，同时进行视频合成的视频数，合成占用大量CPU，建议为1或2",
+            "stream_trans": "true=批量翻译或无需修改原字幕时，faster模式下语音识别的同时开始翻译已识别出的字幕，false=识别完成后再翻译",
+            "stream_dubbing": "true=批量翻译或无需修改目标字幕时，每翻译完一批字幕立即开始配音，false=全部翻译完成后再配音",
 
             "chattts_voice": "chatTTS 音色值"
 
@@ -132,8 +145,12 @@ class Ui_setini(object):
             "voice_silence": "均等分割时静音片段/ms",
             "interval_split": "均等分割时片段时长/s",
             "trans_thread": "同时翻译的字幕数",
+            "trans_cache_mb": "翻译记忆MB",
+            "trans_concurrency": "翻译并发请求数",
+            "trans_max_tokens": "AI翻译每批tokens",
             "retries": "翻译出错重试数",
             "dubbing_thread": "同时配音字幕数",
+            "tts_cache_mb": "配音缓存MB",
             "countdown_sec": "暂停倒计时/s",
             "backaudio_volume": "背景音量倍数",
             "loop_backaudio": "循环播放背景音",
@@ -141,6 +158,9 @@ class Ui_setini(object):
             "initial_prompt_zh": "whisper模型提示词",
             "whisper_threads": "faster-whisper cpu进程",
             "whisper_worker": "faster-whisper工作进程",
+            "whisper_cache_mb": "模型缓存内存MB",
+            "whisper_batch_size": "均等分割批量识别数",
+            "whisper_process_num": "整体识别进程数",
             "beam_size": "字幕识别准确度控制1",
             "best_of": "字幕识别准确度控制2",
             "temperature": "faster-whisper温度控制",
@@ -154,6 +174,12 @@ class Ui_setini(object):
             "other_len": "其他语言硬字幕行字符数",
             "zh_hant_s": "字幕繁体转为简体",
             "azure_lines": "AzureTTS批量行数",
+            "recogn_worker": "同时识别的视频数",
+            "trans_worker": "同时翻译的视频数",
+            "dubbing_worker": "同时配音的视频数",
+            "compose_worker": "同时合成的视频数",
+            "stream_trans": "识别同时翻译",
+            "stream_dubbing": "翻译同时配音",
             "chattts_voice": "ChatTTS音色值",
             "translation_wait": "翻译后暂停时间/s",
             "gemini_model": "Gemini模型列表"
@@ -205,6 +231,9 @@ class Ui_setini(object):
                 "initial_prompt_zh": "Prompt sent to the whisper model.",
                 "whisper_threads": "CPU processes when recognizing subtitles in faster mode.",
                 "whisper_worker": "Number of working processes when recognizing subtitles in faster mode.",
+                "whisper_cache_mb": "Keep loaded models after recognition for reuse, maximum memory in MB, the least recently used model is removed when exceeded, 0=do not keep. Models on the GPU are removed to free VRAM when all tasks finish or stop.",
+                "whisper_batch_size": "Number of chunks recognized together per batch in faster equal-division mode, batches are faster and chunks that fail to decode are retried with the temperature fallback, a known source language is required, 1=recognize chunk by chunk.",
+                "whisper_process_num": "In faster overall mode without CUDA, long audio is split at silences and recognized by this many processes at once, each part at least 5 minutes, CPU threads are shared evenly, 1=do not split.",
                 "beam_size": "Accuracy adjustment when recognizing subtitles, 1-5, 1=lowest VRAM consumption, 5=highest VRAM consumption.",
                 "best_of": "Accuracy adjustment when recognizing subtitles, 1-5, 1=lowest VRAM consumption, 5=highest VRAM consumption.",
                 "temperature": "0=Less GPU resource usage but slightly worse effect, 1=More GPU resource usage with better effect.",
@@ -218,10 +247,20 @@ class Ui_setini(object):
                 "other_len": "Line wrap length for other languages in hard subtitles, more than this number of characters will wrap.",
                 "zh_hant_s": "Force traditional Chinese subtitles to be converted to simplified Chinese.",
                 "trans_thread": "Number of subtitle lines translated simultaneously.",
+                "trans_cache_mb": "Maximum size of the translation memory in MB, identical lines with the same channel, model and languages reuse the saved translation, the least recently used records are removed when exceeded, 0=disabled.",
+                "trans_concurrency": "Number of simultaneous requests per translation channel, each request translates one batch of subtitles, shared by all running tasks, lower it if rate limited.",
+                "trans_max_tokens": "Maximum source tokens per request for AI translation, the number of lines per batch follows the subtitle length, 0=batch by the number of subtitle lines translated simultaneously.",
                 "retries": "Number of retries when translation fails.",
                 "translation_wait": "Pause time after each translation in seconds, to limit request frequency.",
                 "dubbing_thread": "Number of subtitle lines dubbed simultaneously.",
+                "tts_cache_mb": "Maximum size of the dubbing cache in MB, shared by all tasks, lines with the same channel, role, rate, volume, pitch, language and text are not synthesized again, the least recently used clips are removed when exceeded, 0=disabled.",
                 "azure_lines": "Batch line count for azureTTS.",
+                "recogn_worker": "Number of videos recognized at the same time in batch mode, 1 is recommended when using GPU.",
+                "trans_worker": "Number of videos translated at the same time in batch mode.",
+                "dubbing_worker": "Number of videos dubbed at the same time in batch mode.",
+                "compose_worker": "Number of videos composed at the same time in batch mode, composing uses a lot of CPU, 1 or 2 is recommended.",
+                "stream_trans": "true=In batch mode or when the original subtitles are not edited, start translating recognized subtitles while faster-whisper recognition is still running, false=translate after recognition is complete.",
+                "stream_dubbing": "true=In batch mode or when the target subtitles are not edited, start dubbing each batch of subtitles as soon as it is translated, false=dub after translation is complete.",
                 "chattts_voice": "chatTTS voice tone value."
             }
             self.heads = {
@@ -262,8 +301,12 @@ class Ui_setini(object):
                 "voice_silence": "Silence Segment in Equal Division",
                 "interval_split": "Segment Duration in Equal Division",
                 "trans_thread": "Number of Subtitles Translated Simultaneously",
+                "trans_cache_mb": "Translation Memory MB",
+                "trans_concurrency": "Concurrent Translation Requests",
+                "trans_max_tokens": "AI Translation Tokens per Batch",
                 "retries": "Number of Retries on Translation Failure",
                 "dubbing_thread": "Number of Subtitles Dubbed Simultaneously",
+                "tts_cache_mb": "Dubbing Cache MB",
                 "countdown_sec": "Countdown Seconds on Pause",
                 "backaudio_volume": "Background Volume Multiplier",
                 "loop_backaudio": "Loop Background Audio",
@@ -271,6 +314,9 @@ class Ui_setini(object):
                 "initial_prompt_zh": "Whisper Model Prompt",
                 "whisper_threads": "Faster-Whisper CPU Threads",
                 "whisper_worker": "Faster-Whisper Working Threads",
+                "whisper_cache_mb": "Model Cache Memory MB",
+                "whisper_batch_size": "Equal-Division Batch Size",
+                "whisper_process_num": "Overall Recognition Processes",
                 "beam_size": "Subtitle Recognition Accuracy Control 1",
                 "best_of": "Subtitle Recognition Accuracy Control 2",
                 "temperature": "Faster-Whisper Temperature Control",
@@ -284,6 +330,12 @@ class Ui_setini(object):
                 "other_len": "Other Language Hard Subtitle Line Length",
                 "zh_hant_s": "Traditional to Simplified Chinese Conversion",
                 "azure_lines": "Azure TTS Batch Line Count",
+                "recogn_worker": "Videos Recognized Simultaneously",
+                "trans_worker": "Videos Translated Simultaneously",
+                "dubbing_worker": "Videos Dubbed Simultaneously",
+                "compose_worker": "Videos Composed Simultaneously",
+                "stream_trans": "Translate While Recognizing",
+                "stream_dubbing": "Dub While Translating",
                 "chattts_voice": "ChatTTS Voice Tone Value",
                 "translation_wait": "Pause Time After Translation",
                 "gemini_model": "Gemini Model List"
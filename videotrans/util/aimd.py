@@ -0,0 +1,86 @@
+# 配音和翻译渠道共享的自适应并发控制（加性增、乘性减）
+# 请求成功时逐步增加同时请求数，遇到频率限制、5xx 或连接被重置时减半，之后再自动恢复
+# 同一渠道的所有任务共享一个控制器，上限为设置中的并发数
+import re
+import threading
+import time
+
+from videotrans.configure import config
+
+# 认为是服务端限流或过载的错误
+_THROTTLE = re.compile(
+    r'\b429\b|\b5\d\d\b|too many requests|rate ?limit|Invalid response status|WinError 10054|connection ?reset|'
+    r'RemoteDisconnected|Connection aborted|overloaded|频繁|Access Limit',
+    re.I)
+
+_lock = threading.Lock()
+# 渠道名 => Limiter
+_limiters = {}
+
+
+def is_throttle(err):
+    return bool(err) and _THROTTLE.search(str(err)) is not None
+
+
+class Limiter:
+    def __init__(self, name, max_limit):
+        self.name = name
+        self.max_limit = max_limit
+        self.limit = float(max_limit)
+        self.active = 0
+        self._cond = threading.Condition()
+        # 减小后短时间内的其他失败不再重复减小
+        self._last_cut = 0
+
+    def set_max(self, max_limit):
+        with self._cond:
+            self.max_limit = max_limit
+            self.limit = min(self.limit, max_limit)
+            self._cond.notify_all()
+
+    # 非阻塞获取，成功返回 True
+    def try_acquire(self):
+        with self._cond:
+            if self.active < max(1, int(self.limit)):
+                self.active += 1
+                return True
+            return False
+
+    # 阻塞直到获取，stop() 返回 True 时放弃并返回 False
+    def acquire(self, stop=None):
+        with self._cond:
+            while self.active >= max(1, int(self.limit)):
+                if stop and stop():
+                    return False
+                self._cond.wait(timeout=1)
+            self.active += 1
+            return True
+
+    # 请求结束，err 为出错信息，成功时为空
+    def release(self, err=None):
+        with self._cond:
+            self.active -= 1
+            if is_throttle(err):
+                if time.time() - self._last_cut > 1:
+                    self._last_cut = time.time()
+                    self.limit = max(1.0, self.limit / 2)
+                    config.logger.info(f'[AIMD]{self.name} 被限流，并发数降为 {int(self.limit)}:{err}')
+            elif not err and self.limit < self.max_limit:
+                # 大约每完成当前并发数个请求增加1
+                old = int(self.limit)
+                self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+                if int(self.limit) > old:
+                    config.logger.info(f'[AIMD]{self.name} 并发数升为 {int(self.limit)}')
+            self._cond.notify_all()
+
+
+# 获取渠道的控制器，max_limit 为设置中的并发数上限
+def get(name, max_limit):
+    max_limit = max(1, int(max_limit))
+    with _lock:
+        if name not in _limiters:
+            _limiters[name] = Limiter(name, max_limit)
+        limiter = _limiters[name]
+    if limiter.max_limit != max_limit:
+        limiter.set_max(max_limit)
+    return limiter
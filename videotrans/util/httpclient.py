@@ -0,0 +1,75 @@
+# 翻译和配音渠道共享的 HTTP 连接池，相同代理的请求复用已建立的连接，不再每批字幕、每条配音都重新握手
+# 代理显式传入，不读取也不修改 os.environ 中的代理，多个任务同时执行时互不影响
+import re
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from videotrans.util import tools
+
+# 每个连接池保持的最大连接数
+POOL_SIZE = 32
+
+_lock = threading.Lock()
+# 代理地址 => requests.Session
+_sessions = {}
+# 代理地址 => httpx.Client
+_clients = {}
+
+
+def _is_local(url):
+    return re.search(r'localhost|127\.0\.0\.1', url) or re.match(r'^https?://(\d+\.){3}\d+', url)
+
+
+# 渠道使用的代理，本地或局域网地址直连，返回 None 表示不使用代理
+def get_proxy(url=''):
+    if url and _is_local(url):
+        return None
+    return tools.set_proxy() or None
+
+
+# requests 会话，同一代理共享一个，线程间可同时使用
+def get_session(proxy=None):
+    proxy = proxy or None
+    with _lock:
+        if proxy not in _sessions:
+            session = requests.Session()
+            session.trust_env = False
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            if proxy:
+                session.proxies = {"http": proxy, "https": proxy}
+            _sessions[proxy] = session
+        return _sessions[proxy]
+
+
+def _has_h2():
+    try:
+        import h2
+        return True
+    except ImportError:
+        return False
+
+
+# httpx 客户端，用于 OpenAI 等 SDK 的 http_client 参数，已安装 h2 时启用 HTTP/2
+def get_client(proxy=None):
+    import httpx
+    proxy = proxy or None
+    with _lock:
+        if proxy not in _clients:
+            _clients[proxy] = httpx.Client(
+                proxies=proxy,
+                http2=_has_h2(),
+                trust_env=False,
+                limits=httpx.Limits(max_connections=POOL_SIZE, max_keepalive_connections=POOL_SIZE))
+        return _clients[proxy]
+
+
+def get(url, *, proxy=None, **kwargs):
+    return get_session(proxy).get(url, **kwargs)
+
+
+def post(url, *, proxy=None, **kwargs):
+    return get_session(proxy).post(url, **kwargs)
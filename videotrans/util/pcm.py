@@ -0,0 +1,198 @@
+# 配音片段在内存中的 PCM 数据，统一为 RATE 采样率、单声道、16位整数
+# 每条配音只从文件解码一次，之后变速、拼接都在 numpy 数组上进行，最后合成时只编码一次
+import multiprocessing
+import os
+import subprocess
+import sys
+import wave
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from videotrans.configure import config
+from videotrans.util import stretch, tools
+
+RATE = 44100
+
+
+def _creationflags():
+    return 0 if sys.platform != 'win32' else subprocess.CREATE_NO_WINDOW
+
+
+def _pipe(args, data=None):
+    cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error"] + args
+    p = subprocess.run(cmd, input=data, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                       creationflags=_creationflags())
+    if p.returncode != 0:
+        raise Exception(f'ffmpeg:{p.stderr.decode("utf-8", errors="ignore")}')
+    return p.stdout
+
+
+def ms_to_samples(ms):
+    return int(round(ms * RATE / 1000))
+
+
+def duration_ms(samples):
+    return int(round(len(samples) * 1000 / RATE))
+
+
+def silence(ms):
+    return np.zeros(max(0, ms_to_samples(ms)), dtype=np.int16)
+
+
+# MPEG 音频帧头中的比特率(kbps)，[版本1][层] 和 [版本2/2.5][层]，层顺序为 1、2、3
+_MP3_BITRATES = {
+    (1, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (1, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (1, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (2, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (2, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+# 版本位 => 采样率
+_MP3_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+
+
+# 只遍历 mp3 帧头统计采样数，不解码，返回 (采样率, 采样数)，无法解析时返回 None
+def _mp3_info(filename):
+    with open(filename, 'rb') as f:
+        data = f.read()
+    pos = 0
+    # 跳过 ID3v2 标签
+    if data[:3] == b'ID3' and len(data) > 10:
+        pos = 10 + ((data[6] & 0x7f) << 21 | (data[7] & 0x7f) << 14 | (data[8] & 0x7f) << 7 | (data[9] & 0x7f))
+    rate = 0
+    total = 0
+    gap = 0
+    first = True
+    while pos + 4 <= len(data):
+        b1, b2, b3 = data[pos + 1], data[pos + 2], data[pos + 3]
+        if data[pos] != 0xff or (b1 & 0xe0) != 0xe0:
+            pos += 1
+            continue
+        ver = (b1 >> 3) & 3
+        layer = 4 - ((b1 >> 1) & 3)
+        bitrate_idx = b2 >> 4
+        rate_idx = (b2 >> 2) & 3
+        if ver == 1 or layer == 4 or bitrate_idx in (0, 15) or rate_idx == 3:
+            pos += 1
+            continue
+        bitrate = _MP3_BITRATES[(1 if ver == 3 else 2, layer)][bitrate_idx] * 1000
+        rate = _MP3_RATES[ver][rate_idx]
+        pad = (b2 >> 1) & 1
+        if layer == 1:
+            spf = 384
+            size = (12 * bitrate // rate + pad) * 4
+        else:
+            spf = 1152 if layer == 2 or ver == 3 else 576
+            size = spf // 8 * bitrate // rate + pad
+        frame = data[pos:pos + size]
+        if first and (b'Xing' in frame[:64] or b'Info' in frame[:64]):
+            # VBR/LAME 信息帧不含音频，记录编码器首尾补齐的采样数，解码时会被去掉
+            lame = max(frame.find(b'LAME'), frame.find(b'Lavc'), frame.find(b'Lavf'))
+            if lame > 0 and lame + 24 <= len(frame):
+                d = frame[lame + 21:lame + 24]
+                gap = (d[0] << 4 | d[1] >> 4) + ((d[1] & 0x0f) << 8 | d[2])
+        else:
+            total += spf
+        first = False
+        pos += max(size, 1)
+    if not rate or total <= 0:
+        return None
+    return rate, max(0, total - gap)
+
+
+# 配音片段信息，只读取文件头：{"file": 文件, "rate": 采样率, "samples": 采样数}，无法读取时返回 None
+def probe(filename):
+    info = None
+    suffix = Path(filename).suffix.lower()
+    try:
+        if suffix == '.wav':
+            with wave.open(filename, 'rb') as w:
+                info = (w.getframerate(), w.getnframes())
+        elif suffix == '.mp3':
+            info = _mp3_info(filename)
+    except Exception:
+        info = None
+    if info is None:
+        try:
+            info = (RATE, ms_to_samples(tools.get_audio_time(filename) * 1000))
+        except Exception as e:
+            config.logger.error(f'获取配音时长出错:{filename},{str(e)}')
+            return None
+    return {"file": filename, "rate": info[0], "samples": info[1]}
+
+
+# 配音片段时长毫秒
+def clip_ms(clip):
+    return int(round(clip['samples'] * 1000 / clip['rate'])) if clip and clip['rate'] > 0 else 0
+
+
+# 解码配音片段，出错时返回 None
+def load_clip(clip):
+    if not clip:
+        return None
+    try:
+        samples = load(clip['file'])
+    except Exception as e:
+        config.logger.error(f'解码配音文件出错:{clip["file"]},{str(e)}')
+        return None
+    return samples if len(samples) > 0 else None
+
+
+# 解码音频文件，返回 int16 数组
+def load(filename):
+    # 已是 RATE 采样率的16位单声道 wav 直接读取，无需启动 ffmpeg
+    if Path(filename).suffix.lower() == '.wav':
+        try:
+            with wave.open(filename, 'rb') as w:
+                if w.getframerate() == RATE and w.getnchannels() == 1 and w.getsampwidth() == 2:
+                    return np.frombuffer(w.readframes(w.getnframes()), dtype=np.int16)
+        except (wave.Error, EOFError):
+            pass
+    data = _pipe(['-i', Path(filename).as_posix(), '-f', 's16le', '-ac', '1', '-ar', str(RATE), '-'])
+    return np.frombuffer(data, dtype=np.int16)
+
+
+# 保存为16位单声道 wav
+def save(filename, samples):
+    with wave.open(filename, 'wb') as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(RATE)
+        w.writeframes(np.ascontiguousarray(samples, dtype=np.int16).tobytes())
+    return filename
+
+
+# 批量变速不变调，jobs 为 [(PCM数组, 目标毫秒)]，返回结果恰好为目标采样数的数组列表
+# 只加速，不长于目标时长的原样返回，条数较多时在多个进程中并行
+def speed_up_batch(jobs):
+    args = []
+    for samples, target_ms in jobs:
+        target = ms_to_samples(target_ms)
+        args.append((samples, target if 0 < target < len(samples) else len(samples), RATE))
+    # 每个进程至少处理 4 条，避免启动进程的开销大于变速本身
+    workers = min(os.cpu_count() or 1, len(args) // 4)
+    if workers > 1:
+        try:
+            # spawn 方式启动，避免子进程继承 Qt 和 CUDA 状态
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+                return list(executor.map(stretch.wsola_job, args, chunksize=max(1, len(args) // (workers * 4))))
+        except Exception as e:
+            config.logger.error(f'多进程配音变速失败，改为单进程:{str(e)}')
+    return [stretch.wsola_job(arg) for arg in args]
+
+
+# 按时间轴合成整条配音：clips 为 [(开始毫秒, PCM数组)]
+# 先计算总长度一次分配，再将每个片段写入对应位置，不再逐段拼接复制整个已合成音频
+# duration_ms 为最短总时长，不足时末尾为静音
+def render(clips, duration_ms=0):
+    placed = [(ms_to_samples(start), samples) for start, samples in clips if samples is not None and len(samples) > 0]
+    total = ms_to_samples(duration_ms)
+    for offset, samples in placed:
+        total = max(total, offset + len(samples))
+    out = np.zeros(total, dtype=np.int16)
+    for offset, samples in placed:
+        out[offset:offset + len(samples)] = samples
+    return out
@@ -0,0 +1,21 @@
+# 多进程整体识别时在子进程中识别一段音频
+# 只依赖 faster_whisper，不导入 config，所在包的 __init__ 为空，spawn 启动的子进程不会加载 torch 或改写 cfg.json
+def transcribe_region(args):
+    from faster_whisper import WhisperModel
+    model = WhisperModel(args['model_name'],
+                         device="cpu",
+                         compute_type=args['compute_type'],
+                         download_root=args['download_root'],
+                         cpu_threads=args['cpu_threads'],
+                         local_files_only=args['local_files_only'])
+    segments, _ = model.transcribe(args['audio_file'], **args['options'])
+    offset = args['offset']
+    result = []
+    for segment in segments:
+        result.append({
+            "text": segment.text,
+            "end": segment.end + offset,
+            "words": [{"start": w.start + offset, "end": w.end + offset, "word": w.word} for w in
+                      (segment.words or [])]
+        })
+    return result
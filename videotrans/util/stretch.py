@@ -0,0 +1,59 @@
+# WSOLA 变速不变调，直接处理 PCM 数组，结果恰好为目标采样数
+# 只依赖 numpy，不导入 config，可在子进程中执行
+import numpy as np
+
+# 帧长 30ms，帧移为半帧，在理想位置前后各 1/4 帧内寻找波形最相似的位置
+FRAME_MS = 30
+
+
+def _next_pow2(n):
+    return 1 << (int(n) - 1).bit_length()
+
+
+# samples: int16 数组，target: 目标采样数，rate: 采样率
+def wsola(samples, target, rate):
+    n = len(samples)
+    if target <= 0:
+        return np.zeros(0, dtype=np.int16)
+    if n == target:
+        return samples
+    frame = int(rate * FRAME_MS / 1000) // 2 * 2
+    hop = frame // 2
+    tol = hop // 2
+    if n < frame * 2 or target < frame:
+        # 太短时直接插值
+        x = np.interp(np.linspace(0, n - 1, target), np.arange(n), samples.astype(np.float32))
+        return np.clip(np.round(x), -32768, 32767).astype(np.int16)
+
+    speed = n / target
+    window = np.hanning(frame + 1)[:frame].astype(np.float32)
+    # 前面补半帧使第一帧淡入部分落在输出之外
+    frames = (target + hop) // hop + 2
+    ideals = np.round(np.arange(frames) * hop * speed).astype(np.int64)
+    tail = int(ideals[-1]) + hop + frame + 2 * tol - n
+    x = np.concatenate([np.zeros(tol + hop, dtype=np.float32),
+                        samples.astype(np.float32),
+                        np.zeros(max(0, tail) + tol, dtype=np.float32)])
+    size = _next_pow2(frame + 2 * tol + frame)
+    y = np.zeros(frames * hop + frame, dtype=np.float32)
+
+    prev = tol
+    for k in range(frames):
+        ideal = tol + int(ideals[k])
+        if k == 0:
+            pos = ideal
+        else:
+            # 与上一帧自然延续的波形做互相关，选取最相似的位置
+            template = x[prev + hop:prev + hop + frame]
+            region = x[ideal - tol:ideal + tol + frame]
+            corr = np.fft.irfft(np.fft.rfft(region, size) * np.conj(np.fft.rfft(template, size)), size)
+            pos = ideal - tol + int(np.argmax(corr[:2 * tol + 1]))
+        y[k * hop:k * hop + frame] += x[pos:pos + frame] * window
+        prev = pos
+    y = y[hop:hop + target]
+    return np.clip(np.round(y), -32768, 32767).astype(np.int16)
+
+
+# 子进程中执行，args 为 (samples, target, rate)
+def wsola_job(args):
+    return wsola(*args)
@@ -224,9 +224,11 @@ def get_azure_rolelist():
 
 
 # 执行 ffmpeg
+# cwd 不为空时在该目录下执行，用于替代 os.chdir，避免多线程同时合成时互相影响
 def runffmpeg(arg, *, noextname=None,
               is_box=False,
-              fps=None):
+              fps=None,
+              cwd=None):
     # config.logger.info(f'runffmpeg-arg={arg}')
     arg_copy = copy.deepcopy(arg)
 
@@ -241,7 +243,7 @@ def runffmpeg(arg, *, noextname=None,
     for i, it in enumerate(arg):
         if arg[i] == '-i' and i < len(arg) - 1:
             arg[i + 1] = os.path.normpath(arg[i + 1]).replace('\\', '/')
-            if not vail_file(arg[i + 1]):
+            if not vail_file(arg[i + 1] if not cwd or os.path.isabs(arg[i + 1]) else f'{cwd}/{arg[i + 1]}'):
                 raise Exception(f'..{arg[i + 1]} {config.transobj["vlctips2"]}')
 
     if default_codec in arg and config.video_codec != default_codec:
@@ -274,6 +276,7 @@ def runffmpeg(arg, *, noextname=None,
                        encoding="utf-8",
                        check=True,
                        text=True,
+                       cwd=cwd,
                        creationflags=0 if sys.platform != 'win32' else subprocess.CREATE_NO_WINDOW)
         if noextname:
             config.queue_novice[noextname] = "end"
@@ -303,7 +306,7 @@ def runffmpeg(arg, *, noextname=None,
                         retry = True
             config.logger.error(f'after:{retry=},{arg_copy=}')
             if retry:
-                return runffmpeg(arg_copy, noextname=noextname, is_box=is_box)
+                return runffmpeg(arg_copy, noextname=noextname, is_box=is_box, cwd=cwd)
         if noextname:
             config.queue_novice[noextname] = "error"
         config.logger.error(f'cmd执行出错抛出异常:{cmd=},{str(e.stderr)}')
@@ -614,6 +617,20 @@ def wav2mp3(wavfile, mp3file, extra=None):
     return runffmpeg(cmd)
 
 
+# 配音渠道返回的 wav 保存为配音文件，配音文件为 wav 时直接保存，不再经过有损的 mp3 编码
+# move=False 时保留 wavfile
+def wav2clip(wavfile, filename, move=True):
+    if Path(filename).suffix.lower() != '.wav':
+        return wav2mp3(wavfile, filename)
+    if Path(wavfile).resolve() == Path(filename).resolve():
+        return True
+    if move:
+        shutil.move(wavfile, filename)
+    else:
+        shutil.copyfile(wavfile, filename)
+    return True
+
+
 # m4a 转为 wav cuda + h264_cuvid
 def m4a2wav(m4afile, wavfile):
     cmd = [
@@ -682,38 +699,6 @@ def speed_up_mp3(*, filename=None, speed=1, out=None):
     ])
 
 
-def precise_speed_up_audio(*, file_path=None, out=None, target_duration_ms=None, max_rate=100):
-    from pydub import AudioSegment
-    audio = AudioSegment.from_file(file_path)
-
-    # 首先确保原时长和目标时长单位一致（毫秒）
-    current_duration_ms = len(audio)
-    # 计算音频变速比例
-    # current_duration_ms = len(audio)
-    # speedup_ratio = current_duration_ms / target_duration_ms
-    # 计算速度变化率
-    speedup_ratio = current_duration_ms / target_duration_ms
-
-    if target_duration_ms <= 0 or speedup_ratio <= 1:
-        return True
-    rate = min(max_rate, speedup_ratio)
-    # 变速处理
-    try:
-        fast_audio = audio.speedup(playback_speed=rate)
-        # 如果处理后的音频时长稍长于目标时长，进行剪裁
-        if len(fast_audio) > target_duration_ms:
-            fast_audio = fast_audio[:target_duration_ms]
-    except Exception:
-        fast_audio = audio[:target_duration_ms]
-
-    if out:
-        fast_audio.export(out, format=out.split('.')[-1])
-        return True
-    fast_audio.export(file_path, format=file_path.split('.')[-1])
-    # 返回速度调整后的音频
-    return True
-
-
 def show_popup(title, text, parent=None):
     from PySide6.QtGui import QIcon
     from PySide6.QtCore import Qt
@@ -1009,6 +994,77 @@ def match_target_amplitude(sound, target_dBFS):
     return sound.apply_gain(change_in_dBFS)
 
 
+# 每毫秒平方和的累加和，以及每毫秒起始的采样下标，和 pydub 按毫秒切片一致
+def _ms_energy(audio):
+    import numpy as np
+    samples = np.array(audio.get_array_of_samples())
+    seg_len = len(audio)
+    bounds = (np.arange(seg_len + 1, dtype=np.int64) * audio.frame_rate // 1000) * audio.channels
+    bounds = np.minimum(bounds, len(samples))
+    # 32位采样的平方和会溢出 int64
+    dtype = np.float64 if audio.sample_width > 2 else np.int64
+    energy = np.zeros(seg_len + 1, dtype=dtype)
+    # 分块计算，避免长音频一次性生成过大的平方数组
+    block = 60000
+    for s in range(0, seg_len, block):
+        e = min(s + block, seg_len)
+        if bounds[e] <= bounds[s]:
+            continue
+        sq = samples[bounds[s]:bounds[e]].astype(dtype) ** 2
+        idx = bounds[s:e] - bounds[s]
+        ms_sum = np.add.reduceat(sq, np.minimum(idx, len(sq) - 1))
+        # reduceat 对空区间返回起点的值，需置0
+        ms_sum[np.diff(np.append(idx, len(sq))) == 0] = 0
+        energy[s + 1:e + 1] = ms_sum
+    return np.cumsum(energy), bounds
+
+
+# numpy 实现的 pydub.silence.detect_silence，参数和返回值相同，用累加和一次算出所有窗口的 rms
+def detect_silence(audio, min_silence_len=1000, silence_thresh=-16, seek_step=1):
+    import numpy as np
+    seg_len = len(audio)
+    if seg_len < min_silence_len:
+        return []
+    thresh = (10 ** (silence_thresh / 20)) * audio.max_possible_amplitude
+    cs, bounds = _ms_energy(audio)
+    last_slice_start = seg_len - min_silence_len
+    starts = np.arange(0, last_slice_start + 1, seek_step)
+    if last_slice_start % seek_step:
+        starts = np.append(starts, last_slice_start)
+    counts = bounds[starts + min_silence_len] - bounds[starts]
+    sums = cs[starts + min_silence_len] - cs[starts]
+    rms = np.floor(np.sqrt(sums / np.maximum(counts, 1)))
+    silence_starts = starts[rms <= thresh]
+    if len(silence_starts) < 1:
+        return []
+    # 前后两个静音窗口既不连续、间隔又大于 min_silence_len 时断开
+    gaps = np.nonzero((np.diff(silence_starts) != seek_step) &
+                      (silence_starts[1:] > silence_starts[:-1] + min_silence_len))[0]
+    range_starts = np.concatenate(([silence_starts[0]], silence_starts[gaps + 1]))
+    range_ends = np.concatenate((silence_starts[gaps], [silence_starts[-1]])) + min_silence_len
+    return [[int(s), int(e)] for s, e in zip(range_starts, range_ends)]
+
+
+# numpy 实现的 pydub.silence.detect_nonsilent，参数和返回值相同
+def detect_nonsilent(audio, min_silence_len=1000, silence_thresh=-16, seek_step=1):
+    silent_ranges = detect_silence(audio, min_silence_len, silence_thresh, seek_step)
+    len_seg = len(audio)
+    if not silent_ranges:
+        return [[0, len_seg]]
+    if silent_ranges[0][0] == 0 and silent_ranges[0][1] == len_seg:
+        return []
+    prev_end_i = 0
+    nonsilent_ranges = []
+    for start_i, end_i in silent_ranges:
+        nonsilent_ranges.append([prev_end_i, start_i])
+        prev_end_i = end_i
+    if end_i != len_seg:
+        nonsilent_ranges.append([prev_end_i, len_seg])
+    if nonsilent_ranges[0] == [0, 0]:
+        nonsilent_ranges.pop(0)
+    return nonsilent_ranges
+
+
 # 从视频中切出一段时间的视频片段 cuda + h264_cuvid
 def cut_from_video(*, ss="", to="", source="", pts="", out="", fps=None):
     video_codec = config.settings['video_codec']
@@ -1199,7 +1255,6 @@ def kill_ffmpeg_processes():
 # input_file_path 可能是字符串：文件路径，也可能是音频数据
 def remove_silence_from_end(input_file_path, silence_threshold=-50.0, chunk_size=10, is_start=True):
     from pydub import AudioSegment
-    from pydub.silence import detect_nonsilent
     """
     Removes silence from the end of an audio file.
 